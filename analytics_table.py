@@ -0,0 +1,95 @@
+"""
+增量更新的衍生資料表 (data/analytics/*.parquet) 共用流程
+資金流量、權重變化拆解與投資組合指標都是「每檔 ETF 一段依日期排列的列」，更新方式相同:
+- 依既有結果中各 ETF 的最後日期分組，同一組的 ETF 一次讀取與計算
+- rebuild 時只捨棄指定 ETF 的列重新計算，其他 ETF 的列原樣保留
+- 覆寫過去日期的快照 (rewritten) 時，捨棄該 ETF 自最早覆寫日期起的列，與新資料一併重算
+- 先寫入暫存檔再改名，讀取端不會看到寫到一半的檔案
+"""
+
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from holdings_store import STORE_DIR, to_date
+
+
+def stored_etf_codes(kind="holding", store_dir=STORE_DIR):
+    """資料集中有資料的 ETF 代碼 (依分區目錄)"""
+    root = Path(store_dir) / kind
+    return sorted(p.name.split("=", 1)[1] for p in root.glob("etf=*")) if root.exists() else []
+
+
+def write_table(df, path, metadata=None):
+    """DataFrame 寫入 parquet (暫存檔改名)，metadata 為附加的 schema metadata"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def update_table(path, compute, load, columns, sort_keys, lock, etf_codes=None, kind="holding",
+                 store_dir=STORE_DIR, rebuild=False, metadata=None, rewritten=None):
+    """
+    增量更新衍生資料表
+
+    參數:
+    path: 結果檔
+    compute: compute(since, codes, existing) -> DataFrame 或 None；
+             計算 codes (最後日期同為 since，None 表示尚無結果) 在 since 之後的列，
+             existing 為既有結果 (rebuild 時已去除 etf_codes 的列)，可取用前一日等上下文
+    load: load(path) -> 既有結果 DataFrame (檔案不存在時為空)
+    columns: 結果欄位 (沒有任何列時的空表)
+    sort_keys: 寫入前的排序欄位
+    lock: 同一資料表的更新鎖
+    etf_codes: ETF 代碼列表，None 表示資料集 (kind) 中全部
+    rebuild: 重新計算 etf_codes 的全部日期 (其他 ETF 的列保留)
+    metadata: 寫入 schema metadata 的 dict (例如定義版本)
+    rewritten: {ETF 代碼: 最早被覆寫的快照日期}，該 ETF 自這天起的列重新計算
+
+    回傳:
+    (完整資料表, 本次新增或重算的列)
+    """
+    with lock:
+        if etf_codes is None:
+            etf_codes = stored_etf_codes(kind, store_dir)
+        if isinstance(etf_codes, str):
+            etf_codes = [etf_codes]
+
+        existing = load(path)
+        loaded_rows = len(existing)
+        if rebuild and not existing.empty:
+            existing = existing[~existing['etf'].isin(etf_codes)]
+        if rewritten and not existing.empty:
+            cutoff = existing['etf'].astype(str).map(
+                {str(code): pd.Timestamp(to_date(day)) for code, day in rewritten.items()})
+            existing = existing[~(pd.to_datetime(existing['日期']) >= cutoff)]
+
+        last = existing.groupby('etf', observed=True)['日期'].max().to_dict() if not existing.empty else {}
+        groups = {}
+        for etf_code in etf_codes:
+            groups.setdefault(last.get(etf_code), []).append(etf_code)
+
+        new_parts = []
+        for since, codes in groups.items():
+            part = compute(since, codes, existing)
+            if part is not None and len(part):
+                new_parts.append(part)
+
+        new_rows = pd.concat(new_parts, ignore_index=True) if new_parts else pd.DataFrame(columns=columns)
+        if new_rows.empty and not rebuild and len(existing) == loaded_rows:
+            return existing, new_rows
+
+        parts = [part for part in (existing, new_rows) if len(part)]
+        combined = pd.concat(parts, ignore_index=True) if parts else new_rows
+        combined = combined.sort_values(sort_keys, ignore_index=True)
+        write_table(combined, path, metadata)
+        return combined, new_rows
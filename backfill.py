@@ -0,0 +1,293 @@
+"""
+歷史持股回補
+投信有提供過去日期的資料時 (ETF_CONFIGS 的 "backfill")，補抓資料集中缺少的交易日:
+- 只抓取 [start, end] 之間、資料集 (data/store) 中沒有的交易日 (依 config/market_holidays.txt)
+- 多個日期平行抓取，每台主機的請求頻率受 HostRateLimiter 限制
+- 每 BATCH_SIZE 個日期以 holdings_store.write_snapshots 一次寫入資料集 (不產生每日小檔)，並更新檢查點
+- 中斷後重新執行會由檢查點 (data/<ETF>/backfill.json) 接續，已完成或確認沒有資料的日期不再抓取
+
+使用方式:
+    python backfill.py 00982A --start 2025-06-01 --end 2025-12-31 --workers 4 --rate 2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from holdings_schema import to_holding_table, validate_holdings
+from holdings_store import STORE_DIR, stored_dates, to_date, write_snapshots
+from raw_archive import archive_bytes, archive_file
+from trading_calendar import HOLIDAY_FILE, TradingCalendar
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+
+CHECKPOINT_FILE = "backfill.json"
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 2.0
+BATCH_SIZE = 20
+
+
+class BackfillCheckpoint:
+    """
+    回補進度 (data/<ETF>/backfill.json)
+
+    內容:
+    {
+        "done": ["YYYYMMDD", ...],      # 已寫入資料集
+        "empty": ["YYYYMMDD", ...],     # 投信沒有該日資料
+        "failed": {"YYYYMMDD": "錯誤訊息"},
+        "updated_at": "2025-12-26T17:30:00"
+    }
+    """
+
+    def __init__(self, etf_code, base_dir=DATA_DIR):
+        self.path = Path(base_dir) / etf_code / CHECKPOINT_FILE
+        try:
+            self.data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+        self.done = set(self.data.get('done', []))
+        self.empty = set(self.data.get('empty', []))
+        self.failed = dict(self.data.get('failed', {}))
+
+    def is_finished(self, date_str, retry_empty=False):
+        return date_str in self.done or (not retry_empty and date_str in self.empty)
+
+    def mark(self, done=(), empty=(), failed=None):
+        """記錄一批結果並寫檔"""
+        self.done.update(done)
+        self.empty.update(empty)
+        for date_str in list(done) + list(empty):
+            self.failed.pop(date_str, None)
+        self.failed.update(failed or {})
+        self._save()
+
+    def _save(self):
+        self.data = {
+            'done': sorted(self.done),
+            'empty': sorted(self.empty),
+            'failed': dict(sorted(self.failed.items())),
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+
+def trading_days(start, end, calendar):
+    """[start, end] 之間的交易日"""
+    day, end = to_date(start), to_date(end)
+    days = []
+    while day <= end:
+        if calendar.is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _format(template, day):
+    return template.format(date=day) if isinstance(template, str) else template
+
+
+def fetch_date(source, day, limiter, work_dir, base_url=None, etf_code=None, archive_dir=None):
+    """
+    抓取並解析單一日期
+
+    參數:
+    source: ETF_CONFIGS 的 "backfill" 設定
+    day: 資料日期 (datetime.date)
+    limiter: HostRateLimiter
+    work_dir: 下載檔案的暫存目錄
+    etf_code, archive_dir: 提供 archive_dir 時，日期相符的原始內容封存至該目錄 (見 raw_archive)
+
+    回傳:
+    (資料日期 YYYYMMDD, portfolio DataFrame 或 None, holdings DataFrame 或 None)；
+    投信沒有該日資料時 holdings 與 portfolio 皆為 None
+    """
+    import requests
+
+    from http_fetch import fetch_file, fetch_json
+
+    url = _format(source["url"], day)
+    params = {key: _format(value, day) for key, value in (source.get("params") or {}).items()} or None
+    date_str = f"{day:%Y%m%d}"
+    limiter.wait(url)
+
+    try:
+        if source["type"] == "json":
+            payload = fetch_json(url, method=source.get("method", "GET"), params=params,
+                                 headers=source.get("headers"), base_url=base_url)
+            if not payload:
+                return date_str, None, None
+            parsed_date, portfolio_df, holdings_df = source["parser"](payload)
+            if archive_dir and parsed_date == date_str:
+                archive_bytes(json.dumps(payload, ensure_ascii=False).encode("utf-8"), etf_code, date_str,
+                              "json", archive_dir)
+        else:
+            job_dir = Path(work_dir) / date_str
+            try:
+                path = fetch_file(url, job_dir, method=source.get("method", "GET"), params=params,
+                                  headers=source.get("headers"), base_url=base_url)
+                parsed_date, portfolio_df, holdings_df = source["parser"](path)
+                if archive_dir and parsed_date == date_str:
+                    archive_file(path, etf_code, date_str, archive_dir)
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return date_str, None, None
+        raise
+
+    # 查詢日期沒有資料時，部分 API 會回傳最近一日的資料，不可存成查詢日期
+    if parsed_date != date_str:
+        print(f"⚠ 查詢 {date_str} 取得 {parsed_date} 的資料，視為當日沒有資料")
+        return date_str, None, None
+    return date_str, portfolio_df, holdings_df
+
+
+def _flush(etf_code, holdings, portfolios, checkpoint, empty, store_dir):
+    """將一批結果寫入資料集並更新檢查點"""
+    done = [date_str for date_str, _ in holdings]
+    if holdings:
+        write_snapshots(pa.concat_tables([table for _, table in holdings]), etf_code, "holding", store_dir)
+    if portfolios:
+        write_snapshots(pd.concat(portfolios, ignore_index=True), etf_code, "portfolio", store_dir)
+    checkpoint.mark(done=done, empty=empty)
+    if done:
+        print(f"✓ {etf_code} 已寫入 {len(done)} 個日期 ({min(done)} ~ {max(done)})")
+    holdings.clear()
+    portfolios.clear()
+    empty.clear()
+
+
+def backfill(etf_code, start, end, base_dir=DATA_DIR, store_dir=None, workers=DEFAULT_WORKERS,
+             rate=DEFAULT_RATE, batch_size=BATCH_SIZE, retry_empty=False, calendar=None, base_url=None):
+    """
+    回補 [start, end] 之間資料集缺少的交易日
+
+    參數:
+    etf_code: ETF 代碼 (需在 ETF_CONFIGS 設定 "backfill")
+    start, end: 日期範圍 (含)
+    workers: 同時抓取的日期數
+    rate: 每台主機每秒最多幾個請求
+    batch_size: 每累積幾個日期寫入一次資料集
+    retry_empty: 重新抓取檢查點中記錄為沒有資料的日期 (例如修正網址設定後)
+    base_url: 替身伺服器網址 (測試用)
+
+    回傳:
+    dict，包含 done、empty、failed (日期列表) 與 skipped (已存在而略過的日數)
+    """
+    from get_00991A import ETF_CONFIGS
+    from http_fetch import HostRateLimiter
+
+    source = ETF_CONFIGS.get(etf_code, {}).get("backfill")
+    if not source:
+        raise ValueError(f"{etf_code} 沒有設定回補來源 (ETF_CONFIGS 的 backfill)")
+
+    store_dir = Path(store_dir) if store_dir else Path(base_dir) / "store"
+    calendar = calendar or TradingCalendar.load(HOLIDAY_FILE)
+    checkpoint = BackfillCheckpoint(etf_code, base_dir)
+    existing = stored_dates(etf_code, "holding", store_dir)
+
+    days = trading_days(start, end, calendar)
+    pending = [day for day in days
+               if day not in existing and not checkpoint.is_finished(f"{day:%Y%m%d}", retry_empty)]
+    summary = {'done': [], 'empty': [], 'failed': [], 'skipped': len(days) - len(pending)}
+    print(f"{etf_code} 回補 {to_date(start)} ~ {to_date(end)}: 交易日 {len(days)} 天，"
+          f"需抓取 {len(pending)} 天 (同時 {workers} 個，每台主機每秒 {rate} 次)")
+    if not pending:
+        return summary
+
+    limiter = HostRateLimiter(rate)
+    holdings, portfolios, empty = [], [], []
+    work_dir = Path(tempfile.mkdtemp(prefix=f"backfill-{etf_code}-"))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill")
+    try:
+        futures = {executor.submit(fetch_date, source, day, limiter, work_dir, base_url, etf_code,
+                                   Path(base_dir) / "raw"): day
+                   for day in pending}
+        for future in as_completed(futures):
+            date_str = f"{futures[future]:%Y%m%d}"
+            try:
+                _, portfolio_df, holdings_df = future.result()
+            except Exception as e:
+                print(f"✗ {etf_code} {date_str} 抓取失敗: {e}")
+                checkpoint.mark(failed={date_str: f"{type(e).__name__}: {e}"})
+                summary['failed'].append(date_str)
+                continue
+
+            if holdings_df is None and portfolio_df is None:
+                empty.append(date_str)
+                summary['empty'].append(date_str)
+            else:
+                if holdings_df is not None:
+                    table = to_holding_table(holdings_df, etf_code, date_str)
+                    for problem in validate_holdings(table):
+                        print(f"⚠ {etf_code} {date_str} 持股資料檢查: {problem}")
+                    holdings.append((date_str, table))
+                if portfolio_df is not None:
+                    portfolios.append(portfolio_df)
+                summary['done'].append(date_str)
+
+            if len(holdings) + len(empty) >= batch_size:
+                _flush(etf_code, holdings, portfolios, checkpoint, empty, store_dir)
+    finally:
+        # 中斷時 (Ctrl+C) 取消尚未開始的日期，已完成的結果仍寫入資料集
+        executor.shutdown(wait=True, cancel_futures=True)
+        _flush(etf_code, holdings, portfolios, checkpoint, empty, store_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"✓ {etf_code} 回補完成: 寫入 {len(summary['done'])} 天，沒有資料 {len(summary['empty'])} 天，"
+          f"失敗 {len(summary['failed'])} 天，已存在 {summary['skipped']} 天")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回補過去日期的持股資料")
+    parser.add_argument("etf_codes", nargs="+", help="ETF 代碼")
+    parser.add_argument("--start", required=True, help="開始日期 (YYYY-MM-DD 或 YYYYMMDD)")
+    parser.add_argument("--end", default=datetime.now().strftime("%Y%m%d"), help="結束日期 (預設今天)")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料基礎目錄")
+    parser.add_argument("--store-dir", default=None, help=f"資料集根目錄 (預設 <base-dir>/store，即 {STORE_DIR})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同時抓取的日期數")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="每台主機每秒最多幾個請求")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每累積幾個日期寫入一次資料集")
+    parser.add_argument("--retry-empty", action="store_true", help="重新抓取先前記錄為沒有資料的日期")
+    args = parser.parse_args(argv)
+
+    failed = False
+    written = []
+    for code in args.etf_codes:
+        try:
+            summary = backfill(code, args.start, args.end, base_dir=args.base_dir, store_dir=args.store_dir,
+                               workers=args.workers, rate=args.rate, batch_size=args.batch_size,
+                               retry_empty=args.retry_empty)
+            failed = failed or bool(summary['failed'])
+            if summary['done']:
+                written.append(code)
+        except ValueError as e:
+            print(f"✗ {e}")
+            failed = True
+
+    if written:
+        # 補寫的是過去日期，增量更新不會涵蓋，重建這些 ETF 的衍生資料表
+        from run_all_etfs import update_analytics
+
+        update_analytics(args.base_dir, written, rebuild=True, store_dir=args.store_dir)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+瀏覽器連線池效能測試
+比較「每個工作重新啟動 Chrome」與「共用連線池」完成 N 個工作所需時間
+
+執行方式:
+    python benchmarks/bench_driver_pool.py --jobs 10 --pool-size 2
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from selenium import webdriver
+
+from driver_pool import ChromeDriverPool, build_chrome_options
+
+DEFAULT_URL = "data:text/html,<html><body><table><tr><td>股票名稱</td></tr></table></body></html>"
+
+
+def _load_page(driver, url):
+    driver.get(url)
+    return len(driver.page_source)
+
+
+def run_cold(url, jobs, workers):
+    """每個工作各自啟動與關閉 Chrome"""
+    def job(_):
+        driver = webdriver.Chrome(options=build_chrome_options())
+        try:
+            return _load_page(driver, url)
+        finally:
+            driver.quit()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(job, range(jobs)))
+    return time.perf_counter() - start
+
+
+def run_pooled(url, jobs, workers):
+    """共用預熱的連線池，回傳 (預熱時間, 工作時間)"""
+    start = time.perf_counter()
+    pool = ChromeDriverPool(size=workers)
+    pool.warm()
+    warm_elapsed = time.perf_counter() - start
+
+    def job(_):
+        with pool.session() as driver:
+            return _load_page(driver, url)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(job, range(jobs)))
+    finally:
+        jobs_elapsed = time.perf_counter() - start
+        pool.close()
+    return warm_elapsed, jobs_elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比較 Chrome 冷啟動與連線池的效能")
+    parser.add_argument("--jobs", type=int, default=10, help="工作數量")
+    parser.add_argument("--pool-size", type=int, default=2, help="連線池大小 / 同時執行數")
+    parser.add_argument("--url", default=DEFAULT_URL, help="每個工作要開啟的網址")
+    args = parser.parse_args(argv)
+
+    cold = run_cold(args.url, args.jobs, args.pool_size)
+    warm, pooled = run_pooled(args.url, args.jobs, args.pool_size)
+
+    print(f"工作數: {args.jobs}，同時執行: {args.pool_size}")
+    print(f"冷啟動         : {cold:8.2f} 秒 ({cold / args.jobs:.3f} 秒/工作)")
+    print(f"連線池 (含預熱): {warm + pooled:8.2f} 秒 (預熱 {warm:.2f} 秒)")
+    print(f"連線池 (不含預熱): {pooled:6.2f} 秒 ({pooled / args.jobs:.3f} 秒/工作)")
+    print(f"加速倍數: {cold / (warm + pooled):.2f}x (含預熱), {cold / pooled:.2f}x (不含預熱)")
+
+
+if __name__ == "__main__":
+    main()
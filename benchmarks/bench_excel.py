@@ -0,0 +1,95 @@
+"""
+Excel 解析效能測試
+比較舊版 (read_excel 兩次 + iterrows) 與單次讀取 (各引擎) 解析 00991A 持股檔的時間
+
+執行方式:
+    # 使用錄製的活頁簿
+    python benchmarks/bench_excel.py data/00991A/download/20251226.xlsx
+    # 未提供檔案時使用合成活頁簿
+    python benchmarks/bench_excel.py --holdings 50 --repeat 20
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from excel_reader import ENGINES, _has_module, find_row, grid_to_frame, read_sheet_grid
+from synthetic import make_00991A_workbook
+
+
+def parse_legacy(input_file):
+    """原本 process_00991A_excel 的解析方式"""
+    df = pd.read_excel(input_file, sheet_name=0, header=None)
+    nav = (df.iloc[4, 0], df.iloc[6, 0], df.iloc[8, 0])
+    holdings_start_idx = None
+    for idx, row in df.iterrows():
+        if row[0] == '證券代號':
+            holdings_start_idx = idx
+            break
+    holdings_df = pd.read_excel(input_file, sheet_name=0, header=holdings_start_idx)
+    holdings_df = holdings_df.dropna(how='all')
+    holdings_df = holdings_df.loc[:, ~holdings_df.columns.str.contains('^Unnamed')]
+    return nav, holdings_df
+
+
+def parse_single_pass(input_file, engine):
+    """單次讀取並從網格切出兩個區塊"""
+    df = read_sheet_grid(input_file, sheet_name=0, engine=engine)
+    nav = (df.iloc[4, 0], df.iloc[6, 0], df.iloc[8, 0])
+    holdings_df = grid_to_frame(df, find_row(df, '證券代號'))
+    return nav, holdings_df
+
+
+def time_call(func, repeat):
+    """回傳多次執行中最快的一次秒數與最後一次的結果"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def available_engines():
+    required = {"calamine": "python_calamine", "openpyxl": "openpyxl", "pandas": "openpyxl"}
+    return [engine for engine in ENGINES if _has_module(required[engine])]
+
+
+def bench_file(input_file, repeat):
+    print(f"檔案: {input_file}")
+    legacy_time, (legacy_nav, legacy_holdings) = time_call(lambda: parse_legacy(input_file), repeat)
+    print(f"  {'legacy':<10} {legacy_time * 1000:9.2f} ms")
+
+    for engine in available_engines():
+        elapsed, (nav, holdings) = time_call(lambda: parse_single_pass(input_file, engine), repeat)
+        same = len(holdings) == len(legacy_holdings) and list(holdings.columns) == list(legacy_holdings.columns)
+        print(f"  {engine:<10} {elapsed * 1000:9.2f} ms  "
+              f"({legacy_time / elapsed:5.2f}x, 結果{'一致' if same else '不一致'})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Excel 解析效能測試")
+    parser.add_argument("files", nargs="*", help="錄製的 00991A 活頁簿，未提供時使用合成資料")
+    parser.add_argument("--holdings", type=int, default=50, help="合成活頁簿的持股檔數")
+    parser.add_argument("--repeat", type=int, default=10, help="每種方式執行次數 (取最快)")
+    args = parser.parse_args(argv)
+
+    if args.files:
+        for input_file in args.files:
+            bench_file(input_file, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = make_00991A_workbook(Path(tmp) / "ETF_2025_12_26.xlsx", n_holdings=args.holdings)
+        bench_file(input_file, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+ezmoney 頁面 (00981A) 解析效能測試
+比較各 HTML 解析後端在儲存的頁面快照上的解析時間
+
+執行方式:
+    # 使用儲存的頁面快照 (driver.page_source)
+    python benchmarks/bench_html.py snapshots/00981A_20251226.html
+    # 未提供檔案時使用合成頁面
+    python benchmarks/bench_html.py --holdings 50 --repeat 20
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ezmoney_parser import BACKENDS, parse_ezmoney_page
+from synthetic import make_ezmoney_page
+
+
+def available_backends():
+    modules = {"lxml": "lxml.html", "selectolax": "selectolax.lexbor", "bs4": "bs4"}
+    backends = []
+    for backend in BACKENDS:
+        try:
+            __import__(modules[backend])
+            backends.append(backend)
+        except ImportError:
+            continue
+    return backends
+
+
+def bench_page(label, html, repeat):
+    print(f"頁面: {label} ({len(html) / 1024:.0f} KB)")
+    backends = available_backends()
+    if "bs4" not in backends:
+        print("⚠ 未安裝 BeautifulSoup，無法與原本的解析方式比較")
+
+    timings = {}
+    results = {}
+    for backend in backends:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[backend] = parse_ezmoney_page(html, backend=backend)
+            best = min(best, time.perf_counter() - start)
+        timings[backend] = best
+
+    baseline = timings.get("bs4")
+    for backend in backends:
+        line = f"  {backend:<11} {timings[backend] * 1000:9.2f} ms"
+        if baseline:
+            same = results[backend] == results["bs4"]
+            line += f"  ({baseline / timings[backend]:5.2f}x, 結果{'一致' if same else '不一致'})"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ezmoney 頁面解析效能測試")
+    parser.add_argument("files", nargs="*", help="儲存的頁面快照，未提供時使用合成頁面")
+    parser.add_argument("--holdings", type=int, default=50, help="合成頁面的持股檔數")
+    parser.add_argument("--repeat", type=int, default=10, help="每種後端執行次數 (取最快)")
+    args = parser.parse_args(argv)
+
+    if args.files:
+        for path in args.files:
+            bench_page(path, Path(path).read_text(encoding="utf-8"), args.repeat)
+    else:
+        bench_page("synthetic", make_ezmoney_page(n_holdings=args.holdings), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
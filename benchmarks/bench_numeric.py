@@ -0,0 +1,101 @@
+"""
+數字字串清理效能測試
+比較原本各轉接器的 pandas 字串串接 / 逐值解析與 numeric_clean 整欄解析的時間
+
+執行方式:
+    python benchmarks/bench_numeric.py --rows 1000000 --repeat 5
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from numeric_clean import parse_amount, parse_numbers, parse_percent
+
+
+def make_columns(n_rows, seed=0):
+    """產生與投信檔案相同格式的字串欄位"""
+    rng = random.Random(seed)
+    shares = [f"{rng.randint(1, 50000) * 1000:,}" for _ in range(n_rows)]
+    amounts = [f"TWD {rng.randint(10**6, 10**11):,}" for _ in range(n_rows)]
+    weights = [f"{rng.uniform(0.01, 20):.3f}%" for _ in range(n_rows)]
+    return {
+        "shares": pd.Series(shares, dtype=object),
+        "amounts": pd.Series(amounts, dtype=object),
+        "weights": pd.Series(weights, dtype=object),
+    }
+
+
+# === 原本的寫法 ===
+
+def legacy_numbers(series):
+    """get_00991A / get_00982A: astype(str).str.replace(',', '').astype(float)"""
+    return series.astype(str).str.replace(',', '').str.strip().astype(float)
+
+
+def legacy_amount(series):
+    """get_00982A: 以 regex 移除 TWD、逗號與空白後 pd.to_numeric"""
+    return pd.to_numeric(series.astype(str).str.replace(r'[TWD,\s]', '', regex=True), errors='coerce')
+
+
+def legacy_percent(series):
+    """get_00982A / get_00981A: 去掉 % 後乘以 0.01"""
+    return series.astype(str).str.replace('%', '').str.strip().astype(float) * 0.01
+
+
+def legacy_parse_number(series):
+    """get_00981A: 逐值 strip / replace / float()"""
+    def parse_number(text):
+        if not text:
+            return None
+        try:
+            return float(text.strip().replace(',', ''))
+        except ValueError:
+            return None
+    return pd.Series([parse_number(v) for v in series], dtype=float)
+
+
+CASES = [
+    ("千分位數字", "shares", legacy_numbers, parse_numbers),
+    ("千分位數字 (逐值)", "shares", legacy_parse_number, parse_numbers),
+    ("幣別金額", "amounts", legacy_amount, lambda s: parse_amount(s, currency='TWD')),
+    ("百分比", "weights", legacy_percent, lambda s: parse_percent(s, unit='percent')),
+]
+
+
+def time_call(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="數字字串清理效能測試")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="每個欄位的列數")
+    parser.add_argument("--repeat", type=int, default=5, help="每種寫法執行次數 (取最快)")
+    args = parser.parse_args(argv)
+
+    columns = make_columns(args.rows)
+    print(f"欄位長度: {args.rows:,} 列")
+    for label, column, legacy, current in CASES:
+        series = columns[column]
+        legacy_time, expected = time_call(lambda: legacy(series), args.repeat)
+        current_time, result = time_call(lambda: current(series), args.repeat)
+        same = np.allclose(np.asarray(expected, dtype=float), np.asarray(result, dtype=float), equal_nan=True)
+        print(f"  {label:<14} 原本 {legacy_time * 1000:9.1f} ms  numeric_clean {current_time * 1000:9.1f} ms"
+              f"  ({legacy_time / current_time:5.2f}x, 結果{'一致' if same else '不一致'})")
+
+
+if __name__ == "__main__":
+    main()
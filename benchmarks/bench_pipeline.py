@@ -0,0 +1,344 @@
+"""
+資料管線各階段效能測試
+以錄製檔 (或合成資料) 與本機替身伺服器取代投信網站，分別量測每個階段的時間:
+- fetch:    由替身伺服器下載 (http_fetch.fetch_conditional)
+- parse:    Excel / HTML 解析
+- clean:    數字清理與欄位整理
+- validate: 轉為統一格式並檢查 (holdings_schema)
+- write:    寫入每日持股檔與分區資料集
+並量測不同歷史長度下的資料集合併、歷史載入與持股異動計算
+
+錄製檔 (有的話會取代合成資料，作為每個合成 ETF 的內容):
+    benchmarks/fixtures/pipeline/00981A.html   ezmoney 頁面 (driver.page_source)
+    benchmarks/fixtures/pipeline/00982A.xlsx   群益下載的活頁簿
+    benchmarks/fixtures/pipeline/00991A.xlsx   復華下載的活頁簿
+
+執行方式:
+    python benchmarks/bench_pipeline.py                         # 1 / 10 / 100 檔 ETF，歷史 20 / 250 日
+    python benchmarks/bench_pipeline.py --etfs 1 10 --history-days 20 250 1250
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/pipeline-20251226-180000.json
+
+結果寫入 benchmarks/results/pipeline-<時間>.json (或 --output 指定的路徑)
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from excel_reader import find_date, find_row, grid_to_frame, read_sheet_grid, read_workbook_grids
+from ezmoney_parser import parse_ezmoney_page
+from fixture_server import start_fixture_server
+from get_00991A import preprocess_holdings_data
+from holdings_schema import to_holding_table, validate_holdings, write_holding_file
+from holdings_store import append_snapshot, compact, read_dataset
+from http_fetch import fetch_conditional
+from numeric_clean import parse_numbers, parse_percent
+from synthetic import make_00982A_workbook, make_00991A_workbook, make_ezmoney_page, stock_universe
+
+RECORDED_DIR = BENCH_DIR / "fixtures" / "pipeline"
+RESULTS_DIR = BENCH_DIR / "results"
+
+STAGES = ("fetch", "parse", "clean", "validate", "write")
+FIXTURE_HOST = "bench.local"
+DATA_DATE = "20251226"
+
+
+# === 各投信的解析與清理 (與轉接器相同的步驟) ===
+
+def parse_00981A(path):
+    return parse_ezmoney_page(Path(path).read_text(encoding="utf-8"))
+
+
+def clean_00981A(page):
+    df = pd.DataFrame(page["holdings"])
+    df["股數"] = parse_numbers(df["股數"])
+    df["持股權重"] = parse_percent(df["持股權重"], unit="percent")
+    return df
+
+
+def parse_00982A(path):
+    return read_workbook_grids(path, ["投資組合", "股票", "其他資產"])
+
+
+def clean_00982A(sheets):
+    df = grid_to_frame(sheets["股票"], 0)
+    df["持股權重"] = parse_percent(df["持股權重(%)"], unit="percent")
+    df["股數"] = parse_numbers(df["股數"])
+    return df[["股票代號", "股票名稱", "持股權重", "股數"]]
+
+
+def parse_00991A(path):
+    grid = read_sheet_grid(path, sheet_name=0)
+    holdings = grid_to_frame(grid, find_row(grid, "證券代號"))
+    holdings.insert(0, "日期", find_date(grid) or DATA_DATE)
+    return holdings
+
+
+def clean_00991A(holdings):
+    return preprocess_holdings_data(holdings)
+
+
+def _write_html(path, seed, n_holdings):
+    Path(path).write_text(make_ezmoney_page(n_holdings=n_holdings, seed=seed), encoding="utf-8")
+
+
+SOURCES = {
+    "00981A": {"suffix": ".html", "make": _write_html, "parse": parse_00981A, "clean": clean_00981A},
+    "00982A": {"suffix": ".xlsx", "make": lambda path, seed, n: make_00982A_workbook(path, n, seed=seed),
+               "parse": parse_00982A, "clean": clean_00982A},
+    "00991A": {"suffix": ".xlsx", "make": lambda path, seed, n: make_00991A_workbook(path, n, seed=seed),
+               "parse": parse_00991A, "clean": clean_00991A},
+}
+
+
+def prepare_fixtures(root, n_etfs, n_holdings, recorded_dir=RECORDED_DIR):
+    """
+    在替身伺服器根目錄建立 n_etfs 份內容 (bench.local/<來源>/<序號>)
+
+    回傳:
+    {來源: 是否使用錄製檔}
+    """
+    recorded = {}
+    for source, spec in SOURCES.items():
+        template = Path(recorded_dir) / f"{source}{spec['suffix']}"
+        recorded[source] = template.is_file()
+        directory = Path(root) / FIXTURE_HOST / source
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(n_etfs):
+            path = directory / f"{i:03d}{spec['suffix']}"
+            if recorded[source]:
+                shutil.copyfile(template, path)
+            else:
+                spec["make"](path, i, n_holdings)
+    return recorded
+
+
+def run_ingest(n_etfs, base_url, work_dir):
+    """
+    依序處理 n_etfs 份內容，累計各階段時間
+
+    回傳:
+    {來源: {階段: 秒數}}
+    """
+    timings = defaultdict(lambda: dict.fromkeys(STAGES, 0.0))
+    store_dir = Path(work_dir) / "store"
+    for source, spec in SOURCES.items():
+        for i in range(n_etfs):
+            etf_code = f"{source}-{i:03d}"
+            stage_times = timings[source]
+
+            start = time.perf_counter()
+            result = fetch_conditional(f"https://{FIXTURE_HOST}/{source}/{i:03d}{spec['suffix']}",
+                                       download_path=str(Path(work_dir) / "download" / etf_code),
+                                       base_url=base_url)
+            stage_times["fetch"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            parsed = spec["parse"](result.file_path)
+            stage_times["parse"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            df = spec["clean"](parsed)
+            stage_times["clean"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            table = to_holding_table(df, etf_code, DATA_DATE)
+            problems = validate_holdings(table)
+            stage_times["validate"] += time.perf_counter() - start
+            if problems:
+                print(f"⚠ {etf_code}: {'; '.join(problems)}")
+
+            start = time.perf_counter()
+            write_holding_file(table, Path(work_dir) / "data" / etf_code / "holding" / f"{DATA_DATE}.parquet")
+            append_snapshot(table, etf_code, DATA_DATE, "holding", store_dir)
+            stage_times["write"] += time.perf_counter() - start
+    return timings
+
+
+# === 歷史長度相關的階段 ===
+
+def make_history_table(etf_code, day, n_holdings, rng):
+    """產生單日的統一格式持股 (每日少量持股異動)"""
+    stocks = stock_universe(n_holdings + 10)
+    chosen = sorted(rng.choice(len(stocks), size=n_holdings, replace=False))
+    df = pd.DataFrame({
+        "股票代號": [stocks[j][0] for j in chosen],
+        "股票名稱": [stocks[j][1] for j in chosen],
+        "股數": rng.integers(1, 5000, size=n_holdings) * 1000,
+        "持股權重": rng.dirichlet(np.ones(n_holdings)),
+    })
+    return to_holding_table(df, etf_code, day)
+
+
+def trading_days(n_days, end=date(2025, 12, 26)):
+    days = []
+    current = end
+    while len(days) < n_days:
+        if current.weekday() < 5:
+            days.append(current)
+        current -= timedelta(days=1)
+    return sorted(days)
+
+
+def run_history(n_etfs, n_days, n_holdings, work_dir):
+    """
+    量測 n_etfs 檔 ETF、各 n_days 個交易日的歷史:
+    store_append (逐日寫入資料集)、compact、store_read、history_cold / history_warm (含快取)、changes
+
+    回傳:
+    ({階段: 秒數}, 總列數)
+    """
+    from holdings_changes import compute_holding_changes
+    from holdings_history import load_holdings_history_table
+
+    rng = np.random.default_rng(0)
+    data_dir = Path(work_dir) / "data"
+    store_dir = Path(work_dir) / "store"
+    days = trading_days(n_days)
+    etf_codes = [f"HIST{i:03d}" for i in range(n_etfs)]
+
+    tables = {}
+    for etf_code in etf_codes:
+        for day in days:
+            table = make_history_table(etf_code, day, n_holdings, rng)
+            tables[(etf_code, day)] = table
+            write_holding_file(table, data_dir / etf_code / "holding" / f"{day:%Y%m%d}.parquet")
+
+    timings = {}
+    start = time.perf_counter()
+    for (etf_code, day), table in tables.items():
+        append_snapshot(table, etf_code, day, "holding", store_dir)
+    timings["store_append"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compact(kind="holding", store_dir=store_dir)
+    timings["compact"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_rows = read_dataset("holding", etf_codes, store_dir=store_dir).num_rows
+    timings["store_read"] = time.perf_counter() - start
+
+    cache_dir = Path(work_dir) / "cache"
+    start = time.perf_counter()
+    load_holdings_history_table(etf_codes, base_dir=data_dir, cache_dir=cache_dir)
+    timings["history_cold"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    history = load_holdings_history_table(etf_codes, base_dir=data_dir, cache_dir=cache_dir)
+    timings["history_warm"] = time.perf_counter() - start
+
+    frame = history.to_pandas()
+    start = time.perf_counter()
+    compute_holding_changes(frame)
+    timings["changes"] = time.perf_counter() - start
+    return timings, n_rows
+
+
+# === 結果輸出與比較 ===
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR.parent,
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def result_key(record):
+    return (record["suite"], record.get("source"), record["stage"], record["n_etfs"], record.get("days"))
+
+
+def compare(current, previous_path):
+    """列出與先前結果相同項目的時間變化"""
+    previous = {result_key(r): r for r in json.loads(Path(previous_path).read_text(encoding="utf-8"))["results"]}
+    print(f"\n與 {previous_path} 比較 (>1 表示變快):")
+    for record in current:
+        old = previous.get(result_key(record))
+        if not old or not record["seconds"]:
+            continue
+        ratio = old["seconds"] / record["seconds"]
+        flag = "  ⚠ 變慢" if ratio < 0.8 else ""
+        label = " ".join(str(part) for part in result_key(record) if part is not None)
+        print(f"  {label:<40} {old['seconds'] * 1000:10.1f} → {record['seconds'] * 1000:10.1f} ms"
+              f"  ({ratio:5.2f}x){flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="資料管線各階段效能測試")
+    parser.add_argument("--etfs", type=int, nargs="+", default=[1, 10, 100], help="合成 ETF 數量")
+    parser.add_argument("--holdings", type=int, default=50, help="每檔 ETF 的持股檔數")
+    parser.add_argument("--history-days", type=int, nargs="*", default=[20, 250], help="歷史交易日數")
+    parser.add_argument("--history-etfs", type=int, default=3, help="歷史測試的 ETF 數量")
+    parser.add_argument("--output", help="結果檔路徑 (預設 benchmarks/results/pipeline-<時間>.json)")
+    parser.add_argument("--compare", help="與先前的結果檔比較")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_root = Path(tmp) / "fixtures"
+        recorded = prepare_fixtures(fixture_root, max(args.etfs), args.holdings)
+        for source, used in recorded.items():
+            print(f"{source}: {'錄製檔' if used else '合成資料'}")
+
+        server, base_url = start_fixture_server(fixture_root)
+        try:
+            for n_etfs in args.etfs:
+                work_dir = Path(tmp) / f"ingest-{n_etfs}"
+                timings = run_ingest(n_etfs, base_url, work_dir)
+                print(f"\n=== {n_etfs} 檔 ETF ===")
+                print(f"  {'來源':<8}" + "".join(f"{stage:>12}" for stage in STAGES) + "   (每檔 ms)")
+                for source, stage_times in timings.items():
+                    print(f"  {source:<10}" + "".join(
+                        f"{stage_times[stage] / n_etfs * 1000:12.2f}" for stage in STAGES))
+                    for stage in STAGES:
+                        results.append({"suite": "ingest", "source": source, "stage": stage, "n_etfs": n_etfs,
+                                        "recorded": recorded[source], "seconds": stage_times[stage],
+                                        "per_etf_ms": stage_times[stage] / n_etfs * 1000})
+        finally:
+            server.shutdown()
+
+        for n_days in args.history_days:
+            work_dir = Path(tmp) / f"history-{n_days}"
+            timings, n_rows = run_history(args.history_etfs, n_days, args.holdings, work_dir)
+            print(f"\n=== 歷史 {args.history_etfs} 檔 x {n_days} 日 ({n_rows:,} 列) ===")
+            for stage, seconds in timings.items():
+                print(f"  {stage:<14} {seconds * 1000:10.1f} ms")
+                results.append({"suite": "history", "stage": stage, "n_etfs": args.history_etfs,
+                                "days": n_days, "rows": n_rows, "seconds": seconds})
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"environment": environment(), "results": results},
+                                 ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n✓ 結果已寫入 {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+模組載入 (CLI 啟動) 時間測試
+在新的 Python 行程中 import 各模組，記錄最快的時間，並列出被載入的重量級套件
+以只載入 pandas + pyarrow 的時間作為基準
+
+執行方式:
+    python benchmarks/bench_startup.py --repeat 5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BASELINE = "pandas, pyarrow, pyarrow.compute, pyarrow.dataset, pyarrow.parquet"
+MODULES = [
+    "holdings_store",
+    "holdings_history",
+    "holdings_changes",
+    "query",
+    "lookthrough",
+    "instrumentation",
+    "get_00991A",
+    "get_00981A",
+    "get_00982A",
+    "run_all_etfs",
+    "watcher",
+    "backfill",
+]
+HEAVY = ("selenium", "bs4", "lxml", "openpyxl", "python_calamine", "selectolax", "requests")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(__import__('json').dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+"""
+
+
+def time_import(modules, repeat):
+    """回傳 (最快秒數, 被載入的重量級套件)；import 失敗時回傳 (None, 錯誤訊息)"""
+    best, heavy = None, []
+    code = PROBE.format(modules=modules, heavy=HEAVY)
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", code], cwd=str(ROOT), capture_output=True, text=True)
+        if completed.returncode != 0:
+            return None, completed.stderr.strip().splitlines()[-1]
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        best = result["elapsed"] if best is None else min(best, result["elapsed"])
+        heavy = result["heavy"]
+    return best, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模組載入時間測試")
+    parser.add_argument("--repeat", type=int, default=5, help="每個模組執行次數 (取最快)")
+    parser.add_argument("modules", nargs="*", help=f"要測試的模組 (預設: {', '.join(MODULES)})")
+    args = parser.parse_args(argv)
+
+    baseline, _ = time_import(BASELINE, args.repeat)
+    print(f"基準 (pandas + pyarrow): {baseline * 1000:7.1f} ms")
+    for module in args.modules or MODULES:
+        elapsed, heavy = time_import(module, args.repeat)
+        if elapsed is None:
+            print(f"  {module:<18} ✗ 無法載入: {heavy}")
+            continue
+        extra = ", ".join(heavy) if heavy else "-"
+        print(f"  {module:<18} {elapsed * 1000:7.1f} ms  (+{(elapsed - baseline) * 1000:6.1f} ms)  載入: {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+本機替身 HTTP 伺服器
+以錄製好的回應檔案取代投信網站，讓 HTTP 直接抓取可以在離線環境下測試與測速
+
+檔案配置 (以網址對應):
+    https://www.capitalfund.com.tw/CFWeb/api/etf/buyback
+    -> <root>/www.capitalfund.com.tw/CFWeb/api/etf/buyback
+    帶查詢字串的網址會優先尋找 <檔名>@<查詢字串>
+回應附帶 ETag (內容雜湊) 與 Last-Modified (檔案修改時間)，支援條件式請求 (304)
+
+使用方式:
+    # 錄製實際回應
+    python benchmarks/fixture_server.py record https://www.capitalfund.com.tw/CFWeb/api/etf/buyback
+    # 啟動替身伺服器，並讓抓取程式改連到它
+    python benchmarks/fixture_server.py serve --port 8765
+    set ETF_SNIPER_HTTP_BASE=http://127.0.0.1:8765
+"""
+
+import argparse
+import hashlib
+import mimetypes
+import sys
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_ROOT = BENCH_DIR / "fixtures" / "http"
+
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+
+def fixture_path(root, netloc_path, query=""):
+    """將 <host>/<path> 與查詢字串對應到錄製檔路徑"""
+    relative = unquote(netloc_path).lstrip("/")
+    if not relative or relative.endswith("/"):
+        relative += "index.html"
+    path = Path(root) / relative
+    if query:
+        with_query = path.with_name(f"{path.name}@{quote(query, safe='=&')}")
+        if with_query.exists():
+            return with_query
+    return path
+
+
+def _content_type(path, body):
+    guessed, _ = mimetypes.guess_type(path.name.split("@")[0])
+    if guessed:
+        return guessed
+    if body[:1] in (b"[", b"{"):
+        return "application/json; charset=utf-8"
+    return "application/octet-stream"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """依網址回傳錄製檔，找不到時回傳 404，內容未變更時回傳 304"""
+
+    root = DEFAULT_ROOT
+
+    def _serve(self, include_body=True):
+        parts = urlsplit(self.path)
+        path = fixture_path(self.root, parts.path, parts.query)
+        if not path.is_file():
+            self.send_error(404, f"no fixture: {path}")
+            return
+
+        body = path.read_bytes()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        last_modified = formatdate(path.stat().st_mtime, usegmt=True)
+        if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Type", _content_type(path, body))
+        self.send_header("Content-Length", str(len(body)))
+        if path.suffix in (".xls", ".xlsx"):
+            self.send_header("Content-Disposition", f'attachment; filename="{quote(path.name)}"')
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._serve()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._serve()
+
+    def do_HEAD(self):
+        self._serve(include_body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(root=DEFAULT_ROOT, host="127.0.0.1", port=0):
+    """
+    在背景執行緒啟動替身伺服器
+
+    回傳:
+    (server, base_url)，結束時呼叫 server.shutdown()
+    """
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"root": Path(root)})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def record(url, root=DEFAULT_ROOT, method="GET", headers=None):
+    """抓取實際網址並儲存為錄製檔，回傳檔案路徑"""
+    from http_fetch import request
+
+    parts = urlsplit(url)
+    path = fixture_path(root, f"{parts.netloc}{parts.path}")
+    if parts.query:
+        path = path.with_name(f"{path.name}@{quote(parts.query, safe='=&')}")
+    response = request(method, url, headers=headers, base_url=None)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(response.content)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="錄製投信網站回應，或啟動本機替身伺服器")
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="錄製檔根目錄")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="啟動替身伺服器")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+
+    record_parser = subparsers.add_parser("record", help="錄製實際網址的回應")
+    record_parser.add_argument("urls", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        for url in args.urls:
+            print(f"✓ 已錄製 {url} -> {record(url, args.root)}")
+        return
+
+    handler = type("BoundFixtureHandler", (FixtureHandler,), {"root": Path(args.root)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"替身伺服器啟動於 http://{args.host}:{args.port} (錄製檔: {args.root})")
+    print(f"請設定環境變數 ETF_SNIPER_HTTP_BASE=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+效能測試用的合成資料
+依照各投信檔案的版面產生假資料，沒有錄製檔時也能執行效能測試
+"""
+
+import random
+
+STOCK_POOL = [
+    ("2330", "台積電"), ("2317", "鴻海"), ("2454", "聯發科"), ("2308", "台達電"),
+    ("2382", "廣達"), ("2881", "富邦金"), ("2891", "中信金"), ("3711", "日月光投控"),
+    ("2303", "聯電"), ("2412", "中華電"), ("2882", "國泰金"), ("3231", "緯創"),
+]
+
+
+def stock_universe(n):
+    """產生 n 檔股票 (代號, 名稱)，超過內建清單的部分以流水號補足"""
+    stocks = list(STOCK_POOL[:n])
+    for i in range(len(stocks), n):
+        stocks.append((str(4000 + i), f"測試股{i}"))
+    return stocks
+
+
+def stock_weights(rng, n, total=95.0):
+    """產生 n 檔持股的權重 (%)，合計約為 total"""
+    raw = [rng.uniform(0.1, 10) for _ in range(n)]
+    scale = total / sum(raw) if raw else 0
+    return [w * scale for w in raw]
+
+
+def make_00991A_workbook(path, n_holdings=50, date_text="2025/12/26", seed=0):
+    """產生與復華 00991A 持股檔相同版面的 xlsx"""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook()
+    sheet = workbook.active
+    rows = [
+        ["復華台灣未來50主動式ETF證券投資信託基金"],
+        [f"資料日期：{date_text}"],
+        [None],
+        ["基金資產淨值"],
+        [f"{rng.randint(10**9, 10**10):,}"],
+        ["基金在外流通單位數"],
+        [f"{rng.randint(10**8, 10**9):,}"],
+        ["基金每單位淨值"],
+        [round(rng.uniform(9, 15), 2)],
+        [None],
+        ["證券代號", "證券名稱", "股數", "金額", "權重(%)"],
+    ]
+    for (code, name), weight in zip(stock_universe(n_holdings), stock_weights(rng, n_holdings)):
+        shares = rng.randint(1, 5000) * 1000
+        rows.append([int(code), name, f"{shares:,}", f"{shares * rng.uniform(20, 1000):,.0f}",
+                     round(weight, 3)])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def make_00982A_workbook(path, n_holdings=50, seed=0):
+    """產生與群益 00982A 下載檔相同分頁 (投資組合/股票/其他資產) 的 xlsx"""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    workbook = Workbook()
+    portfolio = workbook.active
+    portfolio.title = "投資組合"
+    for item in ("基金淨資產價值", "基金在外流通單位數", "基金每單位淨值"):
+        portfolio.append([item, f"TWD {rng.randint(10**8, 10**10):,}"])
+
+    holding = workbook.create_sheet("股票")
+    holding.append(["股票代號", "股票名稱", "持股權重(%)", "股數"])
+    for (code, name), weight in zip(stock_universe(n_holdings), stock_weights(rng, n_holdings)):
+        holding.append([code, name, f"{weight:.2f}%", f"{rng.randint(1, 5000) * 1000:,}"])
+
+    other = workbook.create_sheet("其他資產")
+    for item in ("現金", "期貨保證金", "申贖應付款"):
+        other.append([item, f"TWD {rng.randint(10**6, 10**8):,}"])
+
+    workbook.save(path)
+    return path
+
+
+def make_ezmoney_page(n_holdings=50, date_text="2025/12/26", filler_blocks=300, seed=0):
+    """產生與 ezmoney 基金頁面 (00981A) 結構相同的 HTML，filler_blocks 控制頁面其他內容的份量"""
+    rng = random.Random(seed)
+    filler = "".join(
+        f'<div class="card"><span>選單項目 {i}</span><a href="#"><span>連結 {i}</span></a>'
+        f'<p>說明文字 {i} / 其他資訊</p></div>'
+        for i in range(filler_blocks)
+    )
+
+    holding_rows = "".join(
+        f"<tr><td><span>{code}</span></td><td><span>{name}</span></td>"
+        f"<td><span>{rng.randint(1, 5000) * 1000:,}</span></td>"
+        f"<td><span>{weight:.2f}%</span></td></tr>"
+        for (code, name), weight in zip(stock_universe(n_holdings), stock_weights(rng, n_holdings))
+    )
+
+    def bordered_table(title, items):
+        rows = "".join(
+            f"<tr><td><span>{item}</span></td><td><span>NTD</span><span>{value:,}</span></td></tr>"
+            for item, value in items
+        )
+        return f'<table class="table table-bordered"><tr><th>{title}</th><th>金額</th></tr>{rows}</table>'
+
+    fund_table = bordered_table("基金資產", [
+        ("淨資產", rng.randint(10**9, 10**10)),
+        ("流通在外單位數", rng.randint(10**8, 10**9)),
+        ("每單位淨值", rng.randint(10, 20)),
+    ])
+    asset_table = bordered_table("項目", [
+        ("股票", rng.randint(10**9, 10**10)),
+        ("現金", rng.randint(10**7, 10**8)),
+        ("期貨保證金", rng.randint(10**6, 10**7)),
+    ])
+
+    return (
+        "<html><head><title>統一台股增長主動式ETF</title></head><body>"
+        f"{filler}<div class='date'><span>資料日期</span><span>{date_text}</span></div>"
+        f"{fund_table}{asset_table}"
+        "<table class='table'><thead><tr><th>股票代號</th><th>股票名稱</th><th>股數</th><th>持股權重</th></tr></thead>"
+        f"<tbody>{holding_rows}</tbody></table>"
+        f"{filler}</body></html>"
+    )
@@ -0,0 +1,94 @@
+"""
+下載完成偵測
+監看下載目錄，新檔案寫入完成 (沒有 .crdownload 暫存檔且大小不再變動) 時立即回傳，
+取代固定秒數的 time.sleep
+"""
+
+import os
+import tempfile
+import time
+
+# Chrome / Edge / Firefox 下載中的暫存檔副檔名
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp', '.download')
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_POLL_INTERVAL = 0.1
+
+
+class DownloadTimeoutError(TimeoutError):
+    """超過期限仍未完成下載"""
+
+
+def create_job_directory(download_path, prefix="job_"):
+    """在下載目錄下建立此工作專用的子目錄，避免平行工作互相取到對方的檔案"""
+    os.makedirs(download_path, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=download_path)
+
+
+def _is_partial(filename):
+    return filename.endswith(PARTIAL_SUFFIXES) or filename.startswith('.com.google.Chrome')
+
+
+def _snapshot(download_path):
+    """回傳 {檔名: 大小}，目錄不存在時回傳空字典"""
+    entries = {}
+    try:
+        with os.scandir(download_path) as it:
+            for entry in it:
+                if entry.is_file():
+                    try:
+                        entries[entry.name] = entry.stat().st_size
+                    except FileNotFoundError:
+                        continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def wait_for_download(download_path, timeout=DEFAULT_TIMEOUT, existing=None,
+                      poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    等待下載目錄中出現新的完整檔案
+
+    參數:
+    download_path: 下載目錄
+    timeout: 最長等待秒數
+    existing: 下載前已存在的檔名集合，這些檔案不會被視為新下載
+    poll_interval: 檢查間隔秒數
+
+    回傳:
+    下載完成的檔案完整路徑
+
+    例外:
+    DownloadTimeoutError: 超過 timeout 仍未完成
+    """
+    existing = set(existing or ())
+    deadline = time.monotonic() + timeout
+    last_sizes = {}
+
+    while True:
+        entries = _snapshot(download_path)
+        in_progress = any(_is_partial(name) for name in entries)
+        candidates = {
+            name: size for name, size in entries.items()
+            if name not in existing and not _is_partial(name)
+        }
+
+        if candidates and not in_progress:
+            # 大小連續兩次檢查相同且非零才視為寫入完成
+            stable = [
+                name for name, size in candidates.items()
+                if size > 0 and last_sizes.get(name) == size
+            ]
+            if stable:
+                newest = max(
+                    stable,
+                    key=lambda name: os.path.getmtime(os.path.join(download_path, name))
+                )
+                return os.path.join(download_path, newest)
+
+        last_sizes = candidates
+        if time.monotonic() >= deadline:
+            state = "仍在下載中" if in_progress else "沒有出現新檔案"
+            raise DownloadTimeoutError(f"等待下載逾時 ({timeout} 秒，{state}): {download_path}")
+        time.sleep(poll_interval)
@@ -0,0 +1,315 @@
+"""
+Headless Chrome 共用連線池
+預先啟動 N 個瀏覽器，每個 ETF 工作借用其中一個並開啟新分頁執行，
+工作結束後清除狀態並歸還；瀏覽器使用次數或記憶體超過上限時自動重啟
+selenium 只在實際啟動瀏覽器時才載入
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from instrumentation import attach_driver, stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_USES = 20
+DEFAULT_MAX_MEMORY_MB = 1500
+# 等待可用瀏覽器時重新檢查的間隔 (秒): 歸還時重啟失敗會空出名額，由等待中的工作補上
+ACQUIRE_POLL_INTERVAL = 1.0
+
+
+def build_chrome_options(download_path=None, headless=True):
+    """
+    建立 Chrome 選項
+
+    參數:
+    download_path: 預設下載目錄，None 表示不設定
+    headless: 是否使用無視窗模式
+    """
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+
+    if download_path:
+        prefs = {
+            "download.default_directory": str(download_path),
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+            "safebrowsing.enabled": True
+        }
+        chrome_options.add_experimental_option("prefs", prefs)
+
+    if headless:
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--window-size=1920,1080')
+
+    return chrome_options
+
+
+def launch_driver(download_path=None, headless=True):
+    """啟動一個新的 Chrome (記錄 driver_launch 階段並登記到目前的 EtfRun)"""
+    from selenium import webdriver
+
+    with stage("driver_launch"):
+        driver = webdriver.Chrome(options=build_chrome_options(download_path, headless))
+    attach_driver(driver)
+    return driver
+
+
+@contextmanager
+def browser(pool=None, download_path=None, headless=True):
+    """
+    取得一個瀏覽器: 提供 pool 時借用連線池的分頁，否則啟動新的瀏覽器並於結束時關閉
+
+    參數:
+    pool: ChromeDriverPool 或 None
+    download_path: 此工作的下載目錄
+    headless: 未使用連線池時是否使用無視窗模式
+    """
+    if pool is not None:
+        with pool.session(download_path=download_path) as driver:
+            yield driver
+        return
+
+    driver = launch_driver(download_path, headless)
+    try:
+        yield driver
+    finally:
+        driver.quit()
+
+
+def set_download_directory(driver, download_path):
+    """透過 DevTools 指令變更瀏覽器的下載目錄 (可於執行中切換)"""
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": os.path.abspath(download_path),
+    })
+
+
+def driver_memory_mb(driver):
+    """
+    計算 chromedriver 與其所有 Chrome 子行程的常駐記憶體 (MB)
+    未安裝 psutil 或無法取得行程資訊時回傳 None
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class _PooledDriver:
+    """連線池中的單一瀏覽器及其使用次數"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.base_handle = driver.current_window_handle
+        self.uses = 0
+
+
+class ChromeDriverPool:
+    """
+    Chrome WebDriver 連線池
+
+    使用方式:
+        with ChromeDriverPool(size=2) as pool:
+            with pool.session(download_path) as driver:
+                driver.get(url)
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, headless=True,
+                 max_uses=DEFAULT_MAX_USES, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+        """
+        參數:
+        size: 瀏覽器數量
+        headless: 是否使用無視窗模式
+        max_uses: 單一瀏覽器最多執行幾個工作後重啟，None 表示不限
+        max_memory_mb: 瀏覽器記憶體超過此值 (MB) 時重啟，None 表示不檢查
+        """
+        self.size = size
+        self.headless = headless
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def __enter__(self):
+        self.warm()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _launch(self):
+        from selenium import webdriver
+
+        driver = webdriver.Chrome(options=build_chrome_options(headless=self.headless))
+        logger.info("已啟動 Chrome (連線池 %d/%d)", self._created, self.size)
+        return _PooledDriver(driver)
+
+    def warm(self):
+        """預先啟動所有瀏覽器"""
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(self._launch())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self, timeout):
+        """
+        取得閒置的瀏覽器，沒有閒置且數量未達上限時啟動新的 (啟動失敗時拋出例外)
+        等待中每 ACQUIRE_POLL_INTERVAL 秒重新檢查數量，timeout 秒內都取不到時拋出 TimeoutError
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("連線池已關閉")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_launch = self._created < self.size
+                if can_launch:
+                    self._created += 1
+            if can_launch:
+                try:
+                    return self._launch()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            wait = ACQUIRE_POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"等待可用的 Chrome 超過 {timeout} 秒")
+                wait = min(wait, remaining)
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def _discard(self, pooled):
+        with self._lock:
+            self._created -= 1
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning("關閉 Chrome 失敗: %s", e)
+
+    def _reset(self, pooled):
+        """關閉工作分頁並清除 cookies / storage，回到初始分頁"""
+        driver = pooled.driver
+        origins = set()
+        for handle in driver.window_handles:
+            if handle != pooled.base_handle:
+                driver.switch_to.window(handle)
+                origin = driver.execute_script("return window.location.origin;")
+                if origin and origin.startswith("http"):
+                    origins.add(origin)
+                driver.close()
+        driver.switch_to.window(pooled.base_handle)
+        for origin in origins:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+                "origin": origin,
+                "storageTypes": "all",
+            })
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+
+    def _should_recycle(self, pooled):
+        if self.max_uses is not None and pooled.uses >= self.max_uses:
+            logger.info("Chrome 已使用 %d 次，重新啟動", pooled.uses)
+            return True
+        if self.max_memory_mb is not None:
+            memory = driver_memory_mb(pooled.driver)
+            if memory is not None and memory > self.max_memory_mb:
+                logger.info("Chrome 記憶體 %.0f MB 超過上限，重新啟動", memory)
+                return True
+        return False
+
+    @contextmanager
+    def session(self, download_path=None, timeout=None):
+        """
+        借用一個瀏覽器並開啟新分頁
+
+        參數:
+        download_path: 此工作的下載目錄，None 表示不變更
+        timeout: 等待可用瀏覽器的秒數 (逾時拋出 TimeoutError)，None 表示一直等到有瀏覽器歸還或空出名額
+        """
+        if self._closed:
+            raise RuntimeError("連線池已關閉")
+
+        with stage("driver_launch"):
+            pooled = self._acquire(timeout)
+        attach_driver(pooled.driver)
+        try:
+            pooled.driver.switch_to.new_window('tab')
+            if download_path:
+                set_download_directory(pooled.driver, download_path)
+            yield pooled.driver
+        finally:
+            self._release(pooled)
+
+    def _release(self, pooled):
+        """重設瀏覽器狀態後歸還，無法重設或需要回收時改為重啟"""
+        pooled.uses += 1
+        healthy = True
+        try:
+            self._reset(pooled)
+        except Exception as e:
+            logger.warning("重設 Chrome 狀態失敗: %s", e)
+            healthy = False
+
+        if healthy and not self._closed and not self._should_recycle(pooled):
+            self._idle.put(pooled)
+            return
+
+        self._discard(pooled)
+        if not self._closed:
+            # 補上新的瀏覽器；失敗時空出的名額由等待中的工作 (_acquire) 重新啟動
+            try:
+                self.warm()
+            except Exception as e:
+                logger.error("重新啟動 Chrome 失敗: %s", e)
+
+    def close(self):
+        """關閉所有閒置的瀏覽器，借出中的瀏覽器會在歸還時關閉"""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
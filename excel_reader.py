@@ -0,0 +1,166 @@
+"""
+Excel 單次讀取工具
+每個活頁簿只解析一次，取得原始儲存格網格 (不套用標題列)，
+再從記憶體中的網格切出基金資訊區塊與持股區塊
+
+支援的讀取引擎:
+- "calamine": python-calamine (Rust 實作，最快)
+- "openpyxl": openpyxl 唯讀模式 (read_only + values_only)
+- "pandas": pandas.read_excel 預設引擎
+- None: 自動選擇 (calamine > openpyxl > pandas)
+"""
+
+import re
+from datetime import date, datetime
+
+import pandas as pd
+
+ENGINES = ("calamine", "openpyxl", "pandas")
+
+# 2025/12/26、2025-12-26、2025年12月26日、民國 114/12/26
+DATE_PATTERN = re.compile(r'(\d{3,4})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})')
+# 未找到「日期」標籤時，只在前幾列尋找日期儲存格
+DATE_SEARCH_ROWS = 20
+
+
+def _has_module(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def default_engine():
+    """回傳目前環境可用的最快引擎"""
+    if _has_module("python_calamine"):
+        return "calamine"
+    if _has_module("openpyxl"):
+        return "openpyxl"
+    return "pandas"
+
+
+def _read_openpyxl(input_file, sheet_names):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        names = workbook.sheetnames
+        grids = {}
+        for sheet in sheet_names:
+            name = names[sheet] if isinstance(sheet, int) else sheet
+            rows = list(workbook[name].iter_rows(values_only=True))
+            grids[sheet] = pd.DataFrame(rows, dtype=object)
+        return grids
+    finally:
+        workbook.close()
+
+
+def read_workbook_grids(input_file, sheet_names=(0,), engine=None):
+    """
+    一次開啟活頁簿並讀取多個工作表的原始網格
+
+    參數:
+    input_file: Excel 檔案路徑
+    sheet_names: 工作表名稱或索引的序列
+    engine: 讀取引擎，見模組說明
+
+    回傳:
+    {工作表: DataFrame}，DataFrame 欄位為 0, 1, 2...，內容為原始儲存格值
+    """
+    engine = engine or default_engine()
+    if engine not in ENGINES:
+        raise ValueError(f"不支援的 Excel 讀取引擎: {engine} (可用: {', '.join(ENGINES)})")
+
+    sheet_names = list(sheet_names)
+    if engine == "openpyxl" and not str(input_file).lower().endswith(".xls"):
+        return _read_openpyxl(input_file, sheet_names)
+
+    read_engine = "calamine" if engine == "calamine" else None
+    return pd.read_excel(input_file, sheet_name=sheet_names, header=None, engine=read_engine, dtype=object)
+
+
+def read_sheet_grid(input_file, sheet_name=0, engine=None):
+    """讀取單一工作表的原始網格"""
+    return read_workbook_grids(input_file, [sheet_name], engine=engine)[sheet_name]
+
+
+def find_row(grid, value, column=0):
+    """回傳指定欄位第一個等於 value 的列索引，找不到時回傳 None"""
+    matches = grid.index[grid[column].astype(str).str.strip() == value]
+    return matches[0] if len(matches) else None
+
+
+def grid_to_frame(grid, header_row, end_row=None):
+    """
+    以網格中的某一列作為標題，切出其下方的資料表
+    (等同 pd.read_excel(header=header_row)，但不需重新解析檔案)
+
+    參數:
+    grid: read_sheet_grid 回傳的網格
+    header_row: 標題列索引
+    end_row: 資料結束列 (不含)，None 表示到最後一列
+    """
+    header = grid.iloc[header_row]
+    body = grid.iloc[header_row + 1:end_row]
+
+    # 丟棄沒有標題的欄位 (等同 read_excel 的 Unnamed 欄位)
+    keep = header.notna() & (header.astype(str).str.strip() != "")
+    body = body.loc[:, keep.values]
+    body.columns = [str(name).strip() for name in header[keep]]
+
+    body = body.dropna(how='all').reset_index(drop=True)
+    # 依內容推斷欄位型態，與 read_excel 的型態判斷一致
+    return body.infer_objects()
+
+
+def parse_date(value):
+    """儲存格值或文字轉為 YYYYMMDD，不是日期時回傳 None (三位數年份視為民國年)"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y%m%d")
+    if not isinstance(value, str):
+        return None
+    match = DATE_PATTERN.search(value)
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    if year < 1000:
+        year += 1911
+    try:
+        return date(year, month, day).strftime("%Y%m%d")
+    except ValueError:
+        return None
+
+
+def find_date(grid, label="日期"):
+    """
+    在網格中尋找資料日期
+
+    先找包含 label 的儲存格 (例如「資料日期：2025/12/26」)，日期可在同一格、右側或下方；
+    找不到時改找前 DATE_SEARCH_ROWS 列中的第一個日期儲存格
+
+    回傳:
+    YYYYMMDD 字串，找不到時回傳 None
+    """
+    n_rows, n_cols = grid.shape
+    for row in range(n_rows):
+        for col in range(n_cols):
+            value = grid.iat[row, col]
+            if not (isinstance(value, str) and label in value):
+                continue
+            neighbors = [value]
+            if col + 1 < n_cols:
+                neighbors.append(grid.iat[row, col + 1])
+            if row + 1 < n_rows:
+                neighbors.append(grid.iat[row + 1, col])
+            for candidate in neighbors:
+                found = parse_date(candidate)
+                if found:
+                    return found
+
+    for row in range(min(n_rows, DATE_SEARCH_ROWS)):
+        for col in range(n_cols):
+            found = parse_date(grid.iat[row, col])
+            if found:
+                return found
+    return None
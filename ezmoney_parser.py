@@ -0,0 +1,209 @@
+"""
+統一投信 ezmoney 基金頁面 (00981A) 解析
+以可替換的解析後端直接定位持股表格、table-bordered 資產表格與資料日期，
+不必掃描整份頁面的所有 span / table
+
+支援的解析後端:
+- "lxml": lxml.html + XPath
+- "selectolax": selectolax (lexbor) + CSS selector
+- "bs4": BeautifulSoup html.parser (原本的解析方式)
+- None: 自動選擇 (selectolax > lxml > bs4)
+
+所有後端回傳相同結構:
+{
+    'data_date': 'YYYY/MM/DD' 或 None,
+    'holdings': [{'股票代號', '股票名稱', '股數', '持股權重'}, ...] 或 None (找不到表格),
+    'portfolio_tables': [{項目名稱: 金額文字}, ...],
+}
+"""
+
+import re
+from datetime import datetime
+
+BACKENDS = ("lxml", "selectolax", "bs4")
+
+HOLDING_COLUMNS = ['股票代號', '股票名稱', '股數', '持股權重']
+
+DATE_PATTERN = re.compile(r'^\d{4}/\d{1,2}/\d{1,2}$')
+
+
+def default_backend():
+    """回傳目前環境可用的最快解析後端"""
+    for backend, module in (("selectolax", "selectolax.lexbor"), ("lxml", "lxml.html")):
+        try:
+            __import__(module)
+            return backend
+        except ImportError:
+            continue
+    return "bs4"
+
+
+def _match_date(text):
+    text = text.strip()
+    if not DATE_PATTERN.match(text):
+        return None
+    try:
+        datetime.strptime(text, '%Y/%m/%d')
+    except ValueError:
+        return None
+    return text
+
+
+def _is_portfolio_table(text):
+    """基金資產表格，或包含「項目」與「金額」的資產配置表格"""
+    return '基金資產' in text or '淨資產' in text or ('項目' in text and '金額' in text)
+
+
+# === lxml ===
+
+def _text(node):
+    return node.text_content().strip()
+
+
+def _parse_lxml(html):
+    from lxml import html as lxml_html
+
+    root = lxml_html.fromstring(html)
+
+    data_date = None
+    # contains(., ...) 比對整個 span 的文字 (與其他後端相同)，text() 只會檢查第一個文字節點
+    for span in root.xpath("//span[contains(., '/')]"):
+        data_date = _match_date(_text(span))
+        if data_date:
+            break
+
+    holdings = None
+    holding_tables = root.xpath("(//table[.//text()[contains(., '股票名稱')]])[1]")
+    if holding_tables:
+        holdings = []
+        for row in holding_tables[0].xpath(".//tr[count(td)=4]"):
+            spans = [td.find('.//span') for td in row.xpath("./td")]
+            if all(span is not None for span in spans):
+                holdings.append(dict(zip(HOLDING_COLUMNS, (_text(span) for span in spans))))
+
+    portfolio_tables = []
+    bordered = root.xpath("//table[contains(concat(' ', normalize-space(@class), ' '), ' table-bordered ')]")
+    for table in bordered:
+        if not _is_portfolio_table(table.text_content()):
+            continue
+        data = {}
+        for row in table.xpath(".//tr[count(td)>=2]"):
+            tds = row.xpath("./td")
+            item_span = tds[0].find('.//span')
+            value_spans = tds[1].xpath(".//span")
+            if item_span is not None and value_spans:
+                data[_text(item_span)] = _text(value_spans[-1])
+        portfolio_tables.append(data)
+
+    return {'data_date': data_date, 'holdings': holdings, 'portfolio_tables': portfolio_tables}
+
+
+# === selectolax ===
+
+def _parse_selectolax(html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+
+    data_date = None
+    for span in tree.css("span"):
+        text = span.text()
+        if '/' in text:
+            data_date = _match_date(text)
+            if data_date:
+                break
+
+    holdings = None
+    for table in tree.css("table"):
+        if '股票名稱' in table.text():
+            holdings = []
+            for row in table.css("tr"):
+                tds = [node for node in row.iter() if node.tag == 'td']
+                if len(tds) != 4:
+                    continue
+                spans = [td.css_first("span") for td in tds]
+                if all(span is not None for span in spans):
+                    holdings.append(dict(zip(HOLDING_COLUMNS, (span.text().strip() for span in spans))))
+            break
+
+    portfolio_tables = []
+    for table in tree.css("table.table-bordered"):
+        if not _is_portfolio_table(table.text()):
+            continue
+        data = {}
+        for row in table.css("tr"):
+            tds = [node for node in row.iter() if node.tag == 'td']
+            if len(tds) < 2:
+                continue
+            item_span = tds[0].css_first("span")
+            value_spans = tds[1].css("span")
+            if item_span is not None and value_spans:
+                data[item_span.text().strip()] = value_spans[-1].text().strip()
+        portfolio_tables.append(data)
+
+    return {'data_date': data_date, 'holdings': holdings, 'portfolio_tables': portfolio_tables}
+
+
+# === BeautifulSoup (原本的解析方式) ===
+
+def _parse_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    data_date = None
+    for span in soup.find_all('span'):
+        text = span.text.strip()
+        if '/' in text and len(text.split('/')) == 3:
+            data_date = _match_date(text)
+            if data_date:
+                break
+
+    holdings = None
+    for t in soup.find_all('table'):
+        if '股票名稱' in t.text:
+            holdings = []
+            for row in t.find_all('tr'):
+                tds = row.find_all('td')
+                if len(tds) == 4:
+                    spans = [td.find('span') for td in tds]
+                    if all(spans):
+                        holdings.append(dict(zip(HOLDING_COLUMNS, (span.text.strip() for span in spans))))
+            break
+
+    portfolio_tables = []
+    for table in soup.find_all('table', class_='table-bordered'):
+        if not _is_portfolio_table(table.text):
+            continue
+        data = {}
+        for row in table.find_all('tr'):
+            tds = row.find_all('td')
+            if len(tds) >= 2:
+                item_span = tds[0].find('span')
+                value_spans = tds[1].find_all('span')
+                if item_span and value_spans:
+                    data[item_span.text.strip()] = value_spans[-1].text.strip()
+        portfolio_tables.append(data)
+
+    return {'data_date': data_date, 'holdings': holdings, 'portfolio_tables': portfolio_tables}
+
+
+_PARSERS = {
+    "lxml": _parse_lxml,
+    "selectolax": _parse_selectolax,
+    "bs4": _parse_bs4,
+}
+
+
+def parse_ezmoney_page(html, backend=None):
+    """
+    解析 ezmoney 基金頁面
+
+    參數:
+    html: 頁面原始碼 (driver.page_source)
+    backend: 解析後端，見模組說明
+    """
+    backend = backend or default_backend()
+    if backend not in _PARSERS:
+        raise ValueError(f"不支援的 HTML 解析後端: {backend} (可用: {', '.join(BACKENDS)})")
+    return _PARSERS[backend](html)
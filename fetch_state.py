@@ -0,0 +1,143 @@
+"""
+抓取內容指紋與變更偵測
+假日或投信尚未更新時，下載到的檔案 / 頁面 / JSON 與上一次完全相同，
+以內容雜湊比對 data/<ETF>/state.json 記錄的上一次結果，相同時略過解析與寫檔
+
+state.json 內容:
+{
+    "hash": "sha256 十六進位",
+    "hashes": {"json": "...", "xlsx": "..."},   # 有多種來源的 ETF (例如 00982A 的 API 與 Excel) 各自的指紋
+    "data_date": "YYYYMMDD",
+    "etag": "...",              # 伺服器提供時才有，用於 If-None-Match
+    "last_modified": "...",     # 伺服器提供時才有，用於 If-Modified-Since
+    "updated_at": "2025-12-26T17:30:00",
+    "publish_times": ["17:32", ...]   # watcher 觀察到的發布時間 (最近 PUBLISH_HISTORY 筆)
+}
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+STATE_FILE = "state.json"
+CHUNK_SIZE = 1024 * 1024
+PUBLISH_HISTORY = 20
+
+
+def fingerprint(content):
+    """
+    計算內容的 sha256
+
+    參數:
+    content: bytes、str，或可 JSON 序列化的物件 (dict / list，依鍵排序後計算，與鍵順序無關)
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    elif not isinstance(content, (bytes, bytearray, memoryview)):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'),
+                             default=str).encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def fingerprint_file(path):
+    """計算檔案內容的 sha256 (分段讀取)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FetchState:
+    """單一 ETF 上一次抓取的內容指紋、資料日期與 HTTP 驗證資訊"""
+
+    def __init__(self, etf_code, base_dir):
+        self.etf_code = etf_code
+        self.path = Path(base_dir) / etf_code / STATE_FILE
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @property
+    def data_date(self):
+        return self.data.get('data_date')
+
+    def _hash(self, source):
+        return self.data.get('hashes', {}).get(source) if source else self.data.get('hash')
+
+    def is_unchanged(self, digest, source=None):
+        """
+        內容與上一次成功處理的相同
+
+        參數:
+        source: 來源種類 ("json" / "xlsx" 等)，指定時只與同一來源上一次的指紋比較
+        """
+        return digest is not None and digest == self._hash(source)
+
+    def conditional_headers(self):
+        """條件式請求標頭 (If-None-Match / If-Modified-Since)，沒有記錄時為空字典"""
+        headers = {}
+        if self.data.get('etag'):
+            headers['If-None-Match'] = self.data['etag']
+        if self.data.get('last_modified'):
+            headers['If-Modified-Since'] = self.data['last_modified']
+        return headers
+
+    def update_validators(self, response_headers):
+        """記錄回應中的 ETag / Last-Modified (不寫檔，於 record 時一併寫入)"""
+        if response_headers is None:
+            return
+        if response_headers.get('ETag'):
+            self.data['etag'] = response_headers['ETag']
+        if response_headers.get('Last-Modified'):
+            self.data['last_modified'] = response_headers['Last-Modified']
+
+    def record(self, digest, data_date=None, response_headers=None, source=None):
+        """成功處理後記錄內容指紋 (source 指定時記錄在該來源之下) 與資料日期"""
+        self.update_validators(response_headers)
+        if source:
+            self.data.setdefault('hashes', {})[source] = digest
+        else:
+            self.data['hash'] = digest
+        if data_date:
+            self.data['data_date'] = data_date
+        self.data['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        self._save()
+
+    @property
+    def publish_times(self):
+        return list(self.data.get('publish_times', []))
+
+    def record_publish(self, published_at):
+        """記錄一次觀察到的發布時間 (HH:MM)，供 watcher 估計該投信的發布時間"""
+        times = self.publish_times + [published_at.strftime('%H:%M')]
+        self.data['publish_times'] = times[-PUBLISH_HISTORY:]
+        self._save()
+
+    def reload(self):
+        """重新讀取 state.json (其他行程處理完成後)"""
+        self.data = self._load()
+        return self
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+
+def data_date_of(*frames):
+    """由處理結果的 日期 欄位取得資料日期 (YYYYMMDD)，都沒有時回傳 None"""
+    import pandas as pd
+
+    for df in frames:
+        if df is not None and '日期' in df.columns and len(df):
+            return pd.Timestamp(df['日期'].iloc[0]).strftime('%Y%m%d')
+    return None
@@ -0,0 +1,236 @@
+"""
+ETF 申購 / 買回資金流量
+由每日投資組合資料的流通在外單位數與每單位淨值推算:
+- 單位數變化: 本日單位數 - 前一個資料日的單位數
+- 淨申贖金額: 單位數變化 × 本日每單位淨值 (正值為淨申購，負值為淨買回)
+- 淨申贖比例: 淨申贖金額 / 前一個資料日的淨資產
+- 累計淨申贖 (5 / 20 / 60 個資料日)
+
+各投信投資組合資料格式不同，先統一為 etf、日期、流通在外單位數、每單位淨值、淨資產:
+- 00991A: 基金在外流通單位數 / 基金每單位淨值 / 基金資產淨值 欄位
+- 00981A: 流通在外單位數 / 每單位淨值 / 淨資產 欄位
+- 00982A: 項目 / 金額 長表格 (基金在外流通單位數、基金每單位淨值、基金淨資產價值 等項目)
+
+結果存放於 data/analytics/fund_flows.parquet，每次只計算新增的日期
+(每次寫入新資料後由 run_all_etfs / watcher 更新；補寫過去日期時以 --rebuild 重建)
+
+使用方式:
+    python fund_flows.py                  # 更新所有 ETF 並列出最近 10 個資料日的流量
+    python fund_flows.py 00981A --days 20
+"""
+
+import argparse
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analytics_table import update_table
+from holdings_store import STORE_DIR, read_dataset
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+ANALYTICS_DIR = DATA_DIR / "analytics"
+FLOWS_FILE = ANALYTICS_DIR / "fund_flows.parquet"
+
+# 各投信投資組合資料的欄位 (寬表格的欄位名稱，或 00982A 長表格 項目 欄的值)
+UNITS_COLUMNS = ('基金在外流通單位數', '流通在外單位數')
+NAV_COLUMNS = ('基金每單位淨值', '每單位淨值')
+NET_ASSET_COLUMNS = ('基金資產淨值', '淨資產', '基金淨資產價值')
+
+FUND_COLUMNS = ['etf', '日期', '流通在外單位數', '每單位淨值', '淨資產']
+
+# 累計流量的期間 (資料日數)
+ROLLING_WINDOWS = (5, 20, 60)
+
+FLOW_COLUMNS = FUND_COLUMNS + [
+    '前日日期', '單位數變化', '淨申贖金額', '淨申贖比例',
+] + [f'累計淨申贖_{window}日' for window in ROLLING_WINDOWS]
+
+# 同一行程中多個 ETF 平行寫入時，避免同時讀寫結果檔
+_update_lock = threading.Lock()
+
+
+def first_available(df, columns):
+    """依序取第一個存在且非空的欄位值 (數值)"""
+    result = pd.Series(np.nan, index=df.index)
+    for column in columns:
+        if column in df.columns:
+            result = result.fillna(pd.to_numeric(df[column], errors='coerce'))
+    return result
+
+
+def wide_portfolio(portfolio):
+    """
+    投資組合資料轉為每個 (etf, 日期) 一列的寬表格
+
+    參數:
+    portfolio: 資料集的投資組合資料 (DataFrame 或 pyarrow.Table，含 etf、日期)；
+               可為寬表格 (每個項目一欄) 或 項目 / 金額 長表格，多個 ETF 的不同格式可混在一起
+
+    回傳:
+    DataFrame，長表格的 項目 值轉為欄位 (同一天同一項目取第一筆)，etf 為字串、日期為 datetime
+    """
+    df = portfolio.to_pandas() if isinstance(portfolio, pa.Table) else portfolio.copy()
+    if df.empty:
+        return pd.DataFrame(columns=['etf', '日期'])
+    df['etf'] = df['etf'].astype(str)
+    df['日期'] = pd.to_datetime(df['日期'])
+
+    if '項目' in df.columns and '金額' in df.columns:
+        items = df.loc[df['項目'].notna(), ['etf', '日期', '項目', '金額']].copy()
+        items['項目'] = items['項目'].astype(str).str.strip()
+        wide = items.pivot_table(index=['etf', '日期'], columns='項目', values='金額', aggfunc='first')
+        df = (df.drop(columns=['項目', '金額']).drop_duplicates(['etf', '日期']).set_index(['etf', '日期'])
+              .combine_first(wide).reset_index())
+    return df
+
+
+def fund_units_nav(portfolio):
+    """
+    由投資組合資料取得每檔 ETF 每日的流通在外單位數、每單位淨值與淨資產
+
+    參數:
+    portfolio: 資料集的投資組合資料 (格式見 wide_portfolio)
+
+    回傳:
+    DataFrame，欄位為 FUND_COLUMNS，依 etf、日期排序；
+    每單位淨值缺少時以 淨資產 / 單位數 推算，淨資產缺少時以 單位數 × 每單位淨值 推算
+    """
+    df = wide_portfolio(portfolio)
+    if df.empty:
+        return pd.DataFrame(columns=FUND_COLUMNS)
+
+    fund = df[['etf', '日期']].copy()
+    fund['流通在外單位數'] = first_available(df, UNITS_COLUMNS)
+    net_assets = first_available(df, NET_ASSET_COLUMNS)
+    fund['每單位淨值'] = first_available(df, NAV_COLUMNS).fillna(net_assets / fund['流通在外單位數'])
+    fund['淨資產'] = net_assets.fillna(fund['流通在外單位數'] * fund['每單位淨值'])
+    fund = fund[fund['流通在外單位數'] > 0]
+    return (fund.groupby(['etf', '日期'], as_index=False).first()
+            .sort_values(['etf', '日期'], ignore_index=True))
+
+
+def _rolling_sum(values, group_start, window):
+    """每列往前 window 列 (不跨 ETF) 的總和；values 中的 NaN 視為 0"""
+    cumulative = np.r_[0.0, np.cumsum(np.nan_to_num(values))]
+    index = np.arange(len(values))
+    start = np.maximum(index - window + 1, group_start)
+    return cumulative[index + 1] - cumulative[start]
+
+
+def compute_fund_flows(fund, windows=ROLLING_WINDOWS):
+    """
+    一次計算所有 ETF、所有日期的資金流量
+
+    參數:
+    fund: fund_units_nav 的結果 (可包含多檔 ETF)
+    windows: 累計流量的期間 (資料日數)
+
+    回傳:
+    DataFrame，欄位為 FLOW_COLUMNS；每檔 ETF 第一個資料日沒有前一日可比較，單位數變化等欄位為 NaN
+    """
+    df = fund[FUND_COLUMNS].sort_values(['etf', '日期'], ignore_index=True)
+    if df.empty:
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+
+    etfs = df['etf'].to_numpy()
+    first = np.r_[True, etfs[1:] != etfs[:-1]]
+    # 每列所屬 ETF 的第一列位置
+    group_start = np.maximum.accumulate(np.where(first, np.arange(len(df)), 0))
+
+    units = df['流通在外單位數'].to_numpy(float)
+    nav = df['每單位淨值'].to_numpy(float)
+    assets = df['淨資產'].to_numpy(float)
+
+    def previous(values):
+        shifted = np.r_[np.nan, values[:-1]]
+        shifted[first] = np.nan
+        return shifted
+
+    change = units - previous(units)
+    flow = change * nav
+    prev_assets = previous(assets)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(prev_assets > 0, flow / prev_assets, np.nan)
+
+    dates = df['日期'].to_numpy()
+    prev_dates = np.r_[dates[:1], dates[:-1]].copy()
+    prev_dates[first] = np.datetime64('NaT')
+
+    df['前日日期'] = prev_dates
+    df['單位數變化'] = change
+    df['淨申贖金額'] = flow
+    df['淨申贖比例'] = ratio
+    for window in windows:
+        df[f'累計淨申贖_{window}日'] = _rolling_sum(flow, group_start, window)
+    return df
+
+
+def load_fund_flows(path=FLOWS_FILE):
+    """讀取已計算的資金流量，不存在時回傳空的 DataFrame"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+    return pd.read_parquet(path)
+
+
+def update_fund_flows(etf_codes=None, store_dir=STORE_DIR, path=FLOWS_FILE, rebuild=False, rewritten=None):
+    """
+    增量更新資金流量表: 每檔 ETF 只讀取上次更新之後的投資組合資料
+    (以既有結果的最後幾列作為前一日與累計流量的起點)
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示資料集中全部
+    rebuild: 重新計算 etf_codes 的全部日期 (其他 ETF 的列保留)
+    rewritten: {ETF 代碼: 最早被覆寫的快照日期}，該 ETF 自這天起重新計算 (見 holdings_store.take_rewritten_dates)
+
+    回傳:
+    (完整資金流量表, 本次新增的列)
+    """
+    context_rows = max(ROLLING_WINDOWS)
+
+    def compute(since, codes, existing):
+        start = (pd.Timestamp(since) + timedelta(days=1)).date() if since is not None else None
+        fund = fund_units_nav(read_dataset("portfolio", codes, start=start, store_dir=store_dir))
+        if fund.empty:
+            return None
+        context = existing[existing['etf'].isin(codes)].groupby('etf').tail(context_rows)
+        combined = pd.concat([context[FUND_COLUMNS], fund], ignore_index=True) if len(context) else fund
+        flows = compute_fund_flows(combined)
+        return flows[flows['日期'] > pd.Timestamp(since)] if since is not None else flows
+
+    return update_table(path, compute, load_fund_flows, FLOW_COLUMNS, ['etf', '日期'], _update_lock,
+                        etf_codes, "portfolio", store_dir, rebuild, rewritten=rewritten)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算 ETF 每日申購 / 買回資金流量")
+    parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--days", type=int, default=10, help="每檔 ETF 列出的資料日數")
+    parser.add_argument("--rebuild", action="store_true", help="重新計算指定 ETF (預設全部) 的全部日期")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    flows, new_rows = update_fund_flows(args.etf_codes or None, store_dir=base_dir / "store",
+                                        path=base_dir / "analytics" / FLOWS_FILE.name, rebuild=args.rebuild)
+    print(f"✓ 新增 {len(new_rows)} 筆資金流量，共 {len(flows)} 筆")
+
+    columns = ['日期', '流通在外單位數', '每單位淨值', '單位數變化', '淨申贖金額', '淨申贖比例',
+               f'累計淨申贖_{ROLLING_WINDOWS[1]}日']
+    for etf_code in args.etf_codes or sorted(flows['etf'].unique()):
+        etf_flows = flows[flows['etf'] == etf_code]
+        if etf_flows.empty:
+            print(f"⚠ {etf_code} 沒有投資組合資料")
+            continue
+        print("=" * 60)
+        print(f"{etf_code} 最近 {args.days} 個資料日")
+        print("=" * 60)
+        print(etf_flows.tail(args.days)[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,241 +1,281 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
-import pandas as pd
-from datetime import datetime
-from pathlib import Path
+"""
+00981A (統一台股增長主動式ETF) 持股爬蟲
+以瀏覽器開啟 ezmoney 基金頁面，解析持股明細與基金資產後儲存為 Parquet
+
+匯入本模組不會讀取設定、建立目錄或啟動瀏覽器 (selenium 只在 run() 中載入):
+    from get_00981A import run
+    run(data_path="data/00981A", pool=pool)
+
+直接執行時使用 config/config.ini 的 data_path 與 log_path:
+    python get_00981A.py
+"""
+
 import configparser
 import logging
-import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from driver_pool import browser
+from ezmoney_parser import parse_ezmoney_page
+from fetch_state import FetchState, fingerprint
+from holdings_schema import save_holdings
+from instrumentation import EtfRun, current_run, stage
+from numeric_clean import parse_numbers, parse_percent
+from holdings_store import append_snapshot, store_dir_for
+from raw_archive import archive_bytes, archive_dir_for
 
-# === 直接讀取配置 ===
 BASE_DIR = Path(__file__).parent
 CONFIG_FILE = BASE_DIR / "config" / "config.ini"
 
-config = configparser.ConfigParser()
-config.read(CONFIG_FILE, encoding='utf-8')
-
-etf_code = '00981A'
-etf_name = config[etf_code]['name']
-data_path = BASE_DIR / config[etf_code]['data_path']
-log_path = BASE_DIR / config[etf_code]['log_path']
-
-data_path.mkdir(parents=True, exist_ok=True)
-log_path.mkdir(parents=True, exist_ok=True)
-
-# === 設定日誌 ===
-log_file = log_path / f"{datetime.now().strftime('%Y%m%d')}.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+ETF_CODE = '00981A'
+URL = "https://www.ezmoney.com.tw/ETF/Fund/Info?fundCode=49YTW"
+
+# 投資組合欄位順序 (只保留存在的欄位，其他欄位接在後面)
+PORTFOLIO_COLUMNS = [
+    '日期',
+    '淨資產',
+    '流通在外單位數',
+    '每單位淨值',
+    '期貨(名目本金)',
+    '股票',
+    '現金',
+    '期貨保證金',
+    '申贖應付款',
+    '應收付證券款'
+]
+
 logger = logging.getLogger(__name__)
 
-logger.info(f"ETF: {etf_name}")
-logger.info(f"資料將儲存至: {data_path}")
-logger.info(f"日誌路徑: {log_path}")
-
-# === 設定 Chrome Headless 模式 ===
-chrome_options = Options()
-chrome_options.add_argument('--headless')
-chrome_options.add_argument('--no-sandbox')
-chrome_options.add_argument('--disable-dev-shm-usage')
-chrome_options.add_argument('--disable-gpu')
-chrome_options.add_argument('--window-size=1920,1080')
-
-driver = webdriver.Chrome(options=chrome_options)
-
-def parse_number(text):
-    """解析包含逗號的數字字串"""
-    if not text:
-        return None
-    # 移除逗號和空白
-    cleaned = text.strip().replace(',', '')
-    try:
-        # 嘗試轉換為浮點數
-        return float(cleaned)
-    except ValueError:
-        return None
-
-def extract_table_data(table):
-    """從table中提取資料，回傳 {項目名稱: 金額} 的字典"""
+
+def load_config(config_file=CONFIG_FILE):
+    """讀取 config.ini 的 [00981A] 區段，回傳 (名稱, 資料目錄, 日誌目錄)"""
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    section = config[ETF_CODE]
+    return section['name'], BASE_DIR / section['data_path'], BASE_DIR / section['log_path']
+
+
+def setup_logging(log_path):
+    """輸出日誌到 log_path/<YYYYMMDD>.log 與終端機 (直接執行時使用)"""
+    log_path.mkdir(parents=True, exist_ok=True)
+    log_file = log_path / f"{datetime.now().strftime('%Y%m%d')}.log"
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def extract_table_data(items):
+    """將 {項目名稱: 金額文字} 轉換為 {項目名稱: 金額} 的字典 (無法解析者為 None)"""
+    values = parse_numbers(list(items.values()))
     data = {}
-    rows = table.find_all('tr')
-    
-    for row in rows:
-        tds = row.find_all('td')
-        if len(tds) >= 2:
-            # 第一個td是項目名稱
-            item_span = tds[0].find('span')
-            if item_span:
-                item_name = item_span.text.strip()
-                
-                # 第二個td包含金額（可能有多個span，最後一個通常是數字）
-                value_spans = tds[1].find_all('span')
-                if value_spans:
-                    # 取最後一個span（通常是實際數值）
-                    value_text = value_spans[-1].text.strip()
-                    value = parse_number(value_text)
-                    data[item_name] = value
-                    logger.info(f"  - {item_name}: {value_text} -> {value}")
-    
+    for (item_name, value_text), value in zip(items.items(), values):
+        data[item_name] = None if pd.isna(value) else float(value)
+        logger.debug(f"  - {item_name}: {value_text} -> {data[item_name]}")
     return data
 
-try:
-    logger.info("開始爬取資料...")
-    driver.get("https://www.ezmoney.com.tw/ETF/Fund/Info?fundCode=49YTW")
-    
-    wait = WebDriverWait(driver, 10)
-    wait.until(EC.presence_of_element_located((By.XPATH, "//*[contains(text(), '股票名稱')]")))
-    
-    html = driver.page_source
-    soup = BeautifulSoup(html, 'html.parser')
-    
+
+def parse_page(page):
+    """
+    將已解析的頁面 (見 ezmoney_parser.parse_ezmoney_page) 整理為 DataFrame (不寫檔)
+
+    回傳:
+    (資料日期 YYYYMMDD, portfolio DataFrame, holdings DataFrame 或 None)；找不到持股明細表格時 holdings 為 None
+    """
     # === 提取日期 ===
-    data_date = None
-    timestamp = None
-    
-    for span in soup.find_all('span'):
-        text = span.text.strip()
-        if '/' in text and len(text.split('/')) == 3:
-            try:
-                date_obj = datetime.strptime(text, '%Y/%m/%d')
-                data_date = text
-                timestamp = date_obj.strftime('%Y%m%d')
-                logger.info(f"找到資料日期: {data_date} -> 檔名格式: {timestamp}")
-                break
-            except ValueError:
-                continue
-    
-    if timestamp is None:
+    data_date = page['data_date']
+
+    if data_date:
+        timestamp = datetime.strptime(data_date, '%Y/%m/%d').strftime('%Y%m%d')
+        logger.info(f"找到資料日期: {data_date} -> 檔名格式: {timestamp}")
+    else:
         timestamp = datetime.now().strftime('%Y%m%d')
         logger.warning(f"未找到網頁日期，使用當前日期: {timestamp}")
-    
+
     # ============================================================
     # === 1. 提取持股明細 (Holding) ===
     # ============================================================
     logger.info("=" * 60)
     logger.info("開始提取持股明細...")
-    
-    holding_table = None
-    for t in soup.find_all('table'):
-        if '股票名稱' in t.text:
-            holding_table = t
-            break
-    
-    if holding_table is None:
+
+    holding_data = page['holdings']
+    holding_df = None
+
+    if holding_data is None:
         logger.error("找不到持股明細表格")
     else:
         logger.info("找到持股明細表格！")
-        
-        holding_data = []
-        for row in holding_table.find_all('tr'):
-            tds = row.find_all('td')
-            if len(tds) == 4:
-                spans = [td.find('span') for td in tds]
-                if all(spans):
-                    holding_data.append({
-                        '股票代號': spans[0].text.strip(),
-                        '股票名稱': spans[1].text.strip(),
-                        '股數': spans[2].text.strip(),
-                        '持股權重': spans[3].text.strip()
-                    })
-        
-        holding_df = pd.DataFrame(holding_data)
-        
-        # 數據清理
-        holding_df['股數'] = holding_df['股數'].str.replace(',', '').astype(int)
-        holding_df['持股權重'] = holding_df['持股權重'].str.rstrip('%').astype(float) * 0.01
-        
+
+        with stage("preprocess"):
+            holding_df = pd.DataFrame(holding_data)
+
+            # 數據清理
+            holding_df['股數'] = parse_numbers(holding_df['股數'])
+            holding_df['持股權重'] = parse_percent(holding_df['持股權重'], unit='percent')
+
         logger.info(f"共找到 {len(holding_df)} 筆持股資料")
         logger.info(f"前 10 筆資料:\n{holding_df.head(10).to_string()}")
-        
-        # 儲存 holding 資料
-        holding_path = data_path / "holding"
-        holding_path.mkdir(parents=True, exist_ok=True)
-        
-        holding_file = holding_path / f"{timestamp}.parquet"
-        holding_df.to_parquet(holding_file, index=False)
-        logger.info(f"持股明細已儲存至: {holding_file}")
-    
+
     # ============================================================
     # === 2. 提取投資組合資訊 (Portfolio) ===
     # ============================================================
     logger.info("=" * 60)
     logger.info("開始提取投資組合資訊...")
-    
-    # 找到所有 table.table-bordered
-    all_tables = soup.find_all('table', class_='table-bordered')
-    logger.info(f"找到 {len(all_tables)} 個 table")
-    
+
+    # table.table-bordered 中的基金資產表格 (淨資產、流通在外單位數、每單位淨值)
+    # 與包含"項目"和"金額"的資產配置表格
+    portfolio_tables = page['portfolio_tables']
+    logger.info(f"找到 {len(portfolio_tables)} 個資產表格")
+
     portfolio_data = {'日期': data_date if data_date else timestamp}
-    
-    # 遍歷所有 table
-    for idx, table in enumerate(all_tables):
-        table_text = table.text
-        logger.info(f"\n處理 Table {idx + 1}:")
-        
-        # Table 1: 基金資產 (淨資產、流通在外單位數、每單位淨值)
-        if '基金資產' in table_text or '淨資產' in table_text:
-            logger.info("找到基金資產表格")
-            data = extract_table_data(table)
-            portfolio_data.update(data)
-        
-        # Table 2 & 3: 包含"項目"和"金額"的表格
-        elif '項目' in table_text and '金額' in table_text:
-            logger.info("找到資產配置表格")
-            data = extract_table_data(table)
-            portfolio_data.update(data)
-    
+
+    for idx, items in enumerate(portfolio_tables):
+        logger.debug(f"處理 Table {idx + 1}:")
+        portfolio_data.update(extract_table_data(items))
+
     # 建立 DataFrame
     portfolio_df = pd.DataFrame([portfolio_data])
-    
-    # 重新排列欄位順序（如果欄位存在的話）
-    desired_columns = [
-        '日期',
-        '淨資產',
-        '流通在外單位數',
-        '每單位淨值',
-        '期貨(名目本金)',
-        '股票',
-        '現金',
-        '期貨保證金',
-        '申贖應付款',
-        '應收付證券款'
-    ]
-    
-    # 只保留存在的欄位
-    existing_columns = [col for col in desired_columns if col in portfolio_df.columns]
-    # 加上其他未列出的欄位
+
+    # 只保留存在的欄位，加上其他未列出的欄位
+    existing_columns = [col for col in PORTFOLIO_COLUMNS if col in portfolio_df.columns]
     other_columns = [col for col in portfolio_df.columns if col not in existing_columns]
-    final_columns = existing_columns + other_columns
-    
-    portfolio_df = portfolio_df[final_columns]
-    
+    portfolio_df = portfolio_df[existing_columns + other_columns]
+
     logger.info(f"\n投資組合資訊:")
     logger.info(f"\n{portfolio_df.T.to_string()}")  # 轉置顯示更清楚
-    
+    return timestamp, portfolio_df, holding_df
+
+
+def parse_html(html):
+    """由頁面原始碼解析 (原始檔封存的重新解析使用，見 raw_archive)"""
+    with stage("parse"):
+        page = parse_ezmoney_page(html)
+    return parse_page(page)
+
+
+def process_page(page, data_path):
+    """
+    儲存已解析的頁面 (整理見 parse_page)
+
+    參數:
+    page: parse_ezmoney_page 的結果
+    data_path: 此 ETF 的資料目錄 (底下的 portfolio / holding)
+
+    回傳:
+    (資料日期 YYYYMMDD, portfolio DataFrame, holdings DataFrame 或 None)；找不到持股明細表格時 holdings 為 None
+    """
+    data_path = Path(data_path)
+    store_dir = store_dir_for(data_path)
+    timestamp, portfolio_df, holding_df = parse_page(page)
+
+    if holding_df is not None:
+        # 轉為統一格式後儲存 holding 資料
+        with stage("write"):
+            holding_file, holding_df = save_holdings(holding_df, ETF_CODE, timestamp, data_path / "holding",
+                                                     store_dir)
+        logger.info(f"持股明細已儲存至: {holding_file}")
+
     # 儲存 portfolio 資料
     portfolio_path = data_path / "portfolio"
     portfolio_path.mkdir(parents=True, exist_ok=True)
-    
+
     portfolio_file = portfolio_path / f"{timestamp}.parquet"
-    portfolio_df.to_parquet(portfolio_file, index=False)
+    with stage("write"):
+        portfolio_df.to_parquet(portfolio_file, index=False)
+        append_snapshot(portfolio_df, ETF_CODE, timestamp, "portfolio", store_dir)
     logger.info(f"\n投資組合資訊已儲存至: {portfolio_file}")
-    
+
     logger.info("=" * 60)
+    return timestamp, portfolio_df, holding_df
+
+
+def fetch_page(driver):
+    """開啟基金頁面，等待持股表格出現後回傳 HTML"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    with stage("page_load"):
+        driver.get(URL)
+
+        wait = WebDriverWait(driver, 10)
+        wait.until(EC.presence_of_element_located((By.XPATH, "//*[contains(text(), '股票名稱')]")))
+
+        return driver.page_source
+
+
+def run(data_path=None, headless=True, pool=None):
+    """
+    爬取並儲存 00981A 持股
+
+    參數:
+    data_path: 資料目錄 (data/00981A)，None 表示使用 config.ini 的設定
+    headless: 未使用連線池時是否使用無視窗模式
+    pool: ChromeDriverPool，提供時借用連線池中的瀏覽器
+
+    回傳:
+    成功處理或內容與上次相同時回傳 True，找不到持股明細時回傳 False
+    """
+    data_path = Path(data_path) if data_path else load_config()[1]
+    data_path.mkdir(parents=True, exist_ok=True)
+
+    logger.info("開始爬取資料...")
+    with browser(pool, headless=headless) as driver:
+        html = fetch_page(driver)
+    with stage("parse"):
+        page = parse_ezmoney_page(html)
+
+    # 內容與上次相同 (假日或尚未更新) 時不重新寫檔
+    state = FetchState(ETF_CODE, data_path.parent)
+    digest = fingerprint(page)
+    if state.is_unchanged(digest):
+        logger.info(f"頁面內容與上次相同 (資料日期 {state.data_date})，略過處理")
+        if current_run():
+            current_run().set(unchanged=True)
+        return True
+
+    timestamp, _, holding_df = process_page(page, data_path)
+    if holding_df is None:
+        return False
+    # 保存原始網頁以便修正解析程式後重新解析 (raw_archive.py reparse)
+    archive_bytes(html.encode("utf-8"), ETF_CODE, timestamp, "html", archive_dir_for(data_path))
+    state.record(digest, timestamp)
     logger.info("所有資料爬取完成！")
-    
-except Exception as e:
-    logger.error(f"執行時發生錯誤: {str(e)}", exc_info=True)
-    
-finally:
-    driver.quit()
-    logger.info("爬蟲程式執行完畢")
\ No newline at end of file
+    return True
+
+
+def main():
+    etf_name, data_path, log_path = load_config()
+    setup_logging(log_path)
+
+    logger.info(f"ETF: {etf_name}")
+    logger.info(f"資料將儲存至: {data_path}")
+    logger.info(f"日誌路徑: {log_path}")
+
+    success = False
+    with EtfRun(ETF_CODE, adapter="selenium") as metrics:
+        try:
+            success = run(data_path)
+            if not success:
+                metrics.status = "failed"
+        except Exception as e:
+            logger.error(f"執行時發生錯誤: {str(e)}", exc_info=True)
+            metrics.status, metrics.error = "error", f"{type(e).__name__}: {e}"
+    if success:
+        # 最後更新衍生資料表 (data/analytics)
+        from run_all_etfs import update_analytics
+
+        update_analytics(data_path.parent, [ETF_CODE])
+    logger.info("爬蟲程式執行完畢")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,201 +1,273 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import pandas as pd
-import time
-import gc
-from pathlib import Path
+"""
+00982A (群益台灣精選強棒主動式ETF) 持股爬蟲
+以瀏覽器開啟群益投信投資組合頁面並下載 Excel，解析投資組合與持股明細後儲存為 Parquet
+
+匯入本模組不會啟動瀏覽器或建立目錄 (selenium 只在 run() 中載入):
+    from get_00982A import run
+    run(data_path="data/00982A", pool=pool)
+
+直接執行時使用 config/config.ini 的 data_path:
+    python get_00982A.py
+"""
+
+import configparser
 import os
 import shutil
+import sys
 from datetime import datetime
+from pathlib import Path
 
-# 設定下載路徑
-download_path = r"C:\Users\User\Documents\GitHub\ETF_sniper\data\00982A\download"
-portfolio_path = r"C:\Users\User\Documents\GitHub\ETF_sniper\data\00982A\portfolio"
-holding_path = r"C:\Users\User\Documents\GitHub\ETF_sniper\data\00982A\holding"
-
-# 確保所有目錄存在
-os.makedirs(download_path, exist_ok=True)
-os.makedirs(portfolio_path, exist_ok=True)
-os.makedirs(holding_path, exist_ok=True)
-
-# 設定 Chrome 選項
-chrome_options = Options()
-chrome_options.add_argument('--headless=new')
-chrome_options.add_argument('--disable-gpu')
-chrome_options.add_argument('--no-sandbox')
-chrome_options.add_argument('--disable-dev-shm-usage')
-chrome_options.add_argument('--window-size=1920,1080')
-prefs = {
-    "download.default_directory": download_path,
-    "download.prompt_for_download": False,
-    "download.directory_upgrade": True,
-    "safebrowsing.enabled": True
-}
-chrome_options.add_experimental_option("prefs", prefs)
-
-# 啟動瀏覽器
-driver = webdriver.Chrome(options=chrome_options)
-
-try:
-    # 開啟網頁
-    url = "https://www.capitalfund.com.tw/etf/product/detail/399/portfolio"
-    driver.get(url)
-    
-    # 等待頁面載入
-    wait = WebDriverWait(driver, 10)
-    
-    # 找到並點擊下載按鈕
-    download_button = wait.until(
-        EC.element_to_be_clickable((By.CSS_SELECTOR, "button.buyback-search-section-btn"))
-    )
-    download_button.click()
-    
-    print("已點擊下載按鈕，等待下載完成...")
-    
-    # 等待下載完成
-    time.sleep(5)
-    
-    # 取得下載的檔案並重命名
-    files = os.listdir(download_path)
-    if files:
-        # 找到最新下載的檔案
-        latest_file = max([os.path.join(download_path, f) for f in files], 
-                         key=os.path.getctime)
-        
-        # 取得檔案副檔名
-        file_extension = os.path.splitext(latest_file)[1]
-        
-        # 產生新檔名 (當前日期)
+import pandas as pd
+
+from download_watcher import DownloadTimeoutError, create_job_directory, wait_for_download
+from driver_pool import browser
+from excel_reader import find_date, grid_to_frame, read_workbook_grids
+from fetch_state import FetchState, fingerprint_file
+from holdings_schema import save_holdings
+from instrumentation import EtfRun, current_run, stage
+from numeric_clean import parse_amount, parse_numbers, parse_percent
+from holdings_store import append_snapshot, store_dir_for
+from raw_archive import archive_dir_for, archive_file
+
+BASE_DIR = Path(__file__).parent
+CONFIG_FILE = BASE_DIR / "config" / "config.ini"
+
+ETF_CODE = "00982A"
+URL = "https://www.capitalfund.com.tw/etf/product/detail/399/portfolio"
+BUTTON_SELECTOR = "button.buyback-search-section-btn"
+DOWNLOAD_TIMEOUT = 30
+
+
+def default_data_path(config_file=CONFIG_FILE):
+    """config.ini 中設定的資料目錄 (data/00982A)"""
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    return BASE_DIR / config[ETF_CODE]['data_path']
+
+
+def grid_to_dict(grid):
+    """取前兩欄轉換為 {項目: 金額} 字典"""
+    pairs = grid.iloc[:, :2].reindex(columns=[0, 1])
+    pairs = pairs[pairs[0].notna()]
+    return dict(zip(pairs[0], pairs[1].where(pairs[1].notna(), "")))
+
+
+def parse_workbook(input_file):
+    """
+    解析投資組合 Excel (不寫檔)
+
+    回傳:
+    (資料日期 YYYYMMDD, portfolio DataFrame (項目 / 金額), holdings DataFrame)
+    """
+    # 讀取 Excel 檔案 (一次開啟活頁簿，讀取三個分頁)
+    with stage("parse"):
+        sheets = read_workbook_grids(input_file, ['投資組合', '股票', '其他資產'])
+
+    # 資料日期取自檔案內容，不使用執行當天的日期 (避免舊資料存成今天)
+    date_str = next((d for d in map(find_date, sheets.values()) if d), None)
+    if date_str is None:
         date_str = datetime.now().strftime("%Y%m%d")
-        new_filename = date_str + file_extension
-        new_filepath = os.path.join(download_path, new_filename)
-        
-        # 重命名檔案
-        if os.path.exists(new_filepath):
-            os.remove(new_filepath)
-        os.rename(latest_file, new_filepath)
-        print(f"檔案已下載並重命名為: {new_filename}")
-        
-        # ========== 資料處理 ==========
-        print("\n開始處理資料...")
-        
-        # 讀取 Excel 檔案
-        excel_file = pd.ExcelFile(new_filepath)
-        
-        # 處理分頁1和3 - Portfolio
-        print("處理投資組合資料 (分頁1和3)...")
-        
-        # 讀取分頁1 (投資組合)
-        df_portfolio = pd.read_excel(new_filepath, sheet_name='投資組合', header=None)
-        
-        # 轉換為字典格式
-        portfolio_data = {}
-        for idx, row in df_portfolio.iterrows():
-            if pd.notna(row[0]):
-                portfolio_data[row[0]] = row[1] if pd.notna(row[1]) else ""
-        
-        # 讀取分頁3 (其他資產)
-        df_other = pd.read_excel(new_filepath, sheet_name='其他資產', header=None)
-        
-        # 轉換為字典格式
-        other_data = {}
-        for idx, row in df_other.iterrows():
-            if pd.notna(row[0]):
-                other_data[row[0]] = row[1] if pd.notna(row[1]) else ""
-        
+        print(f"⚠ 檔案中找不到資料日期，使用當前日期: {date_str}")
+
+    # ========== 資料處理 ==========
+    print("\n開始處理資料...")
+
+    # 處理分頁1和3 - Portfolio
+    print("處理投資組合資料 (分頁1和3)...")
+
+    with stage("preprocess"):
+        # 分頁1 (投資組合)
+        portfolio_data = grid_to_dict(sheets['投資組合'])
+
+        # 分頁3 (其他資產)
+        other_data = grid_to_dict(sheets['其他資產'])
+
         # 合併資料
         combined_portfolio = {**portfolio_data, **other_data}
-        
-        df_combined_portfolio = pd.DataFrame(list(combined_portfolio.items()), 
+
+        df_combined_portfolio = pd.DataFrame(list(combined_portfolio.items()),
                                             columns=['項目', '金額'])
 
         # ========== 加入資料清理邏輯 ==========
 
-        # 1. 確保「金額」是字串，方便進行文字替換
-        df_combined_portfolio['金額'] = df_combined_portfolio['金額'].astype(str)
-
-        # 2. 移除 'TWD'、' ' (空白) 以及 ',' (逗號)
-        # 我們使用 regex=True 一次處理多種字元
-        df_combined_portfolio['金額'] = (
-            df_combined_portfolio['金額']
-            .str.replace(r'[TWD,\s]', '', regex=True) # 移除 T, W, D, 逗號 與 空白
-        )
-
-        # 3. 轉換為數值格式 (使用 pd.to_numeric)
-        # errors='coerce' 可以將無法轉換的文字變為 NaN，避免程式崩潰
-        df_combined_portfolio['金額'] = pd.to_numeric(df_combined_portfolio['金額'], errors='coerce')
+        # 移除 'TWD' 幣別、空白與逗號並轉為數值，無法轉換的文字變為 NaN
+        df_combined_portfolio['金額'] = parse_amount(df_combined_portfolio['金額'], currency='TWD')
 
         # (可選) 填補缺失值，例如轉為 0
         df_combined_portfolio['金額'] = df_combined_portfolio['金額'].fillna(0)
 
-        portfolio_output = os.path.join(portfolio_path, f"{date_str}.parquet")
-        df_combined_portfolio.to_parquet(portfolio_output, index=False, engine='pyarrow')
+    # 處理分頁2 - Holding (股票持股)
+    print("處理持股資料 (分頁2)...")
+
+    # 分頁2 (股票)，第一列為標題
+    with stage("preprocess"):
+        df_holding = grid_to_frame(sheets['股票'], 0)
 
-        # 處理分頁2 - Holding (股票持股)
-        print("處理持股資料 (分頁2)...")
-        
-        # 讀取分頁2 (股票)
-        df_holding = pd.read_excel(new_filepath, sheet_name='股票')
-        
         # 資料清理
         # 1. 移除符號並轉數值
         if '持股權重(%)' in df_holding.columns:
-                    # 1. 建立新欄位並計算數值，同時確保是字串後再處理
-                    df_holding['持股權重'] = (
-                        df_holding['持股權重(%)']
-                        .astype(str)
-                        .str.replace('%', '')
-                        .str.strip()
-                        .astype(float) * 0.01
-                    )
+            # 欄位單位為 %，轉為小數
+            df_holding['持股權重'] = parse_percent(df_holding['持股權重(%)'], unit='percent')
 
-
-        # 確保股票代號為字串格式 (避免前導0消失)
+        # 股數移除逗號後轉為數值
         if '股數' in df_holding.columns:
-            # 先轉為字串，取代掉逗號，再轉為浮點數或整數
-            df_holding['股數'] = df_holding['股數'].astype(str).str.replace(',', '').str.strip().astype(float)
+            df_holding['股數'] = parse_numbers(df_holding['股數'])
 
         # 3. 確保股票代號為字串格式
         if '股票代號' in df_holding.columns:
             df_holding['股票代號'] = df_holding['股票代號'].astype(str)
-        
+
         cols = ['股票代號', '股票名稱', '持股權重', '股數']
         df_holding = df_holding[cols]
-        
-        # 儲存 Holding 資料為 Parquet
-        holding_output = os.path.join(holding_path, f"{date_str}.parquet")
-        df_holding.to_parquet(holding_output, index=False, engine='pyarrow')
-        print(f"持股資料已儲存至: {holding_output}")
-        
-        print("\n資料處理完成！")
-        print(f"- Portfolio 檔案: {portfolio_output}")
-        print(f"- Holding 檔案: {holding_output}")
-        
-        # ========== 清空 download 目錄 ==========
-        print("\n清空 download 目錄...")
-        for filename in os.listdir(download_path):
-            file_path = os.path.join(download_path, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                    print(f"已刪除: {filename}")
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-                    print(f"已刪除目錄: {filename}")
-            except Exception as e:
-                print(f'刪除 {file_path} 失敗. 原因: {e}')
-        
-        print("download 目錄已清空！")
-        
-    else:
-        print("沒有找到下載的檔案")
-        
-finally:
-    # 關閉瀏覽器
-    driver.quit()
-    print("\n瀏覽器已關閉")
+
+    return date_str, df_combined_portfolio, df_holding
+
+
+def process_workbook(input_file, data_path):
+    """
+    處理下載的投資組合 Excel 並儲存為 Parquet (解析見 parse_workbook)
+
+    參數:
+    input_file: 下載的 Excel 檔案
+    data_path: 此 ETF 的資料目錄 (底下的 portfolio / holding)
+
+    回傳:
+    (portfolio DataFrame, holdings DataFrame)
+    """
+    portfolio_path = os.path.join(data_path, "portfolio")
+    holding_path = os.path.join(data_path, "holding")
+    os.makedirs(portfolio_path, exist_ok=True)
+    os.makedirs(holding_path, exist_ok=True)
+    store_dir = store_dir_for(data_path)
+
+    date_str, df_combined_portfolio, df_holding = parse_workbook(input_file)
+
+    portfolio_output = os.path.join(portfolio_path, f"{date_str}.parquet")
+    with stage("write"):
+        df_combined_portfolio.to_parquet(portfolio_output, index=False, engine='pyarrow')
+        append_snapshot(df_combined_portfolio, ETF_CODE, date_str, "portfolio", store_dir)
+
+    # 轉為統一格式後儲存 Holding 資料為 Parquet
+    with stage("write"):
+        holding_output, df_holding = save_holdings(df_holding, ETF_CODE, date_str, holding_path, store_dir)
+    print(f"持股資料已儲存至: {holding_output}")
+
+    print("\n資料處理完成！")
+    print(f"- Portfolio 檔案: {portfolio_output}")
+    print(f"- Holding 檔案: {holding_output}")
+    return df_combined_portfolio, df_holding
+
+
+def clean_download_directory(download_path):
+    """清空 download 目錄"""
+    print("\n清空 download 目錄...")
+    for filename in os.listdir(download_path):
+        file_path = os.path.join(download_path, filename)
+        try:
+            if os.path.isfile(file_path) or os.path.islink(file_path):
+                os.unlink(file_path)
+                print(f"已刪除: {filename}")
+            elif os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+                print(f"已刪除目錄: {filename}")
+        except Exception as e:
+            print(f'刪除 {file_path} 失敗. 原因: {e}')
+
+    print("download 目錄已清空！")
+
+
+def download_workbook(driver, download_path):
+    """開啟投資組合頁面並點擊下載按鈕，回傳下載的檔案路徑 (逾時回傳 None)"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    # 開啟網頁
+    with stage("page_load"):
+        driver.get(URL)
+
+        # 等待頁面載入
+        wait = WebDriverWait(driver, 10)
+
+        # 找到並點擊下載按鈕
+        download_button = wait.until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, BUTTON_SELECTOR))
+        )
+        download_button.click()
+
+    print("已點擊下載按鈕，等待下載完成...")
+
+    # 等待下載完成 (檔案寫入完成即回傳，最多 30 秒)
+    try:
+        with stage("download_wait"):
+            return wait_for_download(download_path, timeout=DOWNLOAD_TIMEOUT)
+    except DownloadTimeoutError as e:
+        print(e)
+        return None
+
+
+def run(data_path=None, headless=True, pool=None):
+    """
+    下載並處理 00982A 持股
+
+    參數:
+    data_path: 資料目錄 (data/00982A)，None 表示使用 config.ini 的設定
+    headless: 未使用連線池時是否使用無視窗模式
+    pool: ChromeDriverPool，提供時借用連線池中的瀏覽器
+
+    回傳:
+    成功處理或內容與上次相同時回傳 True，否則回傳 False
+    """
+    data_path = Path(data_path) if data_path else default_data_path()
+    download_path = data_path / "download"
+
+    # 上一次處理的內容指紋 (data/00982A/state.json)；與直接抓取的 API (JSON) 分開記錄 Excel 的指紋
+    state = FetchState(ETF_CODE, data_path.parent)
+
+    # 本次執行專用的下載子目錄 (與其他平行工作隔離)
+    job_download_path = create_job_directory(download_path)
+    try:
+        with browser(pool, job_download_path, headless) as driver:
+            latest_file = download_workbook(driver, job_download_path)
+
+        if not latest_file:
+            print("沒有找到下載的檔案")
+            return False
+
+        # 內容與上次相同 (假日或尚未更新) 時不重新解析與寫檔
+        digest = fingerprint_file(latest_file)
+        if state.is_unchanged(digest, source="xlsx"):
+            print(f"檔案內容與上次相同 (資料日期 {state.data_date})，略過處理")
+            if current_run():
+                current_run().set(unchanged=True)
+            return True
+
+        portfolio_df, holding_df = process_workbook(latest_file, data_path)
+        data_date = pd.Timestamp(holding_df['日期'].iloc[0]).strftime('%Y%m%d')
+        # 保存原始檔案以便修正解析程式後重新解析 (raw_archive.py reparse)
+        archive_file(latest_file, ETF_CODE, data_date, archive_dir_for(data_path))
+        state.record(digest, data_date, source="xlsx")
+    finally:
+        # 只刪除本次工作的下載子目錄，不影響同時執行中的其他工作
+        shutil.rmtree(job_download_path, ignore_errors=True)
+    return True
+
+
+def main():
+    from run_all_etfs import update_analytics
+
+    data_path = default_data_path()
+    with EtfRun(ETF_CODE, adapter="selenium") as metrics:
+        success = run(data_path)
+        if not success:
+            metrics.status = "failed"
+    if success:
+        # 最後更新衍生資料表 (data/analytics)
+        update_analytics(data_path.parent, [ETF_CODE])
     print("="*60)
-    print("所有作業完成！")
\ No newline at end of file
+    print("所有作業完成！")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
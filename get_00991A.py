@@ -3,15 +3,21 @@
 支援多個 ETF: 00982A, 00991A 等
 """
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 import pandas as pd
-import time
+import json
 import os
 import re
+import shutil
+
+from download_watcher import DEFAULT_TIMEOUT, DownloadTimeoutError, create_job_directory, wait_for_download
+from driver_pool import browser
+from excel_reader import find_date, find_row, grid_to_frame, read_sheet_grid
+from fetch_state import FetchState, data_date_of, fingerprint, fingerprint_file
+from holdings_schema import save_holdings
+from instrumentation import stage
+from numeric_clean import parse_numbers, parse_percent
+from holdings_store import append_snapshot, store_dir_for, stored_dates, to_date
+from raw_archive import archive_bytes, archive_dir_for, archive_file
 
 
 def clean_download_directory(download_path):
@@ -50,87 +56,84 @@ def clean_download_directory(download_path):
         print(f"✗ 清理目錄時發生錯誤: {e}")
 
 
-def download_etf_file(url, download_path, button_selector, selector_type="CSS", headless=True):
-    """下載 ETF 檔案"""
-    os.makedirs(download_path, exist_ok=True)
-    
-    chrome_options = Options()
-    
-    prefs = {
-        "download.default_directory": download_path,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    chrome_options.add_experimental_option("prefs", prefs)
-    
-    # Headless 模式設定
-    if headless:
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--window-size=1920,1080')
+def download_etf_file(url, download_path, button_selector, selector_type="CSS", headless=True, pool=None,
+                      timeout=DEFAULT_TIMEOUT):
+    """
+    下載 ETF 檔案
+
+    參數:
+    pool: ChromeDriverPool，提供時借用連線池中的瀏覽器，否則啟動新的瀏覽器
+    timeout: 等待下載完成的最長秒數
+
+    每次下載都使用 download_path 底下獨立的子目錄，平行下載時不會取到其他工作的檔案
+    """
+    job_path = create_job_directory(download_path)
+
+    if pool is None and headless:
         print("✓ 使用 Headless 模式 (無視窗)")
-    
-    driver = webdriver.Chrome(options=chrome_options)
-    
+    downloaded_file = None
     try:
-        driver.get(url)
-        wait = WebDriverWait(driver, 15)
-        time.sleep(2)
-        
-        if selector_type == "CSS":
-            download_button = wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, button_selector))
-            )
-        else:
+        with browser(pool, job_path, headless) as driver:
+            downloaded_file = _download_with_driver(driver, url, job_path, button_selector, selector_type, timeout)
+    finally:
+        # 下載失敗時沒有檔案交給呼叫端，由此刪除本次工作的子目錄
+        if downloaded_file is None:
+            shutil.rmtree(job_path, ignore_errors=True)
+    return downloaded_file
+
+
+def _download_with_driver(driver, url, download_path, button_selector, selector_type, timeout):
+    """使用指定的瀏覽器開啟頁面並點擊下載按鈕"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        with stage("page_load"):
+            driver.get(url)
+            wait = WebDriverWait(driver, 15)
+
+            locator = By.CSS_SELECTOR if selector_type == "CSS" else By.XPATH
             download_button = wait.until(
-                EC.presence_of_element_located((By.XPATH, button_selector))
+                EC.presence_of_element_located((locator, button_selector))
             )
-        
+
+        existing = set(os.listdir(download_path))
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_button)
-        time.sleep(1)
         driver.execute_script("arguments[0].click();", download_button)
         print("✓ 已點擊下載按鈕，等待下載完成...")
-        
-        time.sleep(5)
-        
-        files = os.listdir(download_path)
-        if files:
-            latest_file = max([os.path.join(download_path, f) for f in files], 
-                             key=os.path.getctime)
-            
-            original_filename = os.path.basename(latest_file)
-            file_extension = os.path.splitext(original_filename)[1]
-            filename_without_ext = os.path.splitext(original_filename)[0]
-            
-            date_match = re.search(r'(\d{4}_\d{2}_\d{2})', filename_without_ext)
-            
-            if date_match:
-                date_str = date_match.group(1)
-                new_filename = date_str.replace('_', '') + file_extension
-            else:
-                print(f"⚠ 警告: 無法從檔名中提取日期，使用原始檔名: {original_filename}")
-                new_filename = original_filename
-            
-            new_filepath = os.path.join(download_path, new_filename)
-            
+
+        with stage("download_wait"):
+            latest_file = wait_for_download(download_path, timeout=timeout, existing=existing)
+
+        original_filename = os.path.basename(latest_file)
+        file_extension = os.path.splitext(original_filename)[1]
+        filename_without_ext = os.path.splitext(original_filename)[0]
+
+        date_match = re.search(r'(\d{4}_\d{2}_\d{2})', filename_without_ext)
+
+        if date_match:
+            date_str = date_match.group(1)
+            new_filename = date_str.replace('_', '') + file_extension
+        else:
+            print(f"⚠ 警告: 無法從檔名中提取日期，使用原始檔名: {original_filename}")
+            new_filename = original_filename
+
+        new_filepath = os.path.join(download_path, new_filename)
+
+        if new_filepath != latest_file:
             if os.path.exists(new_filepath):
                 os.remove(new_filepath)
-            
             os.rename(latest_file, new_filepath)
-            print(f"✓ 檔案已下載並重命名為: {new_filename}")
-            return new_filepath
-        else:
-            print("✗ 沒有找到下載的檔案")
-            return None
-            
+        print(f"✓ 檔案已下載並重命名為: {new_filename}")
+        return new_filepath
+
+    except DownloadTimeoutError as e:
+        print(f"✗ 沒有找到下載的檔案: {e}")
+        return None
     except Exception as e:
         print(f"✗ 下載時發生錯誤: {e}")
         return None
-    finally:
-        driver.quit()
 
 
 def preprocess_portfolio_data(df):
@@ -146,20 +149,9 @@ def preprocess_portfolio_data(df):
     df['日期'] = df['日期'].astype(str)
     df['日期'] = pd.to_datetime(df['日期'], format='%Y%m%d')
     
-    # 處理基金資產淨值 (移除逗號)
-    if df['基金資產淨值'].dtype == 'object':
-        df['基金資產淨值'] = df['基金資產淨值'].astype(str).str.replace(',', '').astype(float)
-    else:
-        df['基金資產淨值'] = pd.to_numeric(df['基金資產淨值'], errors='coerce')
-    
-    # 處理基金在外流通單位數 (移除逗號)
-    if df['基金在外流通單位數'].dtype == 'object':
-        df['基金在外流通單位數'] = df['基金在外流通單位數'].astype(str).str.replace(',', '').astype(float)
-    else:
-        df['基金在外流通單位數'] = pd.to_numeric(df['基金在外流通單位數'], errors='coerce')
-    
-    # 處理基金每單位淨值
-    df['基金每單位淨值'] = pd.to_numeric(df['基金每單位淨值'], errors='coerce')
+    # 數值欄位 (移除千分位逗號)
+    for column in ['基金資產淨值', '基金在外流通單位數', '基金每單位淨值']:
+        df[column] = parse_numbers(df[column])
     
     # 移除含有 NaN 的行
     df = df.dropna()
@@ -188,29 +180,12 @@ def preprocess_holdings_data(df):
     # 證券名稱確保是字串
     df['證券名稱'] = df['證券名稱'].astype(str)
     
-    # 處理股數 (移除逗號)
-    if df['股數'].dtype == 'object':
-        df['股數'] = df['股數'].astype(str).str.replace(',', '').astype(float)
-    else:
-        df['股數'] = pd.to_numeric(df['股數'], errors='coerce')
+    # 處理股數、金額 (移除逗號)
+    df['股數'] = parse_numbers(df['股數'])
+    df['金額'] = parse_numbers(df['金額'])
     
-    # 處理金額 (移除逗號)
-    if df['金額'].dtype == 'object':
-        df['金額'] = df['金額'].astype(str).str.replace(',', '').astype(float)
-    else:
-        df['金額'] = pd.to_numeric(df['金額'], errors='coerce')
-    
-    # 處理權重 (去掉 % 並轉換為小數)
-    if df['權重(%)'].dtype == 'object':
-        # 移除 % 符號並轉換為數值，然後除以 100
-        df['權重(%)'] = df['權重(%)'].astype(str).str.replace('%', '').astype(float) / 100
-    else:
-        # 如果已經是數值，檢查是否需要除以 100
-        # 假設原始數據如果 > 1 就是百分比形式 (例如 18.156)
-        df['權重(%)'] = pd.to_numeric(df['權重(%)'], errors='coerce')
-        # 如果最大值 > 1，假設是百分比需要除以 100
-        if df['權重(%)'].max() > 1:
-            df['權重(%)'] = df['權重(%)'] / 100
+    # 處理權重: 欄位標題註明單位為 %，數值一律除以 100
+    df['權重(%)'] = parse_percent(df['權重(%)'], unit='percent')
     
     # 移除含有 NaN 的行 (僅檢查關鍵欄位)
     df = df.dropna(subset=['證券代號', '證券名稱'])
@@ -218,24 +193,29 @@ def preprocess_holdings_data(df):
     return df
 
 
-def process_00991A_excel(input_file, base_path):
-    """處理 00991A (復華台灣未來50) Excel 檔案"""
-    portfolio_path = os.path.join(base_path, "portfolio")
-    holding_path = os.path.join(base_path, "holding")
-    
-    os.makedirs(portfolio_path, exist_ok=True)
-    os.makedirs(holding_path, exist_ok=True)
-    
-    df = pd.read_excel(input_file, sheet_name=0, header=None)
+def parse_00991A_excel(input_file, engine=None):
+    """
+    解析 00991A (復華台灣未來50) Excel 檔案 (不寫檔)
+
+    活頁簿只解析一次，基金資訊與持股明細皆從同一份網格中切出
+    engine: Excel 讀取引擎 ("calamine" / "openpyxl" / "pandas")，None 表示自動選擇
+
+    回傳:
+    (資料日期 YYYYMMDD, portfolio DataFrame, holdings DataFrame；找不到持股時為 None)
+    """
+    with stage("parse"):
+        df = read_sheet_grid(input_file, sheet_name=0, engine=engine)
     
-    # 提取日期
+    # 提取日期: 優先使用檔案內的資料日期，其次為檔名中的日期
+    date_str = find_date(df)
     filename = os.path.basename(input_file)
     date_match = re.search(r'(\d{8})', filename)
-    if date_match:
+    if date_str is None and date_match:
         date_str = date_match.group(0)
-    else:
+    elif date_str is None:
         from datetime import datetime
         date_str = datetime.now().strftime("%Y%m%d")
+        print(f"⚠ 找不到資料日期，使用當前日期: {date_str}")
     
     # 提取基金資訊
     fund_nav = df.iloc[4, 0]
@@ -249,45 +229,108 @@ def process_00991A_excel(input_file, base_path):
         '基金每單位淨值': [fund_nav_per_unit]
     })
     
-    portfolio_df = preprocess_portfolio_data(portfolio_df)
+    with stage("preprocess"):
+        portfolio_df = preprocess_portfolio_data(portfolio_df)
+    
+    # 提取持股資訊 (直接從已讀入的網格切出，不重新解析檔案)
+    holdings_start_idx = find_row(df, '證券代號')
+    holdings_df = None
+    
+    if holdings_start_idx is not None:
+        with stage("preprocess"):
+            holdings_df = grid_to_frame(df, holdings_start_idx)
+            holdings_df.insert(0, '日期', date_str)
+            
+            holdings_df = preprocess_holdings_data(holdings_df)
+    
+    return date_str, portfolio_df, holdings_df
+
+
+def process_00991A_excel(input_file, base_path, engine=None):
+    """
+    處理 00991A (復華台灣未來50) Excel 檔案並儲存為 Parquet (解析見 parse_00991A_excel)
+    """
+    portfolio_path = os.path.join(base_path, "portfolio")
+    holding_path = os.path.join(base_path, "holding")
+    
+    os.makedirs(portfolio_path, exist_ok=True)
+    os.makedirs(holding_path, exist_ok=True)
+    
+    date_str, portfolio_df, holdings_df = parse_00991A_excel(input_file, engine=engine)
     
     # 儲存為 Parquet
     portfolio_file = os.path.join(portfolio_path, f"{date_str}.parquet")
-    portfolio_df.to_parquet(portfolio_file, index=False, engine='pyarrow', compression='snappy')
+    with stage("write"):
+        portfolio_df.to_parquet(portfolio_file, index=False, engine='pyarrow', compression='snappy')
+        append_snapshot(portfolio_df, "00991A", date_str, "portfolio", store_dir_for(base_path))
     print(f"✓ Portfolio 已儲存至: {portfolio_file}")
     
-    # 提取持股資訊
-    holdings_start_idx = None
-    for idx, row in df.iterrows():
-        if row[0] == '證券代號':
-            holdings_start_idx = idx
-            break
-    
-    if holdings_start_idx is not None:
-        holdings_df = pd.read_excel(input_file, sheet_name=0, header=holdings_start_idx)
-        holdings_df = holdings_df.dropna(how='all')
-        holdings_df = holdings_df.loc[:, ~holdings_df.columns.str.contains('^Unnamed')]
-        holdings_df.insert(0, '日期', date_str)
-        
-        holdings_df = preprocess_holdings_data(holdings_df)
-        
-        # 儲存為 Parquet
-        holding_file = os.path.join(holding_path, f"{date_str}.parquet")
-        holdings_df.to_parquet(holding_file, index=False, engine='pyarrow', compression='snappy')
+    if holdings_df is not None:
+        # 轉為統一格式後儲存為 Parquet
+        with stage("write"):
+            holding_file, holdings_df = save_holdings(holdings_df, "00991A", date_str, holding_path,
+                                                      store_dir_for(base_path))
         print(f"✓ Holdings 已儲存至: {holding_file}")
         print(f"  共 {len(holdings_df)} 筆持股資料")
     else:
         print("✗ 找不到持股資料!")
-        holdings_df = None
     
     return portfolio_df, holdings_df
 
 
 def process_00982A_excel(input_file, base_path):
-    """處理 00982A (中信中國50) Excel 檔案 - 需根據實際格式調整"""
-    print("⚠ 00982A 處理功能待實作")
-    print("請提供 00982A 的 Excel 檔案範例以完成此功能")
-    return None, None
+    """處理 00982A 投資組合 Excel 檔案 (見 get_00982A.process_workbook)"""
+    from get_00982A import process_workbook
+
+    return process_workbook(input_file, base_path)
+
+
+def parse_00982A_json(payload):
+    """
+    解析 00982A 投資組合 API (CFWeb/api/etf/buyback) 回傳的持股 JSON (不寫檔)
+
+    回傳:
+    (資料日期 YYYYMMDD, None, holdings DataFrame)；API 只提供持股明細，因此 portfolio 為 None
+    """
+    with stage("parse"):
+        df = pd.DataFrame(payload)
+
+    # 日期格式: 2025/12/18 上午 12:00:00
+    date_text = str(df['date1'].iloc[0]).split()[0]
+    date_str = pd.to_datetime(date_text, format='%Y/%m/%d').strftime('%Y%m%d')
+
+    with stage("preprocess"):
+        holdings_df = pd.DataFrame({
+            '股票代號': df['stocNo'].astype(str).str.strip(),
+            '股票名稱': df['stocName'].astype(str).str.strip(),
+            '持股權重': parse_percent(df['weight'], unit='percent'),
+            '股數': parse_numbers(df['share']),
+        })
+
+    return date_str, None, holdings_df
+
+
+def process_00982A_json(payload, base_path):
+    """
+    處理 00982A 投資組合 API 回傳的持股 JSON 並儲存為 Parquet (解析見 parse_00982A_json)
+    API 只提供持股明細，因此 portfolio 回傳 None
+    """
+    if not payload:
+        print("✗ API 回傳空資料")
+        return None, None
+
+    holding_path = os.path.join(base_path, "holding")
+    os.makedirs(holding_path, exist_ok=True)
+
+    date_str, _, holdings_df = parse_00982A_json(payload)
+
+    with stage("write"):
+        holding_file, holdings_df = save_holdings(holdings_df, "00982A", date_str, holding_path,
+                                                  store_dir_for(base_path))
+    print(f"✓ Holdings 已儲存至: {holding_file}")
+    print(f"  共 {len(holdings_df)} 筆持股資料")
+
+    return None, holdings_df
 
 
 # ETF 配置字典
@@ -297,19 +340,168 @@ ETF_CONFIGS = {
         "url": "https://www.fhtrust.com.tw/ETF/etf_detail/ETF23?utm_campaign=2025ETF00991A#stockhold",
         "button_selector": "//span[text()='檔案下載']",
         "selector_type": "XPATH",
-        "processor": process_00991A_excel
+        "download_timeout": 30,
+        "processor": process_00991A_excel,
+        "fetch_mode": "selenium",
+        # watcher: 通常的發布時間，與只讀取頁面開頭尋找資料日期的探測方式
+        "publish_time": "17:30",
+        "probe": {
+            "type": "fragment",
+            "url": "https://www.fhtrust.com.tw/ETF/etf_detail/ETF23",
+            "label": "日期"
+        },
+        # backfill: 過去日期的持股檔 (投信檔名含 YYYY_MM_DD，{date:...} 以資料日期代入)
+        "backfill": {
+            "type": "file",
+            "url": "https://www.fhtrust.com.tw/api/assetsExcel/ETF23/{date:%Y_%m_%d}",
+            "parser": parse_00991A_excel
+        }
     },
     "00982A": {
         "name": "中信中國50",
         "url": "https://www.capitalfund.com.tw/etf/product/detail/399/portfolio",
         "button_selector": "button.buyback-search-section-btn",
         "selector_type": "CSS",
-        "processor": process_00982A_excel
+        "download_timeout": 30,
+        "processor": process_00982A_excel,
+        # 直接呼叫投資組合 API，失敗時才改用 Selenium
+        "fetch_mode": "http",
+        "direct": {
+            "type": "json",
+            "url": "https://www.capitalfund.com.tw/CFWeb/api/etf/buyback",
+            "method": "GET",
+            "headers": {
+                "Referer": "https://www.capitalfund.com.tw/etf/product/detail/399/portfolio"
+            },
+            "processor": process_00982A_json,
+            # API 只提供持股明細，當日的投資組合 (淨資產、單位數、現金) 仍需下載 Excel 取得
+            "portfolio": False
+        },
+        "publish_time": "18:00",
+        # 與直接抓取相同的 JSON 端點，只讀取第一筆的日期欄位
+        "probe": {
+            "type": "json",
+            "date_field": "date1"
+        },
+        # backfill: 投資組合 API 以查詢日期取得過去的持股
+        "backfill": {
+            "type": "json",
+            "url": "https://www.capitalfund.com.tw/CFWeb/api/etf/buyback",
+            "params": {"date": "{date:%Y/%m/%d}"},
+            "headers": {
+                "Referer": "https://www.capitalfund.com.tw/etf/product/detail/399/portfolio"
+            },
+            "parser": parse_00982A_json
+        }
     }
 }
 
 
-def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data", headless=True):
+def fetch_and_process_direct(etf_code, base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data", base_url=None):
+    """
+    以 HTTP 直接呼叫投信的 JSON / 檔案端點並處理 (不啟動瀏覽器)
+
+    參數:
+    etf_code: ETF 代碼
+    base_dir: 資料基礎目錄
+    base_url: 替身伺服器網址 (測試用)，None 表示使用實際網址
+
+    回傳:
+    成功且資料完整時回傳 True；未設定直接抓取、失敗，或端點沒有投資組合 (direct 的 "portfolio" 為 False)
+    而資料集中還沒有該日投資組合時回傳 False，由呼叫端改用完整下載補齊
+    """
+    from http_fetch import fetch_conditional
+
+    config = ETF_CONFIGS.get(etf_code, {})
+    direct = config.get("direct")
+    if config.get("fetch_mode") != "http" or not direct:
+        return False
+
+    base_path = os.path.join(base_dir, etf_code)
+    download_path = os.path.join(base_path, "download")
+    processor = direct.get("processor", config.get("processor"))
+    state = FetchState(etf_code, base_dir)
+    # 指紋依來源分開記錄: 同一 ETF 的 API 與 Excel 內容不同，不能互相比較
+    source = "json" if direct["type"] == "json" else "xlsx"
+    request_args = dict(method=direct.get("method", "GET"), params=direct.get("params"),
+                        headers=direct.get("headers"), validators=state.conditional_headers(),
+                        base_url=base_url)
+
+    try:
+        if direct["type"] == "json":
+            with stage("fetch"):
+                result = fetch_conditional(direct["url"], **request_args)
+            if result.not_modified:
+                print(f"✓ {etf_code} 伺服器回應未更新 (304)，略過處理")
+                return _direct_complete(etf_code, base_dir, state.data_date)
+            payload = json.loads(result.content)
+            digest = fingerprint(payload)
+            if skip_if_unchanged(state, digest, result.headers, source):
+                return _direct_complete(etf_code, base_dir, state.data_date)
+            portfolio_df, holdings_df = processor(payload, base_path)
+            data_date = data_date_of(holdings_df, portfolio_df)
+            if data_date:
+                archive_bytes(result.content, etf_code, data_date, "json", archive_dir_for(base_path))
+        else:
+            job_path = create_job_directory(download_path)
+            try:
+                with stage("fetch"):
+                    result = fetch_conditional(direct["url"], download_path=job_path, **request_args)
+                if result.not_modified:
+                    print(f"✓ {etf_code} 伺服器回應未更新 (304)，略過處理")
+                    return _direct_complete(etf_code, base_dir, state.data_date)
+                digest = fingerprint_file(result.file_path)
+                if skip_if_unchanged(state, digest, result.headers, source):
+                    return _direct_complete(etf_code, base_dir, state.data_date)
+                portfolio_df, holdings_df = processor(result.file_path, base_path)
+                data_date = data_date_of(holdings_df, portfolio_df)
+                if data_date:
+                    archive_file(result.file_path, etf_code, data_date, archive_dir_for(base_path))
+            finally:
+                shutil.rmtree(job_path, ignore_errors=True)
+    except Exception as e:
+        print(f"✗ {etf_code} 直接抓取失敗: {e}")
+        return False
+
+    success = portfolio_df is not None or holdings_df is not None
+    if success:
+        state.record(digest, data_date, result.headers, source)
+    return success and _direct_complete(etf_code, base_dir, data_date)
+
+
+def _direct_complete(etf_code, base_dir, data_date):
+    """
+    直接抓取的結果是否足夠: 端點有投資組合資料，或資料集中已有該日的投資組合
+    (例如 00982A 的 API 只有持股明細，淨資產、流通在外單位數需由完整下載的 Excel 取得)
+    """
+    if ETF_CONFIGS[etf_code]["direct"].get("portfolio", True):
+        return True
+    store_dir = store_dir_for(os.path.join(base_dir, etf_code))
+    if data_date and to_date(data_date) in stored_dates(etf_code, "portfolio", store_dir):
+        return True
+    print(f"⚠ {etf_code} 直接抓取沒有投資組合資料 (資料日期 {data_date})，改用完整下載補齊")
+    return False
+
+
+def skip_if_unchanged(state, digest, response_headers=None, source=None):
+    """
+    內容與上一次成功處理的相同時回傳 True (呼叫端略過解析與寫檔)
+
+    參數:
+    state: FetchState
+    digest: 本次內容的指紋
+    response_headers: HTTP 回應標頭，用於更新 ETag / Last-Modified
+    source: 來源種類 ("json" / "xlsx")，只與同一來源上一次的指紋比較
+    """
+    if not state.is_unchanged(digest, source):
+        return False
+    print(f"✓ {state.etf_code} 內容與上次相同 (資料日期 {state.data_date})，略過處理")
+    if response_headers is not None:
+        state.record(digest, state.data_date, response_headers, source)
+    return True
+
+
+def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data", headless=True, pool=None):
     """
     下載並處理指定的 ETF 資料
     
@@ -317,11 +509,15 @@ def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub
     etf_code: ETF 代碼 (例如 "00991A", "00982A")
     base_dir: 資料基礎目錄
     headless: 是否使用無視窗模式
+    pool: ChromeDriverPool，提供時共用連線池中的瀏覽器
+
+    回傳:
+    成功下載並處理完成時回傳 True，否則回傳 False
     """
     if etf_code not in ETF_CONFIGS:
         print(f"✗ 不支援的 ETF 代碼: {etf_code}")
         print(f"支援的代碼: {', '.join(ETF_CONFIGS.keys())}")
-        return
+        return False
     
     config = ETF_CONFIGS[etf_code]
     
@@ -330,6 +526,16 @@ def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub
     print("=" * 60)
     print()
     
+    # 優先使用 HTTP 直接抓取，失敗時才啟動瀏覽器
+    if config.get("fetch_mode") == "http":
+        print("步驟 0: 直接呼叫資料端點...")
+        print("-" * 60)
+        if fetch_and_process_direct(etf_code, base_dir):
+            print("✓ 直接抓取完成，略過瀏覽器下載")
+            return True
+        print("⚠ 直接抓取失敗，改用瀏覽器下載")
+        print()
+
     # 設定路徑
     base_path = os.path.join(base_dir, etf_code)
     download_path = os.path.join(base_path, "download")
@@ -342,20 +548,38 @@ def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub
         download_path=download_path,
         button_selector=config["button_selector"],
         selector_type=config["selector_type"],
-        headless=headless
+        headless=headless,
+        pool=pool,
+        timeout=config.get("download_timeout", DEFAULT_TIMEOUT)
     )
     
     if not downloaded_file:
         print("\n✗ 下載失敗，流程中止")
-        return
+        return False
     
     print()
     
+    # 內容與上次相同 (假日或尚未更新) 時不重新解析與寫檔
+    state = FetchState(etf_code, base_dir)
+    digest = fingerprint_file(downloaded_file)
+    # 下載的檔案位於本次工作專用的子目錄，處理完只刪除該目錄，不影響同時執行中的其他工作
+    job_path = os.path.dirname(downloaded_file)
+    if skip_if_unchanged(state, digest, source="xlsx"):
+        shutil.rmtree(job_path, ignore_errors=True)
+        return True
+    
     # 步驟 2: 處理檔案
     print("步驟 2: 處理 Excel 檔案並儲存為 Parquet...")
     print("-" * 60)
+    success = False
     try:
         portfolio_df, holdings_df = config["processor"](downloaded_file, base_path)
+        success = portfolio_df is not None or holdings_df is not None
+        if success:
+            data_date = data_date_of(holdings_df, portfolio_df)
+            # 保存原始檔案以便修正解析程式後重新解析 (raw_archive.py reparse)
+            archive_file(downloaded_file, etf_code, data_date, archive_dir_for(base_path))
+            state.record(digest, data_date, source="xlsx")
         
         if portfolio_df is not None:
             print()
@@ -378,19 +602,27 @@ def download_and_process_etf(etf_code, base_dir=r"C:\Users\User\Documents\GitHub
         # 步驟 3: 清空下載目錄
         print("\n步驟 3: 清理下載目錄...")
         print("-" * 60)
-        clean_download_directory(download_path)
+        shutil.rmtree(job_path, ignore_errors=True)
+
+    return success
+
 
+def download_and_process_all_etfs(base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data", headless=True, max_workers=4):
+    """
+    平行下載並處理所有已配置的 ETF
+
+    實際排程交由 run_all_etfs.run_all_etfs 處理，
+    每個 ETF 在獨立的工作執行緒中執行，單一 ETF 失敗不影響其他 ETF
+    """
+    from run_all_etfs import run_all_etfs
 
-def download_and_process_all_etfs(base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data", headless=True):
-    """下載並處理所有已配置的 ETF"""
-    for etf_code in ETF_CONFIGS.keys():
-        download_and_process_etf(etf_code, base_dir, headless)
-        print("\n" + "=" * 60 + "\n")
+    return run_all_etfs(list(ETF_CONFIGS.keys()), base_dir=base_dir,
+                        headless=headless, max_workers=max_workers)
 
 
 def read_parquet_example(etf_code, date_str, base_dir=r"C:\Users\User\Documents\GitHub\ETF_sniper\data"):
     """
-    讀取 Parquet 檔案的範例
+    讀取 Parquet 檔案的範例 (跨日期或依股票代號查詢請使用 query.py)
     
     參數:
     etf_code: ETF 代碼
@@ -418,8 +650,12 @@ def read_parquet_example(etf_code, date_str, base_dir=r"C:\Users\User\Documents\
 
 
 if __name__ == "__main__":
-    # 方式 1: 處理單一 ETF (Headless 模式，會自動清理下載目錄)
-    download_and_process_etf("00991A", headless=True)
+    from run_all_etfs import update_analytics
+
+    # 方式 1: 處理單一 ETF (Headless 模式，會自動清理下載目錄)，寫入後更新衍生資料表 (data/analytics)
+    data_dir = r"C:\Users\User\Documents\GitHub\ETF_sniper\data"
+    if download_and_process_etf("00991A", base_dir=data_dir, headless=True):
+        update_analytics(data_dir, ["00991A"])
     
     # 方式 2: 處理單一 ETF (顯示瀏覽器視窗，用於除錯)
     # download_and_process_etf("00991A", headless=False)
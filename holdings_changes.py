@@ -0,0 +1,258 @@
+"""
+持股異動計算 (經理人買賣訊號)
+將每檔 ETF 相鄰兩個持股快照依股票代號對齊，一次向量化計算所有 ETF、所有日期的:
+- 股數變化、權重變化
+- 新增持股、完全出清
+- 估計成交金額 (以 金額/股數 推算股價；沒有金額欄位時為 NaN)
+
+結果存放於 data/analytics/holding_changes.parquet，每次只讀取資料集 (data/store) 中新增的日期
+
+使用方式:
+    python holdings_changes.py                 # 更新所有 ETF 並列出最新一日的異動
+    python holdings_changes.py 00981A --top 20
+"""
+
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics_table import update_table
+from holdings_store import STORE_DIR, read_dataset
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+ANALYTICS_DIR = DATA_DIR / "analytics"
+CHANGES_FILE = ANALYTICS_DIR / "holding_changes.parquet"
+
+# 動作分類
+ACTION_NEW = '新增'
+ACTION_EXIT = '出清'
+ACTION_ADD = '加碼'
+ACTION_REDUCE = '減碼'
+ACTION_HOLD = '不變'
+
+CHANGE_COLUMNS = [
+    'etf', '日期', '前日日期', '股票代號', '股票名稱', '動作',
+    '前日股數', '股數', '股數變化', '前日權重', '持股權重', '權重變化',
+    '估計股價', '估計成交金額',
+]
+
+ACTIONS = [ACTION_NEW, ACTION_EXIT, ACTION_ADD, ACTION_REDUCE, ACTION_HOLD]
+
+_CODE_BITS = 32
+_LOW_MASK = (1 << _CODE_BITS) - 1
+
+# 同一行程中多個 ETF 平行寫入時，避免同時讀寫結果檔
+_update_lock = threading.Lock()
+
+
+def _unique_sorted(keys):
+    """回傳已排序陣列中每個不重複值第一次出現的位置"""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _aggregate_duplicates(keys, values):
+    """同一快照中同一股票出現多列時加總數值欄位 (keys 已排序)"""
+    first = _unique_sorted(keys)
+    if len(first) == len(keys):
+        return keys, values
+    aggregated = {}
+    for name, array in values.items():
+        if array.dtype.kind == 'f':
+            aggregated[name] = np.add.reduceat(np.nan_to_num(array), first)
+            all_nan = np.logical_and.reduceat(np.isnan(array), first)
+            aggregated[name][all_nan] = np.nan
+        else:
+            aggregated[name] = array[first]
+    return keys[first], aggregated
+
+
+def compute_holding_changes(history, since=None):
+    """
+    計算持股異動
+
+    參數:
+    history: 持股歷史 DataFrame，需有欄位 etf、日期、股票代號、股數、持股權重
+             (選用: 股票名稱、金額)，可由 holdings_history.load_holdings_history_table 取得
+    since: {etf: 日期}，只計算該日期之後的異動 (增量更新用)，None 表示全部
+
+    回傳:
+    每個 (etf, 日期, 股票代號) 一列的異動 DataFrame，欄位見 CHANGE_COLUMNS；
+    每檔 ETF 的第一個快照沒有前一日可比較，不會出現在結果中
+    """
+    df = history.reset_index() if '股票代號' not in history.columns else history
+    df = df[df['股票代號'].notna()]
+
+    if since:
+        cutoff = pd.to_datetime(df['etf'].astype(str).map(since))
+        df = df[cutoff.isna() | (pd.to_datetime(df['日期']) >= cutoff)]
+    if df.empty:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    # 快照 (etf, 日期) 編號，依 etf、日期排序，同一 ETF 的下一個快照編號為 +1
+    etf_id, etf_values = pd.factorize(df['etf'], sort=True)
+    date_id, date_values = pd.factorize(pd.to_datetime(df['日期']), sort=True)
+    snapshot_code = (etf_id.astype(np.int64) << _CODE_BITS) | date_id
+    row_snapshot, snapshot_codes = pd.factorize(snapshot_code, sort=True)
+    row_snapshot = row_snapshot.astype(np.int64)
+    snapshot_etf = np.asarray(snapshot_codes) >> _CODE_BITS
+    snapshot_dates = np.asarray(date_values)[np.asarray(snapshot_codes) & _LOW_MASK]
+    has_next = np.append(snapshot_etf[1:] == snapshot_etf[:-1], False)
+    is_first = np.insert(snapshot_etf[1:] != snapshot_etf[:-1], 0, True)
+
+    code_id, code_values = pd.factorize(df['股票代號'])
+    code_id = code_id.astype(np.int64)
+    if '股票名稱' in df.columns:
+        name_id, name_values = pd.factorize(df['股票名稱'])
+    else:
+        name_id, name_values = np.full(len(df), -1), pd.Index([], dtype=object)
+
+    def numeric(column):
+        if column not in df.columns:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+
+    keys = (row_snapshot << _CODE_BITS) | code_id
+    order = np.argsort(keys, kind='stable')
+    keys, values = _aggregate_duplicates(keys[order], {
+        'shares': numeric('股數')[order],
+        'weight': numeric('持股權重')[order],
+        'amount': numeric('金額')[order],
+        'name': name_id.astype(np.int64)[order],
+    })
+
+    # 前一快照的持股平移到下一個快照的編號
+    key_snapshot = keys >> _CODE_BITS
+    movable = has_next[key_snapshot]
+    prev_keys = keys[movable] + (np.int64(1) << _CODE_BITS)
+    prev_values = {name: array[movable] for name, array in values.items()}
+
+    all_keys = np.concatenate([keys, prev_keys])
+    all_keys.sort()
+    all_keys = all_keys[_unique_sorted(all_keys)]
+    all_snapshot = all_keys >> _CODE_BITS
+    all_keys = all_keys[~is_first[all_snapshot]]
+    all_snapshot = all_keys >> _CODE_BITS
+
+    def gather(source_keys, source_values):
+        position = np.searchsorted(source_keys, all_keys)
+        position = np.minimum(position, max(len(source_keys) - 1, 0))
+        found = (source_keys[position] == all_keys) if len(source_keys) else np.zeros(len(all_keys), bool)
+        gathered = {}
+        for name, array in source_values.items():
+            if array.dtype.kind == 'f':
+                gathered[name] = np.where(found, array[position] if len(array) else np.nan, np.nan)
+            else:
+                result = np.full(len(all_keys), -1, dtype=np.int64)
+                if len(array):
+                    result[found] = array[position[found]]
+                gathered[name] = result
+        return found, gathered
+
+    in_current, current = gather(keys, values)
+    in_previous, previous = gather(prev_keys, prev_values)
+
+    shares_delta = np.nan_to_num(current['shares']) - np.nan_to_num(previous['shares'])
+    weight_delta = np.nan_to_num(current['weight']) - np.nan_to_num(previous['weight'])
+
+    action = np.where(~in_previous, 0,
+             np.where(~in_current, 1,
+             np.where(shares_delta > 0, 2,
+             np.where(shares_delta < 0, 3, 4))))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_current = current['amount'] / current['shares']
+        price_previous = previous['amount'] / previous['shares']
+    price = np.where(np.isfinite(price_current), price_current, price_previous)
+    price = np.where(np.isfinite(price), price, np.nan)
+
+    names = np.where(current['name'] >= 0, current['name'], previous['name'])
+
+    result = pd.DataFrame({
+        'etf': pd.Categorical.from_codes(snapshot_etf[all_snapshot], categories=pd.Index(etf_values).astype(str)),
+        '日期': snapshot_dates[all_snapshot],
+        '前日日期': snapshot_dates[all_snapshot - 1],
+        '股票代號': pd.Categorical.from_codes(all_keys & _LOW_MASK, categories=pd.Index(code_values).astype(str)),
+        '股票名稱': pd.Categorical.from_codes(names, categories=pd.Index(name_values).astype(str)),
+        '動作': pd.Categorical.from_codes(action, categories=ACTIONS),
+        '前日股數': previous['shares'],
+        '股數': current['shares'],
+        '股數變化': shares_delta,
+        '前日權重': previous['weight'],
+        '持股權重': current['weight'],
+        '權重變化': weight_delta,
+        '估計股價': price,
+        '估計成交金額': shares_delta * price,
+    })
+
+    if since:
+        cutoff = pd.to_datetime(result['etf'].astype(str).map(since))
+        result = result[cutoff.isna() | (result['日期'] > cutoff)]
+    return result.reset_index(drop=True)
+
+
+def load_holding_changes(path=CHANGES_FILE):
+    """讀取已計算的持股異動，不存在時回傳空的 DataFrame"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    return pd.read_parquet(path)
+
+
+def update_holding_changes(etf_codes=None, store_dir=STORE_DIR, path=CHANGES_FILE, rebuild=False,
+                           rewritten=None):
+    """
+    增量更新持股異動表: 每檔 ETF 只讀取資料集中上次更新的最後一日 (作為前一日) 之後的持股
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示資料集中全部
+    rebuild: 重新計算 etf_codes 的全部日期 (其他 ETF 的列保留)
+    rewritten: {ETF 代碼: 最早被覆寫的快照日期}，該 ETF 自這天起重新計算 (見 holdings_store.take_rewritten_dates)
+
+    回傳:
+    (完整異動表, 本次新增的異動列)
+    """
+    def compute(since, codes, existing):
+        start = pd.Timestamp(since).date() if since is not None else None
+        history = read_dataset("holding", codes, start=start, store_dir=store_dir)
+        if not history.num_rows:
+            return None
+        since_map = {code: since for code in codes} if since is not None else None
+        return compute_holding_changes(history.to_pandas(), since=since_map)
+
+    return update_table(path, compute, load_holding_changes, CHANGE_COLUMNS, ['etf', '日期', '股票代號'],
+                        _update_lock, etf_codes, "holding", store_dir, rebuild, rewritten=rewritten)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算 ETF 經理人每日買賣異動")
+    parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--top", type=int, default=10, help="每檔 ETF 列出的異動筆數")
+    parser.add_argument("--rebuild", action="store_true", help="重新計算指定 ETF (預設全部) 的全部日期")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    changes, new_rows = update_holding_changes(args.etf_codes or None, store_dir=base_dir / "store",
+                                               path=base_dir / "analytics" / CHANGES_FILE.name,
+                                               rebuild=args.rebuild)
+    print(f"✓ 新增 {len(new_rows)} 筆異動，共 {len(changes)} 筆")
+
+    for etf_code in args.etf_codes or sorted(changes['etf'].astype(str).unique()):
+        etf_changes = changes[changes['etf'] == etf_code]
+        if etf_changes.empty:
+            continue
+        latest = etf_changes[etf_changes['日期'] == etf_changes['日期'].max()]
+        latest = latest[latest['動作'] != ACTION_HOLD]
+        latest = latest.reindex(latest['權重變化'].abs().sort_values(ascending=False).index)
+        print("=" * 60)
+        print(f"{etf_code} {pd.Timestamp(latest['日期'].iloc[0]).date() if len(latest) else ''} 異動")
+        print("=" * 60)
+        print(latest.head(args.top)[['股票代號', '股票名稱', '動作', '股數變化', '權重變化', '估計成交金額']]
+              .to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
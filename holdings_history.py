@@ -0,0 +1,204 @@
+"""
+持股歷史載入 (含增量快取)
+取代研究筆記本每次 glob 全部每日檔案再 pd.concat 的作法:
+- 每檔 ETF 在 data/cache/history/<ETF>/ 保存 Arrow IPC 快取片段與 manifest
+- manifest 記錄每個來源檔的修改時間與大小，只讀取新增或變更的檔案
+- 快取以記憶體映射 (memory map) 讀取，不需重新解碼
+- 回傳以股票代號、日期為索引的 DataFrame，可直接 df.loc['2330'] 取得單一股票歷史
+
+使用方式:
+    from holdings_history import load_holdings_history
+    history = load_holdings_history(['00981A', '00991A'], start='2025-12-01')
+    history.loc['2330']
+"""
+
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from holdings_schema import HOLDING_SCHEMA, is_canonical, to_holding_table
+from holdings_store import sort_table
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = DATA_DIR / "cache" / "history"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+# 片段數超過此值時合併為單一片段
+MAX_SEGMENTS = 32
+
+# 快取與每日持股檔同為統一格式 (見 holdings_schema)
+HISTORY_SCHEMA = HOLDING_SCHEMA
+
+
+def source_files(etf_code, base_dir=DATA_DIR):
+    """
+    列出 ETF 的每日持股檔 {檔名: 路徑}
+    包含 data/<ETF>/holding/<YYYYMMDD>.parquet 與舊版放在 data/<ETF>/ 下的檔案
+    """
+    files = {}
+    etf_dir = Path(base_dir) / etf_code
+    for directory in (etf_dir, etf_dir / "holding"):
+        for path in directory.glob("*.parquet"):
+            if path.stem.isdigit() and len(path.stem) == 8:
+                files[path.stem] = path
+    return files
+
+
+def _read_source(path, etf_code, date_str):
+    """讀取每日持股檔；已是統一格式的檔案直接使用，舊格式才逐欄轉換"""
+    table = pq.read_table(path)
+    if is_canonical(table.schema):
+        return table.replace_schema_metadata(None)
+    return to_holding_table(table.to_pandas(), etf_code, date_str)
+
+
+class HistoryCache:
+    """單一 ETF 的快取目錄 (多個 Arrow IPC 片段 + manifest)"""
+
+    def __init__(self, etf_code, cache_dir=CACHE_DIR):
+        self.etf_code = etf_code
+        self.directory = Path(cache_dir) / etf_code
+        self.manifest_path = self.directory / MANIFEST_FILE
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except (FileNotFoundError, ValueError):
+            pass
+        return {'version': MANIFEST_VERSION, 'files': {}, 'segments': []}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(self.manifest, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write_segment(self, table):
+        name = f"seg-{uuid.uuid4().hex}.arrow"
+        tmp_path = self.directory / f".{name}.tmp"
+        # IPC 檔案每個欄位只能有一份字典，先統一各批次的字典
+        table = table.unify_dictionaries()
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, self.directory / name)
+        return name
+
+    def _read_segments(self):
+        tables = []
+        for name in self.manifest['segments']:
+            source = pa.memory_map(str(self.directory / name), 'r')
+            tables.append(pa.ipc.open_file(source).read_all())
+        if not tables:
+            return HISTORY_SCHEMA.empty_table()
+        return pa.concat_tables(tables)
+
+    def _reset(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.manifest = {'version': MANIFEST_VERSION, 'files': {}, 'segments': []}
+
+    def update(self, files):
+        """
+        依來源檔同步快取
+
+        參數:
+        files: {檔名: 路徑}
+
+        回傳:
+        本次讀取的來源檔數量
+        """
+        current = {}
+        for name, path in files.items():
+            stat = path.stat()
+            current[name] = [stat.st_mtime_ns, stat.st_size]
+
+        known = self.manifest['files']
+        changed = [name for name in known if current.get(name) != known[name]]
+        if changed:
+            # 有檔案被修改或刪除時整個 ETF 重建 (少見)
+            self._reset()
+            known = self.manifest['files']
+
+        new_files = sorted(name for name in current if name not in known)
+        if not new_files:
+            return 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tables = [_read_source(files[name], self.etf_code, name) for name in new_files]
+        self.manifest['segments'].append(self._write_segment(pa.concat_tables(tables)))
+        for name in new_files:
+            known[name] = current[name]
+
+        if len(self.manifest['segments']) > MAX_SEGMENTS:
+            self._consolidate()
+        self._save_manifest()
+        return len(new_files)
+
+    def _consolidate(self):
+        old_segments = list(self.manifest['segments'])
+        table = sort_table(self._read_segments(), [('日期', 'ascending'), ('股票代號', 'ascending')])
+        self.manifest['segments'] = [self._write_segment(table)]
+        self._save_manifest()
+        for name in old_segments:
+            try:
+                (self.directory / name).unlink()
+            except OSError:
+                pass
+
+    def read(self):
+        """以記憶體映射讀取快取，回傳 pyarrow.Table"""
+        return self._read_segments()
+
+
+def load_holdings_history_table(etf_codes, start=None, end=None, base_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    載入多檔 ETF 的持股歷史，回傳 pyarrow.Table
+    (快取會先與每日檔案同步，只讀取新增或變更的檔案)
+    """
+    if isinstance(etf_codes, str):
+        etf_codes = [etf_codes]
+
+    tables = []
+    for etf_code in etf_codes:
+        cache = HistoryCache(etf_code, cache_dir)
+        cache.update(source_files(etf_code, base_dir))
+        tables.append(cache.read())
+    table = pa.concat_tables(tables) if tables else HISTORY_SCHEMA.empty_table()
+
+    if start is not None:
+        start = pa.scalar(pd.Timestamp(start).date(), type=pa.date32())
+        table = table.filter(pc.greater_equal(table['日期'], start))
+    if end is not None:
+        end = pa.scalar(pd.Timestamp(end).date(), type=pa.date32())
+        table = table.filter(pc.less_equal(table['日期'], end))
+    return table
+
+
+def load_holdings_history(etf_codes, start=None, end=None, base_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    載入持股歷史
+
+    參數:
+    etf_codes: ETF 代碼或代碼列表
+    start, end: 日期範圍 (含)，None 表示不限
+    base_dir: 每日檔案的資料目錄
+    cache_dir: 快取目錄
+
+    回傳:
+    以 (股票代號, 日期) 為索引並排序的 DataFrame，欄位包含 etf、股票名稱、股數、持股權重、金額
+    """
+    table = load_holdings_history_table(etf_codes, start, end, base_dir, cache_dir)
+    df = table.to_pandas()
+    df['日期'] = pd.to_datetime(df['日期'])
+    return df.set_index(['股票代號', '日期']).sort_index()
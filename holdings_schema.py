@@ -0,0 +1,256 @@
+"""
+統一的持股資料格式
+各 ETF 轉接器 (00981A / 00982A / 00991A) 輸出的欄位名稱與型態不一致，
+寫入前一律轉為 HOLDING_SCHEMA:
+
+    etf        dictionary<string>   ETF 代碼
+    日期        date32               資料日期
+    股票代號    dictionary<string>   股票代號 (字串，保留前導 0)
+    股票名稱    dictionary<string>
+    股數        int64
+    持股權重    float32              小數 (18.156% → 0.18156)
+    金額        float64              持股市值，沒有提供時為 null
+
+使用方式:
+    python holdings_schema.py migrate               # 轉換 data/ 下所有既有的每日持股檔與資料集
+    python holdings_schema.py migrate 00991A --dry-run
+"""
+
+import argparse
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+
+_DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+
+HOLDING_SCHEMA = pa.schema([
+    ('etf', _DICTIONARY),
+    ('日期', pa.date32()),
+    ('股票代號', _DICTIONARY),
+    ('股票名稱', _DICTIONARY),
+    ('股數', pa.int64()),
+    ('持股權重', pa.float32()),
+    ('金額', pa.float64()),
+])
+
+HOLDING_COLUMNS = HOLDING_SCHEMA.names
+
+# 持股權重合計的上限 (容許四捨五入與槓桿部位)
+WEIGHT_SUM_LIMIT = 1.5
+
+# 各 ETF 的欄位名稱對應到統一名稱
+COLUMN_ALIASES = {
+    '證券代號': '股票代號',
+    '證券名稱': '股票名稱',
+    '權重(%)': '持股權重',
+}
+
+
+def _to_date(value):
+    text = str(value).strip()
+    if text.isdigit() and len(text) == 8:
+        return pd.Timestamp(f"{text[:4]}-{text[4:6]}-{text[6:]}").date()
+    return pd.Timestamp(value).date()
+
+
+def _string_column(values):
+    """轉為去除空白、去除 Excel 數字尾端 .0 的字串，缺值維持 null"""
+    cleaned = values.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return pa.array(cleaned.where(values.notna(), None), type=pa.string(), from_pandas=True).dictionary_encode()
+
+
+def to_holding_table(df, etf_code, data_date):
+    """
+    將單日持股 DataFrame 轉為統一格式
+
+    參數:
+    df: 任一轉接器輸出的持股 DataFrame (可使用 COLUMN_ALIASES 中的舊欄位名稱)
+    etf_code: ETF 代碼
+    data_date: 資料日期 (YYYYMMDD 字串、date 或 Timestamp)
+
+    回傳:
+    符合 HOLDING_SCHEMA 的 pyarrow.Table；股數四捨五入為整數
+    """
+    df = df.rename(columns=COLUMN_ALIASES)
+    n_rows = len(df)
+    date = _to_date(data_date)
+
+    columns = {
+        'etf': pa.array([etf_code] * n_rows, type=pa.string()).dictionary_encode(),
+        '日期': pa.array([date] * n_rows, type=pa.date32()),
+    }
+    for name in ('股票代號', '股票名稱'):
+        columns[name] = _string_column(df[name]) if name in df.columns else pa.nulls(n_rows, type=_DICTIONARY)
+
+    for field in HOLDING_SCHEMA:
+        if field.name in columns:
+            continue
+        if field.name not in df.columns:
+            columns[field.name] = pa.nulls(n_rows, type=field.type)
+            continue
+        values = pd.to_numeric(df[field.name], errors='coerce')
+        if pa.types.is_integer(field.type):
+            values = values.round().astype('Int64')
+        columns[field.name] = pa.array(values, type=field.type, from_pandas=True)
+
+    return pa.table(columns, schema=HOLDING_SCHEMA)
+
+
+def to_holding_frame(df, etf_code, data_date):
+    """同 to_holding_table，回傳 DataFrame (代號與名稱為 category，日期為 datetime64)"""
+    return to_holding_table(df, etf_code, data_date).to_pandas(date_as_object=False)
+
+
+def validate_holdings(table):
+    """
+    檢查統一格式持股的基本合理性
+
+    回傳:
+    問題描述的列表，沒有問題時為空列表
+    """
+    problems = []
+    if table.num_rows == 0:
+        return ["沒有持股資料"]
+    codes = table['股票代號']
+    if codes.null_count:
+        problems.append(f"{codes.null_count} 筆缺少股票代號")
+    if pc.count_distinct(codes.cast(pa.string())).as_py() < table.num_rows - codes.null_count:
+        problems.append("股票代號重複")
+    shares = table['股數']
+    if shares.null_count == table.num_rows:
+        problems.append("股數全部無法解析")
+    elif pc.any(pc.less(shares, 0)).as_py():
+        problems.append("股數出現負值")
+    weights = table['持股權重']
+    if weights.null_count < table.num_rows:
+        total = pc.sum(weights).as_py()
+        # 權重為小數，合計明顯超過 1 通常代表單位錯誤 (百分比未除以 100)
+        if total > WEIGHT_SUM_LIMIT:
+            problems.append(f"持股權重合計 {total:.2f} 超過 {WEIGHT_SUM_LIMIT}")
+    return problems
+
+
+def write_holding_file(table, path):
+    """寫入統一格式的每日持股檔 (先寫暫存檔再改名)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp_path, compression='snappy')
+    os.replace(tmp_path, path)
+    return path
+
+
+def save_holdings(df, etf_code, data_date, holding_dir, store_dir):
+    """
+    轉換為統一格式後寫入每日持股檔 (<holding_dir>/<YYYYMMDD>.parquet) 與分區資料集
+
+    回傳:
+    (每日持股檔路徑, 統一格式的 DataFrame)
+    """
+    from holdings_store import append_snapshot
+
+    table = to_holding_table(df, etf_code, data_date)
+    for problem in validate_holdings(table):
+        print(f"⚠ {etf_code} {data_date} 持股資料檢查: {problem}")
+    path = write_holding_file(table, Path(holding_dir) / f"{_to_date(data_date):%Y%m%d}.parquet")
+    append_snapshot(table, etf_code, data_date, "holding", store_dir)
+    return path, table.to_pandas(date_as_object=False)
+
+
+def is_canonical(schema):
+    return schema.remove_metadata().equals(HOLDING_SCHEMA)
+
+
+def migrate_holding_files(etf_code, base_dir=DATA_DIR, dry_run=False):
+    """
+    將 ETF 既有的每日持股檔轉為統一格式 (data/<ETF>/holding/*.parquet 與舊版 data/<ETF>/*.parquet)
+
+    回傳:
+    [(檔案路徑, 轉換前大小, 轉換後大小)]，已是統一格式的檔案會略過
+    """
+    results = []
+    etf_dir = Path(base_dir) / etf_code
+    for directory in (etf_dir, etf_dir / "holding"):
+        for path in sorted(directory.glob("*.parquet")):
+            if not (path.stem.isdigit() and len(path.stem) == 8):
+                continue
+            if is_canonical(pq.read_schema(path)):
+                continue
+            before = path.stat().st_size
+            table = to_holding_table(pd.read_parquet(path), etf_code, path.stem)
+            if not dry_run:
+                write_holding_file(table, path)
+            results.append((path, before, path.stat().st_size))
+    return results
+
+
+def migrate_store(etf_codes=None, store_dir=None):
+    """
+    將分區資料集 (data/store/holding) 內的檔案轉為統一格式
+    etf 由分區目錄提供，檔案內不重複存放
+
+    回傳:
+    轉換的檔案數量
+    """
+    from holdings_store import STORE_DIR
+
+    root = Path(store_dir or STORE_DIR) / "holding"
+    count = 0
+    for path in sorted(root.glob("etf=*/year=*/month=*/*.parquet")):
+        etf_code = path.parent.parent.parent.name.split("=", 1)[1]
+        if etf_codes and etf_code not in etf_codes:
+            continue
+        if is_canonical(pq.read_schema(path).insert(0, HOLDING_SCHEMA.field('etf'))):
+            continue
+        old = pq.read_table(path)
+        frames = []
+        for date in pd.unique(old['日期'].to_pandas()):
+            day = old.filter(pc.equal(old['日期'], pa.scalar(date, type=old.schema.field('日期').type)))
+            frames.append(to_holding_table(day.to_pandas(), etf_code, date))
+        table = pa.concat_tables(frames) if frames else HOLDING_SCHEMA.empty_table()
+        write_holding_file(table.drop_columns(['etf']), path)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="持股資料統一格式")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="轉換既有的每日持股檔")
+    migrate_parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    migrate_parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="只列出需要轉換的檔案")
+
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    etf_codes = args.etf_codes or sorted(
+        p.name for p in base_dir.iterdir()
+        if p.is_dir() and p.name != "store" and (p / "holding").is_dir()
+    )
+    total_before = total_after = 0
+    for etf_code in etf_codes:
+        results = migrate_holding_files(etf_code, base_dir, args.dry_run)
+        before = sum(r[1] for r in results)
+        after = sum(r[2] for r in results)
+        total_before += before
+        total_after += after
+        print(f"✓ {etf_code}: 轉換 {len(results)} 個檔案 ({before:,} → {after:,} bytes)")
+
+    if not args.dry_run:
+        count = migrate_store(etf_codes, base_dir / "store")
+        print(f"✓ 資料集: 轉換 {count} 個檔案")
+    print(f"共 {total_before:,} → {total_after:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""
+本機持股查詢服務 (常駐)
+啟動時將資料集 (data/store) 的持股與投資組合歷史載入記憶體中的 pyarrow.Table，並建立索引:
+- ETF: 每檔 ETF 一份依 (日期, 股票代號) 排序的表格
+- 日期: 每個快照在表格中的起訖位置，查詢某日 (或最新) 持股只需切片，不複製資料
+- 股票代號: 每檔股票所在的列，查詢單一股票的歷史只取出這些列
+每日異動 (holdings_changes.compute_holding_changes) 也在載入時算好，同樣以日期索引
+
+背景執行緒定期比對資料集檔案 (路徑、大小、修改時間)，有新快照或被覆寫的 ETF 才重新載入；
+重新載入時建立新的索引後整份替換，查詢中的請求仍使用舊的資料，不需要鎖
+
+透過 localhost HTTP 回應 JSON 或 Arrow IPC (format=arrow，或 Accept: application/vnd.apache.arrow.stream):
+    GET /etfs                                       各 ETF 的資料日期範圍
+    GET /holdings?etf=00981A[&date=2025-06-02]      最新 (或指定日期以前最近一日) 的持股
+    GET /stocks/2330[?etf=00981A,00982A&start=&end=]  單一股票在各 ETF 的每日持股
+    GET /changes?etf=00981A[&date=&action=新增]     每日持股異動
+    GET /portfolio?etf=00981A[&start=&end=]         投資組合 (淨資產等) 歷史
+
+使用方式:
+    python holdings_service.py --port 8766
+
+    from holdings_service import fetch_table
+    table = fetch_table("/holdings", etf="00981A")        # notebook / dashboard 端
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from holdings_changes import compute_holding_changes
+from holdings_store import DATE_COLUMN, KINDS, STORE_DIR, read_dataset, sort_table, to_date
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+POLL_INTERVAL = 5.0  # 秒
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json; charset=utf-8"
+
+PARTITION_COLUMNS = ("year", "month")
+
+logger = logging.getLogger(__name__)
+
+
+def _days(table):
+    """日期欄位轉為 numpy int32 (1970-01-01 起的天數)"""
+    column = table[DATE_COLUMN]
+    if not pa.types.is_date32(column.type):
+        column = column.cast(pa.date32())
+    return column.combine_chunks().view(pa.int32()).to_numpy(zero_copy_only=False)
+
+
+def _day_number(value):
+    return (to_date(value) - date(1970, 1, 1)).days
+
+
+class DateIndex:
+    """依日期排序的表格中，每個日期的起訖列位置"""
+
+    def __init__(self, table):
+        days = _days(table) if table.num_rows else np.empty(0, dtype=np.int32)
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        self.days = days[np.concatenate([[0], boundaries])] if len(days) else days
+        self.starts = np.concatenate([[0], boundaries, [len(days)]]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.days)
+
+    def dates(self):
+        return [date.fromordinal(date(1970, 1, 1).toordinal() + int(day)) for day in self.days]
+
+    def at_or_before(self, day=None):
+        """指定日期 (None 表示最新) 以前最近一個日期的位置，沒有時回傳 None"""
+        if not len(self.days):
+            return None
+        if day is None:
+            return len(self.days) - 1
+        position = int(np.searchsorted(self.days, _day_number(day), side="right")) - 1
+        return position if position >= 0 else None
+
+    def range(self, start=None, end=None):
+        """日期範圍 (含) 的起訖列位置"""
+        first = 0 if start is None else int(np.searchsorted(self.days, _day_number(start), side="left"))
+        last = len(self.days) if end is None else int(np.searchsorted(self.days, _day_number(end), side="right"))
+        return int(self.starts[first]), int(self.starts[max(first, last)])
+
+    def slice(self, table, position):
+        return table.slice(self.starts[position], self.starts[position + 1] - self.starts[position])
+
+
+class EtfSnapshot:
+    """
+    單一 ETF 載入記憶體的資料與索引 (建立後不再修改)
+
+    holdings / changes 依 (日期, 股票代號) 排序，portfolio 依日期排序
+    """
+
+    def __init__(self, etf_code, holdings, portfolio, signature):
+        self.etf_code = etf_code
+        self.signature = signature
+        self.holdings = self._prepare(holdings, [(DATE_COLUMN, "ascending"), ("股票代號", "ascending")])
+        self.portfolio = self._prepare(portfolio, [(DATE_COLUMN, "ascending")])
+        self.holding_dates = DateIndex(self.holdings)
+        self.portfolio_dates = DateIndex(self.portfolio)
+        self.stock_rows = self._stock_index(self.holdings)
+
+        changes = pa.table({})
+        if self.holdings.num_rows and len(self.holding_dates) > 1:
+            changes = pa.Table.from_pandas(compute_holding_changes(self.holdings.to_pandas()), preserve_index=False)
+            changes = changes.set_column(changes.schema.get_field_index(DATE_COLUMN), DATE_COLUMN,
+                                         changes[DATE_COLUMN].cast(pa.date32()))
+            changes = changes.set_column(changes.schema.get_field_index("前日日期"), "前日日期",
+                                         changes["前日日期"].cast(pa.date32()))
+            changes = sort_table(changes, [(DATE_COLUMN, "ascending"), ("股票代號", "ascending")])
+        self.changes = changes.combine_chunks()
+        self.change_dates = DateIndex(self.changes)
+
+    @staticmethod
+    def _prepare(table, keys):
+        if not table.num_rows:
+            return pa.table({})
+        table = table.drop_columns([name for name in PARTITION_COLUMNS if name in table.column_names])
+        return sort_table(table, keys).combine_chunks()
+
+    @staticmethod
+    def _stock_index(table):
+        """{股票代號: 列位置 (依日期排序)}"""
+        if not table.num_rows:
+            return {}
+        codes, values = pd.factorize(table["股票代號"].to_pandas().astype(object), sort=False)
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes[codes >= 0], minlength=len(values))
+        sorted_rows = order[np.count_nonzero(codes < 0):]
+        groups = np.split(sorted_rows, np.cumsum(counts)[:-1])
+        return {str(code): rows for code, rows in zip(values, groups)}
+
+    def summary(self):
+        dates = self.holding_dates.dates()
+        return {
+            'etf': self.etf_code,
+            '持股日期數': len(dates),
+            '最早日期': dates[0] if dates else None,
+            '最新日期': dates[-1] if dates else None,
+            '最新持股數': int(self.holding_dates.starts[-1] - self.holding_dates.starts[-2]) if dates else 0,
+            '投資組合日期數': len(self.portfolio_dates),
+        }
+
+    def latest_holdings(self, day=None):
+        position = self.holding_dates.at_or_before(day)
+        return self.holding_dates.slice(self.holdings, position) if position is not None else None
+
+    def stock_history(self, stock, start=None, end=None):
+        rows = self.stock_rows.get(stock)
+        if rows is None:
+            return None
+        first, last = self.holding_dates.range(start, end)
+        rows = rows[np.searchsorted(rows, first):np.searchsorted(rows, last)]
+        return self.holdings.take(rows) if len(rows) else None
+
+    def daily_changes(self, day=None):
+        position = self.change_dates.at_or_before(day)
+        return self.change_dates.slice(self.changes, position) if position is not None else None
+
+    def portfolio_history(self, start=None, end=None):
+        first, last = self.portfolio_dates.range(start, end)
+        return self.portfolio.slice(first, last - first) if last > first else None
+
+
+def store_signatures(store_dir=STORE_DIR):
+    """
+    {ETF 代碼: 資料集檔案簽章}，簽章為各檔案 (種類, 相對路徑, 大小, 修改時間) 的 tuple
+    只掃描目錄，不讀取檔案內容
+    """
+    signatures = {}
+    for kind in KINDS:
+        root = Path(store_dir) / kind
+        if not root.exists():
+            continue
+        for etf_dir in root.iterdir():
+            if not etf_dir.is_dir() or not etf_dir.name.startswith("etf="):
+                continue
+            entries = signatures.setdefault(etf_dir.name.split("=", 1)[1], [])
+            for dirpath, _, filenames in os.walk(etf_dir):
+                for filename in filenames:
+                    if filename.endswith(".parquet") and not filename.startswith("."):
+                        stat = os.stat(os.path.join(dirpath, filename))
+                        entries.append((kind, os.path.relpath(os.path.join(dirpath, filename), root),
+                                        stat.st_size, stat.st_mtime_ns))
+    return {etf_code: tuple(sorted(entries)) for etf_code, entries in signatures.items()}
+
+
+class HoldingsCache:
+    """
+    記憶體中的持股 / 投資組合資料 (每檔 ETF 一個 EtfSnapshot)
+
+    參數:
+    store_dir: 資料集根目錄
+    etf_codes: 只載入這些 ETF，None 表示全部
+    """
+
+    def __init__(self, store_dir=STORE_DIR, etf_codes=None):
+        self.store_dir = Path(store_dir)
+        self.etf_codes = set(etf_codes) if etf_codes else None
+        self.snapshots = {}
+        self.loaded_at = None
+        self.reloads = 0
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        """
+        重新載入資料集檔案有變動的 ETF
+
+        回傳:
+        重新載入 (或移除) 的 ETF 代碼列表
+        """
+        with self._refresh_lock:
+            signatures = store_signatures(self.store_dir)
+            if self.etf_codes is not None:
+                signatures = {code: sig for code, sig in signatures.items() if code in self.etf_codes}
+            current = self.snapshots
+            changed = sorted(code for code, signature in signatures.items()
+                             if code not in current or current[code].signature != signature)
+            removed = sorted(set(current) - set(signatures))
+            if not changed and not removed:
+                return []
+
+            snapshots = {code: snapshot for code, snapshot in current.items() if code in signatures}
+            for etf_code in changed:
+                started = time.perf_counter()
+                try:
+                    holdings = read_dataset("holding", [etf_code], store_dir=self.store_dir)
+                    portfolio = read_dataset("portfolio", [etf_code], store_dir=self.store_dir)
+                    snapshots[etf_code] = EtfSnapshot(etf_code, holdings, portfolio, signatures[etf_code])
+                except Exception as e:
+                    # 檔案正在被改寫時 (壓縮、回補) 可能讀取失敗，保留舊資料，下次再載入
+                    logger.warning("%s 載入失敗，沿用既有資料: %s", etf_code, e)
+                    continue
+                logger.info("%s 已載入 %d 筆持股、%d 個日期 (%.0f ms)", etf_code,
+                            snapshots[etf_code].holdings.num_rows, len(snapshots[etf_code].holding_dates),
+                            (time.perf_counter() - started) * 1000)
+            # 整份替換，查詢端不會看到更新到一半的狀態
+            self.snapshots = snapshots
+            self.loaded_at = time.time()
+            self.reloads += 1
+            return changed + removed
+
+    def get(self, etf_code):
+        snapshot = self.snapshots.get(etf_code)
+        if snapshot is None:
+            raise KeyError(f"沒有 {etf_code} 的資料")
+        return snapshot
+
+    def latest_holdings(self, etf_code, day=None):
+        return self.get(etf_code).latest_holdings(day)
+
+    def daily_changes(self, etf_code, day=None, actions=None):
+        table = self.get(etf_code).daily_changes(day)
+        if table is not None and actions:
+            table = table.filter(pc.is_in(table["動作"].cast(pa.string()), pa.array(actions)))
+        return table
+
+    def portfolio_history(self, etf_code, start=None, end=None):
+        return self.get(etf_code).portfolio_history(start, end)
+
+    def stock_history(self, stock, etf_codes=None, start=None, end=None):
+        snapshots = self.snapshots
+        codes = etf_codes or sorted(snapshots)
+        tables = [table for table in (snapshots[code].stock_history(stock, start, end)
+                                      for code in codes if code in snapshots) if table is not None]
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options="permissive") if len(tables) > 1 else tables[0]
+
+    def watch(self, interval=POLL_INTERVAL, stop=None):
+        """定期重新載入有變動的 ETF (在背景執行緒中執行)，stop 事件設定後結束"""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            try:
+                changed = self.refresh()
+                if changed:
+                    logger.info("資料更新: %s", ", ".join(changed))
+            except Exception:
+                logger.exception("檢查資料集時發生錯誤")
+
+
+def _json_ready(table):
+    """dictionary 欄位轉為一般欄位、浮點數 NaN 轉為 null (JSON 不支援 NaN)"""
+    columns = []
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        elif pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_nan(column), pa.scalar(None, type=column.type), column)
+        columns.append(column)
+    return pa.table(columns, names=table.column_names)
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_table(table, arrow=False):
+    """查詢結果編碼為 (內容, Content-Type)"""
+    if arrow:
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_MIME
+    body = {'rows': table.num_rows, 'data': _json_ready(table).to_pylist()}
+    return json.dumps(body, ensure_ascii=False, default=_json_default).encode("utf-8"), JSON_MIME
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """HTTP 查詢端點 (見模組說明)，cache 由 make_server 設定"""
+
+    cache = None
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8"),
+                   JSON_MIME)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        arrow = params.pop("format", "") == "arrow" or ARROW_MIME in self.headers.get("Accept", "")
+        segments = [unquote(segment) for segment in parts.path.strip("/").split("/") if segment]
+        try:
+            table = self._route(segments, params)
+        except KeyError as e:
+            self._send_json(404, {'error': e.args[0] if e.args else str(e)})
+            return
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logger.exception("查詢 %s 時發生錯誤", self.path)
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+            return
+
+        if isinstance(table, (dict, list)):
+            self._send_json(200, table)
+            return
+        self._send(200, *encode_table(table if table is not None else pa.table({}), arrow))
+
+    def _route(self, segments, params):
+        cache = self.cache
+        endpoint = segments[0] if segments else ""
+        if endpoint == "etfs":
+            return [snapshot.summary() for _, snapshot in sorted(cache.snapshots.items())]
+        if endpoint == "health":
+            return {'etfs': len(cache.snapshots), 'reloads': cache.reloads, 'loaded_at': cache.loaded_at}
+        if endpoint == "holdings":
+            return cache.latest_holdings(self._required(params, "etf"), params.get("date"))
+        if endpoint == "stocks" and len(segments) == 2:
+            etf_codes = params["etf"].split(",") if params.get("etf") else None
+            return cache.stock_history(segments[1], etf_codes, params.get("start"), params.get("end"))
+        if endpoint == "changes":
+            actions = params["action"].split(",") if params.get("action") else None
+            return cache.daily_changes(self._required(params, "etf"), params.get("date"), actions)
+        if endpoint == "portfolio":
+            return cache.portfolio_history(self._required(params, "etf"), params.get("start"), params.get("end"))
+        raise KeyError(f"未知的查詢: /{'/'.join(segments)}")
+
+    @staticmethod
+    def _required(params, name):
+        if not params.get(name):
+            raise ValueError(f"缺少參數 {name}")
+        return params[name]
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(cache, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """建立查詢服務的 HTTP 伺服器 (尚未開始處理請求)"""
+    handler = type("BoundQueryHandler", (QueryHandler,), {'cache': cache})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def fetch_table(endpoint, base_url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=10, **params):
+    """
+    向查詢服務取得 Arrow 格式的結果
+
+    參數:
+    endpoint: 查詢路徑，例如 "/holdings"、"/stocks/2330"
+    params: 查詢參數，例如 etf="00981A"、date="2025-06-02"
+
+    回傳:
+    pyarrow.Table
+    """
+    from urllib.request import Request, urlopen
+
+    query = urlencode({key: value for key, value in params.items() if value is not None})
+    request = Request(f"{base_url.rstrip('/')}/{endpoint.lstrip('/')}" + (f"?{query}" if query else ""),
+                      headers={"Accept": ARROW_MIME})
+    with urlopen(request, timeout=timeout) as response:
+        return pa.ipc.open_stream(response.read()).read_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本機持股查詢服務 (記憶體中的 Arrow 資料與索引)")
+    parser.add_argument("etf_codes", nargs="*", help="只載入這些 ETF (預設全部)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"監聽位址 (預設 {DEFAULT_HOST}，只接受本機連線)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"連接埠 (預設 {DEFAULT_PORT})")
+    parser.add_argument("--store-dir", default=str(STORE_DIR), help="資料集根目錄")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="檢查新資料的間隔秒數")
+    parser.add_argument("--verbose", action="store_true", help="記錄每個請求")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    cache = HoldingsCache(args.store_dir, args.etf_codes or None)
+    started = time.perf_counter()
+    cache.refresh()
+    if not cache.snapshots:
+        print(f"⚠ {args.store_dir} 沒有任何資料，等待新資料寫入")
+    else:
+        print(f"✓ 已載入 {len(cache.snapshots)} 檔 ETF ({time.perf_counter() - started:.1f} 秒)")
+
+    stop = threading.Event()
+    threading.Thread(target=cache.watch, args=(args.interval, stop), name="store-watch", daemon=True).start()
+    server = make_server(cache, args.host, args.port)
+    print(f"✓ 查詢服務: http://{args.host}:{server.server_address[1]}/etfs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n收到中斷訊號，結束服務")
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
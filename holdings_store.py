@@ -0,0 +1,415 @@
+"""
+持股 / 投資組合的分區 Parquet 資料集
+以 hive 分區 (etf=<代碼>/year=<年>/month=<月>) 取代每天一個小檔案:
+- append_snapshot: 寫入單日快照 (每日一個 part 檔)；覆寫已存在的日期時記錄下來，
+  由 take_rewritten_dates 取出 (run_all_etfs.run_etf 據此讓衍生資料表重算該日之後的列)
+- write_snapshots: 一次寫入多日資料 (回補歷史用，直接併入各分區的合併檔)
+- compact: 將分區內的小檔合併為依股票代號、日期排序的單一檔案
+- read_dataset: 以 pyarrow.dataset 讀取，依分區與條件略過不需要的檔案 (依股票代號查詢見 query.py)
+
+目錄結構:
+    data/store/holding/etf=00981A/year=2025/month=12/part-20251226.parquet
+    data/store/holding/etf=00981A/year=2025/month=12/compacted.parquet
+"""
+
+import argparse
+import os
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+STORE_DIR = DATA_DIR / "store"
+
+KINDS = ("holding", "portfolio")
+DATE_COLUMN = "日期"
+# 依序尋找存在的股票代號欄位作為排序鍵
+CODE_COLUMNS = ("股票代號", "證券代號")
+
+COMPACTED_FILE = "compacted.parquet"
+# 一個月分區約 50~200 檔持股 × 20 個交易日；合併檔依股票代號排序後，
+# 每個 row group 只涵蓋一段代號範圍，依代號查詢時可由欄位統計略過其他 row group
+ROW_GROUP_SIZE = 2048
+COMPRESSION = "snappy"
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("etf", pa.string()), ("year", pa.int16()), ("month", pa.int8())]),
+    flavor="hive",
+)
+
+# append_snapshot 覆寫的日期: {ETF 代碼: {日期}}
+_rewritten_dates = {}
+_rewritten_lock = threading.Lock()
+
+
+def to_date(value):
+    """將 'YYYYMMDD'、'YYYY/MM/DD'、datetime 等格式轉為 datetime.date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if text.isdigit() and len(text) == 8:
+        return datetime.strptime(text, "%Y%m%d").date()
+    return pd.Timestamp(text).date()
+
+
+def store_dir_for(base_path):
+    """由單一 ETF 的資料目錄 (data/<ETF>) 推得資料集根目錄 (data/store)"""
+    return Path(base_path).parent / "store"
+
+
+def partition_dir(kind, etf_code, year, month, store_dir=STORE_DIR):
+    return Path(store_dir) / kind / f"etf={etf_code}" / f"year={year}" / f"month={month}"
+
+
+def _write_atomic(table, path):
+    """先寫入暫存檔再改名，讀取端不會看到寫到一半的檔案"""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression=COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def _sort_keys(table):
+    """合併檔排序鍵: 有股票代號欄位時為 (代號, 日期)，否則為日期"""
+    keys = [(DATE_COLUMN, "ascending")]
+    for column in CODE_COLUMNS:
+        if column in table.column_names:
+            keys.insert(0, (column, "ascending"))
+            break
+    return keys
+
+
+def sort_table(table, keys):
+    """依 keys 排序；dictionary 欄位 (股票代號等) 以字串值排序"""
+    columns = {}
+    for name, _ in keys:
+        column = table[name]
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        columns[name] = column
+    return table.take(pc.sort_indices(pa.table(columns), sort_keys=keys))
+
+
+def _snapshot_table(df, data_date):
+    """
+    DataFrame (或 Arrow Table) 轉為寫入用的 Table，並將日期欄統一為 date32
+    etf 欄位由分區目錄提供，不寫入檔案；pandas 的 schema metadata 記錄的是轉換前的欄位型別
+    (例如日期為字串)，留著會讓讀取端 to_pandas() 依舊型別還原，因此移除
+    """
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(None)
+    if "etf" in table.column_names:
+        table = table.drop_columns(["etf"])
+    dates = pa.array([data_date] * len(table), type=pa.date32())
+    if DATE_COLUMN in table.column_names:
+        return table.set_column(table.column_names.index(DATE_COLUMN), DATE_COLUMN, dates)
+    return table.add_column(0, DATE_COLUMN, dates)
+
+
+def _remove_date_from_compacted(directory, data_date):
+    """重新寫入某日資料時，先從已合併檔案中移除該日，回傳合併檔中是否有該日"""
+    compacted = directory / COMPACTED_FILE
+    if not compacted.exists():
+        return False
+    table = pq.read_table(compacted)
+    mask = pc.not_equal(table[DATE_COLUMN], pa.scalar(data_date, type=pa.date32()))
+    if pc.all(mask).as_py():
+        return False
+    _write_atomic(table.filter(mask), compacted)
+    return True
+
+
+def take_rewritten_dates(etf_code):
+    """取出並清除 append_snapshot 覆寫過的該 ETF 日期 (持股與投資組合合併)，回傳排序後的 date 列表"""
+    with _rewritten_lock:
+        return sorted(_rewritten_dates.pop(etf_code, ()))
+
+
+def append_snapshot(df, etf_code, data_date, kind="holding", store_dir=STORE_DIR):
+    """
+    寫入單日快照
+
+    參數:
+    df: 當日持股或投資組合 DataFrame 或 pyarrow.Table (持股請先以 holdings_schema 轉為統一格式)
+    etf_code: ETF 代碼
+    data_date: 資料日期 (YYYYMMDD 字串或 date)
+    kind: "holding" 或 "portfolio"
+    store_dir: 資料集根目錄
+
+    回傳:
+    寫入的檔案路徑；同一日重複寫入會覆蓋先前的資料，並記錄該日 (見 take_rewritten_dates)
+    """
+    if kind not in KINDS:
+        raise ValueError(f"不支援的資料類型: {kind}")
+
+    data_date = to_date(data_date)
+    directory = partition_dir(kind, etf_code, data_date.year, data_date.month, store_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    path = directory / f"part-{data_date:%Y%m%d}.parquet"
+    rewritten = _remove_date_from_compacted(directory, data_date) or path.exists()
+    _write_atomic(_snapshot_table(df, data_date), path)
+    if rewritten:
+        with _rewritten_lock:
+            _rewritten_dates.setdefault(etf_code, set()).add(data_date)
+    return path
+
+
+def _merge_by_date(tables):
+    """合併多個 Table；tables 依優先順序由低到高排列，同一天的資料以較後面的為準"""
+    kept = []
+    seen = None
+    for table in reversed(tables):
+        if seen is not None:
+            table = table.filter(pc.invert(pc.is_in(table[DATE_COLUMN], value_set=seen)))
+        if not len(table):
+            continue
+        dates = pc.unique(table[DATE_COLUMN])
+        seen = dates if seen is None else pa.concat_arrays([seen, dates])
+        kept.append(table)
+    kept.reverse()
+    return pa.concat_tables(kept, promote_options="permissive") if kept else None
+
+
+def _rewrite_partition(directory, new_table=None):
+    """
+    將分區內的合併檔、part 檔與 new_table 合併為 compacted.parquet
+    同一天以 new_table 優先，其次為 part 檔，最後為舊的合併檔
+
+    回傳:
+    合併的 part 檔數量
+    """
+    parts = sorted(directory.glob("part-*.parquet"))
+    compacted = directory / COMPACTED_FILE
+    tables = [pq.read_table(compacted)] if compacted.exists() else []
+    tables += [pq.read_table(path) for path in parts]
+    if new_table is not None:
+        tables.append(new_table)
+
+    table = _merge_by_date(tables)
+    if table is not None:
+        # 舊版寫入的檔案可能帶有過時的 pandas metadata (見 _snapshot_table)，合併時一併移除
+        table = table.replace_schema_metadata(None)
+        _write_atomic(sort_table(table, _sort_keys(table)), compacted)
+    for path in parts:
+        path.unlink()
+    return len(parts)
+
+
+def compact_partition(directory, rewrite=False):
+    """
+    合併單一分區內的所有檔案為 compacted.parquet (依股票代號、日期排序)
+
+    參數:
+    rewrite: 沒有 part 檔時也重新排序寫入合併檔 (更新舊版排序或 row group 大小)
+
+    回傳:
+    合併的 part 檔數量 (rewrite 時沒有 part 檔仍回傳 1 表示已重寫)
+    """
+    directory = Path(directory)
+    if not any(directory.glob("part-*.parquet")):
+        if not (rewrite and (directory / COMPACTED_FILE).exists()):
+            return 0
+        _rewrite_partition(directory)
+        return 1
+    return _rewrite_partition(directory)
+
+
+def write_snapshots(table, etf_code, kind="holding", store_dir=STORE_DIR):
+    """
+    一次寫入多日資料，直接併入各月份分區的合併檔 (不產生每日 part 檔)
+
+    參數:
+    table: 含日期欄位的 pyarrow.Table 或 DataFrame (持股請先以 holdings_schema 轉為統一格式)
+    etf_code: ETF 代碼
+    kind: "holding" 或 "portfolio"
+
+    回傳:
+    {分區目錄: 寫入的日數}；已存在的日期會被覆蓋
+    """
+    if kind not in KINDS:
+        raise ValueError(f"不支援的資料類型: {kind}")
+
+    table = table if isinstance(table, pa.Table) else pa.Table.from_pandas(table, preserve_index=False)
+    table = table.replace_schema_metadata(None)
+    if "etf" in table.column_names:
+        table = table.drop_columns(["etf"])
+    dates = table[DATE_COLUMN]
+    if not pa.types.is_date32(dates.type):
+        dates = pa.array([to_date(value) for value in dates.to_pylist()], type=pa.date32())
+        table = table.set_column(table.column_names.index(DATE_COLUMN), DATE_COLUMN, dates)
+
+    months = pc.add(pc.multiply(pc.year(table[DATE_COLUMN]), 100), pc.month(table[DATE_COLUMN]))
+    results = {}
+    for key in pc.unique(months).to_pylist():
+        year, month = divmod(key, 100)
+        subset = table.filter(pc.equal(months, key))
+        directory = partition_dir(kind, etf_code, year, month, store_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        _rewrite_partition(directory, subset)
+        results[str(directory)] = len(pc.unique(subset[DATE_COLUMN]))
+    return results
+
+
+def stored_dates(etf_code, kind="holding", store_dir=STORE_DIR):
+    """資料集中已有的日期 (datetime.date 集合)"""
+    dataset = open_dataset(kind, [etf_code], store_dir)
+    if dataset is None:
+        return set()
+    return set(pc.unique(dataset.to_table(columns=[DATE_COLUMN])[DATE_COLUMN]).to_pylist())
+
+
+def compact(kind=None, etf_codes=None, store_dir=STORE_DIR, rewrite=False):
+    """
+    合併資料集中所有 (或指定 ETF 的) 分區
+
+    參數:
+    rewrite: 已合併的分區也重新排序寫入 (見 compact_partition)
+
+    回傳:
+    {分區目錄: 合併的 part 檔數量}
+    """
+    results = {}
+    for current_kind in ([kind] if kind else KINDS):
+        root = Path(store_dir) / current_kind
+        if not root.exists():
+            continue
+        for directory in sorted(root.glob("etf=*/year=*/month=*")):
+            etf_code = directory.parent.parent.name.split("=", 1)[1]
+            if etf_codes and etf_code not in etf_codes:
+                continue
+            merged = compact_partition(directory, rewrite)
+            if merged:
+                results[str(directory)] = merged
+    return results
+
+
+def _date_filter(start, end):
+    """日期範圍同時轉換為分區 (year/month) 條件與資料列條件"""
+    expression = None
+
+    def combine(left, right):
+        return right if left is None else left & right
+
+    if start is not None:
+        start = to_date(start)
+        expression = combine(expression, (ds.field("year") > start.year) |
+                             ((ds.field("year") == start.year) & (ds.field("month") >= start.month)))
+        expression = combine(expression, ds.field(DATE_COLUMN) >= pa.scalar(start, type=pa.date32()))
+    if end is not None:
+        end = to_date(end)
+        expression = combine(expression, (ds.field("year") < end.year) |
+                             ((ds.field("year") == end.year) & (ds.field("month") <= end.month)))
+        expression = combine(expression, ds.field(DATE_COLUMN) <= pa.scalar(end, type=pa.date32()))
+    return expression
+
+
+def open_dataset(kind="holding", etf_codes=None, store_dir=STORE_DIR):
+    """
+    開啟資料集 (pyarrow.dataset.Dataset)，只掃描指定 ETF 的分區目錄
+    各 ETF 欄位不同時會合併為統一的 schema
+    """
+    root = Path(store_dir) / kind
+    if etf_codes:
+        paths = [str(root / f"etf={code}") for code in etf_codes if (root / f"etf={code}").exists()]
+    else:
+        paths = [str(root)] if root.exists() else []
+    if not paths:
+        return None
+
+    files = []
+    for path in paths:
+        files.extend(str(p) for p in Path(path).rglob("*.parquet"))
+    if not files:
+        return None
+
+    dataset = ds.dataset(files, format="parquet", partitioning=PARTITIONING,
+                         partition_base_dir=str(root))
+    schema = pa.unify_schemas(
+        [fragment.physical_schema for fragment in dataset.get_fragments()] + [PARTITIONING.schema],
+        promote_options="permissive",
+    ).remove_metadata()
+    return ds.dataset(files, schema=schema, format="parquet", partitioning=PARTITIONING,
+                      partition_base_dir=str(root))
+
+
+def read_dataset(kind="holding", etf_codes=None, start=None, end=None, columns=None, filter=None,
+                 store_dir=STORE_DIR):
+    """
+    讀取資料集
+
+    參數:
+    kind: "holding" 或 "portfolio"
+    etf_codes: ETF 代碼列表，None 表示全部
+    start, end: 日期範圍 (含)，None 表示不限
+    columns: 要讀取的欄位，None 表示全部
+    filter: 額外的 pyarrow.dataset 條件運算式
+
+    回傳:
+    pyarrow.Table (含 etf、year、month 分區欄位)
+    """
+    dataset = open_dataset(kind, etf_codes, store_dir)
+    if dataset is None:
+        return pa.table({})
+
+    expression = _date_filter(start, end)
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def import_legacy_files(etf_code, base_dir=DATA_DIR, store_dir=STORE_DIR):
+    """
+    將舊的每日檔案 (data/<ETF>/holding|portfolio/<YYYYMMDD>.parquet) 匯入資料集並合併
+
+    回傳:
+    匯入的檔案數量
+    """
+    count = 0
+    for kind in KINDS:
+        for path in sorted((Path(base_dir) / etf_code / kind).glob("*.parquet")):
+            if not (path.stem.isdigit() and len(path.stem) == 8):
+                continue
+            append_snapshot(pd.read_parquet(path), etf_code, path.stem, kind, store_dir)
+            count += 1
+    compact(etf_codes=[etf_code], store_dir=store_dir)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="持股資料集管理")
+    parser.add_argument("--store-dir", default=str(STORE_DIR), help="資料集根目錄")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact_parser = subparsers.add_parser("compact", help="合併小檔案")
+    compact_parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    compact_parser.add_argument("--rewrite", action="store_true", help="已合併的分區也重新排序寫入")
+
+    import_parser = subparsers.add_parser("import", help="匯入舊的每日檔案")
+    import_parser.add_argument("etf_codes", nargs="+", help="ETF 代碼")
+    import_parser.add_argument("--base-dir", default=str(DATA_DIR), help="舊資料目錄")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        results = compact(etf_codes=args.etf_codes or None, store_dir=args.store_dir, rewrite=args.rewrite)
+        for directory, merged in results.items():
+            print(f"✓ {directory}: 合併 {merged} 個檔案")
+        print(f"共處理 {len(results)} 個分區")
+    else:
+        for etf_code in args.etf_codes:
+            count = import_legacy_files(etf_code, args.base_dir, args.store_dir)
+            print(f"✓ {etf_code}: 匯入 {count} 個檔案")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+不經瀏覽器的 HTTP 直接抓取
+使用共用、保持連線 (keep-alive) 的 requests.Session 直接呼叫投信的 JSON / 檔案端點
+
+測試時可設定環境變數 ETF_SNIPER_HTTP_BASE (例如 http://127.0.0.1:8765)，
+所有網址會被導向本機的替身伺服器 (見 benchmarks/fixture_server.py)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json, text/html, */*',
+}
+DEFAULT_TIMEOUT = 15
+POOL_SIZE = 16
+
+BASE_URL_ENV = "ETF_SNIPER_HTTP_BASE"
+
+# 條件式請求的結果: not_modified 為 True 時 content / file_path 皆為 None
+FetchResult = namedtuple("FetchResult", ["not_modified", "content", "file_path", "headers"])
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """取得全程式共用的 requests.Session (連線池 + 自動重試)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                retry = Retry(total=2, backoff_factor=0.3,
+                              status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=("GET", "HEAD", "POST"))
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE,
+                                      max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def close_session():
+    """關閉共用的 Session"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+class HostRateLimiter:
+    """
+    依主機限制請求頻率 (多執行緒共用)，避免平行抓取時對同一投信網站送出過多請求
+
+    參數:
+    rate: 每台主機每秒最多幾個請求
+    """
+
+    def __init__(self, rate=2.0):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.interval = 1.0 / rate
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """等到可以對 url 的主機送出下一個請求，回傳等待的秒數"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+def resolve_url(url, base_url=None):
+    """
+    將網址導向替身伺服器
+
+    https://www.example.com/a/b 會變成 <base_url>/www.example.com/a/b，
+    base_url 未指定時使用環境變數 ETF_SNIPER_HTTP_BASE，都沒有則不變更
+    """
+    base_url = base_url or os.environ.get(BASE_URL_ENV)
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    resolved = f"{base_url.rstrip('/')}/{parts.netloc}{parts.path}"
+    if parts.query:
+        resolved += f"?{parts.query}"
+    return resolved
+
+
+def request(method, url, params=None, data=None, json=None, headers=None, timeout=DEFAULT_TIMEOUT,
+            base_url=None, stream=False):
+    """送出請求並檢查 HTTP 狀態碼，回傳 requests.Response"""
+    response = get_session().request(
+        method, resolve_url(url, base_url), params=params, data=data, json=json,
+        headers=headers, timeout=timeout, stream=stream
+    )
+    response.raise_for_status()
+    return response
+
+
+def fetch_json(url, method="GET", params=None, data=None, headers=None, timeout=DEFAULT_TIMEOUT,
+               base_url=None):
+    """呼叫 JSON API 並回傳解析後的資料"""
+    headers = {'Accept': 'application/json', **(headers or {})}
+    response = request(method, url, params=params, json=data, headers=headers,
+                       timeout=timeout, base_url=base_url)
+    return response.json()
+
+
+def _filename_from_response(response, url):
+    disposition = response.headers.get('Content-Disposition', '')
+    match = re.search(r"filename\*=(?:UTF-8'')?([^;]+)", disposition, re.IGNORECASE)
+    if not match:
+        match = re.search(r'filename="?([^";]+)"?', disposition, re.IGNORECASE)
+    if match:
+        return os.path.basename(unquote(match.group(1).strip()))
+    return os.path.basename(urlsplit(url).path) or "download"
+
+
+def fetch_file(url, download_path, filename=None, method="GET", params=None, data=None, headers=None,
+               timeout=DEFAULT_TIMEOUT, base_url=None):
+    """
+    下載檔案到指定目錄 (先寫入 .part 暫存檔，完成後才改名)
+
+    回傳:
+    下載完成的檔案完整路徑
+    """
+    with request(method, url, params=params, json=data, headers=headers, timeout=timeout,
+                 base_url=base_url, stream=True) as response:
+        return _save_response(response, url, download_path, filename)
+
+
+def _save_response(response, url, download_path, filename=None):
+    os.makedirs(download_path, exist_ok=True)
+    filename = filename or _filename_from_response(response, url)
+    file_path = os.path.join(download_path, filename)
+    partial_path = file_path + ".part"
+    with open(partial_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            f.write(chunk)
+    os.replace(partial_path, file_path)
+    return file_path
+
+
+def fetch_conditional(url, method="GET", params=None, data=None, headers=None, validators=None,
+                      download_path=None, filename=None, timeout=DEFAULT_TIMEOUT, base_url=None):
+    """
+    條件式請求: 帶上 If-None-Match / If-Modified-Since，伺服器回應 304 時不下載內容
+
+    參數:
+    validators: 條件式請求標頭 (見 fetch_state.FetchState.conditional_headers)
+    download_path: 指定時將內容寫入此目錄 (回傳 file_path)，否則回傳 bytes (content)
+
+    回傳:
+    FetchResult
+    """
+    headers = {**(headers or {}), **(validators or {})}
+    with request(method, url, params=params, json=data, headers=headers, timeout=timeout,
+                 base_url=base_url, stream=True) as response:
+        if response.status_code == 304:
+            return FetchResult(True, None, None, response.headers)
+        if download_path is not None:
+            return FetchResult(False, None, _save_response(response, url, download_path, filename),
+                               response.headers)
+        return FetchResult(False, response.content, None, response.headers)
@@ -0,0 +1,304 @@
+"""
+各階段耗時與資源使用紀錄
+每個 ETF 的一次執行 (EtfRun) 記錄各階段 (啟動瀏覽器、載入頁面、等待下載、解析、前處理、寫檔) 的:
+- wall_s: 經過時間
+- cpu_s: 本執行緒的 CPU 時間 (Chrome 在另外的行程，不含在內)
+- peak_rss_mb: 本行程加上已登記的瀏覽器 (chromedriver 與 Chrome 子行程) 的常駐記憶體高峰
+- read_bytes / write_bytes: 本行程的讀寫位元組數
+
+執行結束時寫入一行 JSON 到 logs/metrics/<YYYYMMDD>.jsonl，方便追蹤延遲趨勢與找出較慢的投信
+記憶體與讀寫量為整個行程的數值，多個 ETF 在同一行程平行執行時會互相包含
+
+使用方式:
+    with EtfRun("00991A") as run:
+        with stage("parse"):
+            ...
+    # 深層函式不需傳遞 run，stage() 會使用目前執行緒的 EtfRun，沒有時不做任何事
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+METRICS_DIR = BASE_DIR / "logs" / "metrics"
+
+SAMPLE_INTERVAL = 0.05
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _psutil():
+    try:
+        import psutil
+        return psutil
+    except ImportError:
+        return None
+
+
+def _io_bytes(process):
+    """回傳 (讀取, 寫入) 位元組數，無法取得時回傳 (None, None)"""
+    if process is None:
+        return None, None
+    try:
+        counters = process.io_counters()
+    except Exception:
+        return None, None
+    # Linux 的 read_chars / write_chars 包含經過頁面快取的讀寫
+    return (getattr(counters, 'read_chars', counters.read_bytes),
+            getattr(counters, 'write_chars', counters.write_bytes))
+
+
+class _StageRecord:
+    def __init__(self, name):
+        self.name = name
+        self.peak_rss = 0
+        self.data = {}
+
+
+class EtfRun:
+    """單一 ETF 一次執行的紀錄 (可作為 context manager，或呼叫 start / finish)"""
+
+    def __init__(self, etf_code, metrics_dir=METRICS_DIR, **fields):
+        self.etf_code = etf_code
+        self.metrics_dir = Path(metrics_dir)
+        self.fields = dict(fields)
+        self.stages = []
+        self.status = None
+        self.error = None
+        psutil = _psutil()
+        self._process = psutil.Process() if psutil else None
+        self._driver_pids = set()
+        self._active = []
+        self._peak_rss = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # === 開始 / 結束 ===
+
+    def start(self):
+        self._started_at = datetime.now()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._io = _io_bytes(self._process)
+        _local.run = self
+        if self._process is not None:
+            self._sample()
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True,
+                                             name=f"metrics-{self.etf_code}")
+            self._sampler.start()
+        return self
+
+    def finish(self, status=None, error=None):
+        """停止取樣並寫出紀錄，回傳紀錄 dict"""
+        if status is not None:
+            self.status = status
+        if error is not None:
+            self.error = error
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if getattr(_local, 'run', None) is self:
+            _local.run = None
+
+        read, written = self._io_delta(self._io)
+        record = {
+            'etf': self.etf_code,
+            'started_at': self._started_at.isoformat(timespec='seconds'),
+            'status': self.status or 'ok',
+            'error': self.error,
+            'wall_s': round(time.perf_counter() - self._wall, 4),
+            'cpu_s': round(time.thread_time() - self._cpu, 4),
+            'peak_rss_mb': self._mb(self._peak_rss),
+            'read_bytes': read,
+            'write_bytes': written,
+            'pid': os.getpid(),
+            **self.fields,
+            'stages': [stage.data for stage in self.stages],
+        }
+        self._write(record)
+        return record
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.status is None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.finish()
+        return False
+
+    # === 階段 ===
+
+    @contextmanager
+    def stage(self, name):
+        """記錄一個階段；階段可巢狀，外層階段包含內層的時間"""
+        record = _StageRecord(name)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        io = _io_bytes(self._process)
+        with self._lock:
+            self._active.append(record)
+        self._sample()
+        try:
+            yield record.data
+        finally:
+            self._sample()
+            with self._lock:
+                self._active.remove(record)
+            read, written = self._io_delta(io)
+            record.data.update({
+                'name': name,
+                'wall_s': round(time.perf_counter() - wall, 4),
+                'cpu_s': round(time.thread_time() - cpu, 4),
+                'peak_rss_mb': self._mb(record.peak_rss),
+                'read_bytes': read,
+                'write_bytes': written,
+            })
+            self.stages.append(record)
+
+    def attach_driver(self, driver):
+        """登記瀏覽器，記憶體高峰會包含 chromedriver 與其 Chrome 子行程"""
+        try:
+            self._driver_pids.add(driver.service.process.pid)
+        except AttributeError:
+            pass
+
+    def set(self, **fields):
+        """加入額外欄位 (例如 data_date、adapter)"""
+        self.fields.update(fields)
+
+    # === 取樣 ===
+
+    def _rss(self):
+        psutil = _psutil()
+        total = 0
+        try:
+            total += self._process.memory_info().rss
+        except Exception:
+            return 0
+        for pid in list(self._driver_pids):
+            try:
+                root = psutil.Process(pid)
+                for process in [root] + root.children(recursive=True):
+                    try:
+                        total += process.memory_info().rss
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        continue
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._driver_pids.discard(pid)
+        return total
+
+    def _sample(self):
+        if self._process is None:
+            return
+        rss = self._rss()
+        with self._lock:
+            self._peak_rss = max(self._peak_rss, rss)
+            for record in self._active:
+                record.peak_rss = max(record.peak_rss, rss)
+
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self._sample()
+
+    def _io_delta(self, before):
+        after = _io_bytes(self._process)
+        if before[0] is None or after[0] is None:
+            return None, None
+        return after[0] - before[0], after[1] - before[1]
+
+    @staticmethod
+    def _mb(value):
+        return round(value / (1024 * 1024), 1) if value else None
+
+    # === 輸出 ===
+
+    def _write(self, record):
+        append_record(record, self.metrics_dir / f"{datetime.now():%Y%m%d}.jsonl")
+
+
+def current_run():
+    """目前執行緒的 EtfRun，沒有時回傳 None"""
+    return getattr(_local, 'run', None)
+
+
+def stage(name):
+    """在目前執行緒的 EtfRun 中記錄一個階段，沒有 EtfRun 時不做任何事"""
+    run = current_run()
+    return run.stage(name) if run is not None else nullcontext({})
+
+
+def attach_driver(driver):
+    """將瀏覽器登記到目前執行緒的 EtfRun"""
+    run = current_run()
+    if run is not None:
+        run.attach_driver(driver)
+
+
+def append_record(record, path):
+    """附加一行 JSON 紀錄"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False)
+    with _write_lock:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+def read_records(path):
+    """讀取 JSON lines 紀錄檔"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records):
+    """
+    彙整紀錄為每個 ETF 各階段的耗時表
+
+    回傳:
+    DataFrame，索引為 ETF，欄位為各階段 wall_s 總和 (同一 ETF 多次執行取平均) 與整體 wall_s / peak_rss_mb
+    """
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        row = {'etf': record['etf'], 'wall_s': record.get('wall_s'), 'peak_rss_mb': record.get('peak_rss_mb')}
+        for data in record.get('stages', []):
+            row[data['name']] = row.get(data['name'], 0.0) + (data.get('wall_s') or 0.0)
+        rows.append(row)
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).groupby('etf').mean().sort_values('wall_s', ascending=False)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="彙整各 ETF 各階段耗時與資源使用")
+    parser.add_argument("date", nargs="?", default=datetime.now().strftime("%Y%m%d"), help="紀錄日期 (YYYYMMDD，預設今天)")
+    parser.add_argument("--metrics-dir", default=str(METRICS_DIR), help="紀錄目錄")
+    args = parser.parse_args(argv)
+
+    path = Path(args.metrics_dir) / f"{args.date}.jsonl"
+    records = read_records(path)
+    if not records:
+        print(f"⚠ 沒有紀錄: {path}")
+        return 1
+    print(f"✓ {path} 共 {len(records)} 筆紀錄")
+    print(summarize(records).round(3).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,426 @@
+"""
+ETF 穿透曝險計算
+依持有的 ETF 單位數，計算每天對各成分股的有效股數與曝險金額:
+    每單位股數[ETF, 日, 股票] = 股數 / 流通在外單位數
+    每單位市值[ETF, 日, 股票] = 持股權重 × 每單位淨值
+    曝險[日, 股票] = Σ_ETF 持有單位數[ETF, 日] × 每單位股數 (或市值)
+
+所有 ETF、所有日期的持股存成稀疏矩陣 (列為 (ETF, 日期)，欄為股票代號)，
+曝險為「持有單位數矩陣 (日期 × 列)」與持股矩陣的稀疏矩陣乘積
+
+矩陣快取於 data/cache/lookthrough/，每次只讀取資料集中比快取新的日期並附加在最後
+(補寫或修正過去日期時以 --rebuild 重建)
+
+持有部位 (config/positions.csv):
+    etf,日期,單位數
+    00981A,2025-06-02,50000
+    00991A,2025-09-15,20000
+每列為自該日起的持有單位數，直到同一 ETF 的下一列為止
+
+使用方式:
+    python lookthrough.py                       # 最新一日曝險前 20 名
+    python lookthrough.py --position 00981A=50000 00991A=20000 --start 2025-12-01 --output exposure.parquet
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import scipy.sparse as sp
+
+from fund_flows import fund_units_nav
+from holdings_store import STORE_DIR, read_dataset, to_date
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = DATA_DIR / "cache" / "lookthrough"
+POSITIONS_FILE = BASE_DIR / "config" / "positions.csv"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+# 持股日期沒有投資組合資料時，往前尋找單位數 / 淨值的天數 (增量更新時)
+PORTFOLIO_LOOKBACK_DAYS = 31
+
+ROW_COLUMNS = ['etf', '日期', '流通在外單位數', '每單位淨值']
+EXPOSURE_COLUMNS = ['日期', '股票代號', '股票名稱', '有效股數', '曝險金額', '曝險權重']
+
+_STOCK_BITS = 32
+
+
+class LookThrough:
+    """
+    持股矩陣
+
+    rows: DataFrame，第 i 列為矩陣第 i 列的 (etf, 日期, 流通在外單位數, 每單位淨值)
+    stocks: DataFrame，第 j 列為矩陣第 j 欄的 (股票代號, 股票名稱)；新股票附加在最後，既有欄位順序不變
+    shares: CSR 矩陣，每單位股數
+    values: CSR 矩陣，每單位市值
+    """
+
+    def __init__(self, rows, stocks, shares, values):
+        self.rows = rows.reset_index(drop=True)
+        self.stocks = stocks.reset_index(drop=True)
+        self.shares = shares.tocsr()
+        self.values = values.tocsr()
+
+    @classmethod
+    def empty(cls):
+        rows = pd.DataFrame({'etf': pd.Series(dtype=str), '日期': pd.Series(dtype='datetime64[ns]'),
+                             '流通在外單位數': pd.Series(dtype=float), '每單位淨值': pd.Series(dtype=float)})
+        stocks = pd.DataFrame({'股票代號': pd.Series(dtype=str), '股票名稱': pd.Series(dtype=str)})
+        return cls(rows, stocks, sp.csr_matrix((0, 0)), sp.csr_matrix((0, 0)))
+
+    @classmethod
+    def build(cls, holdings, fund):
+        """
+        由持股資料與單位數 / 淨值建立矩陣
+
+        參數:
+        holdings: 持股資料 (DataFrame 或 pyarrow.Table，含 etf、日期、股票代號、股票名稱、股數、持股權重、金額)
+        fund: fund_units_nav 的結果；持股日期沒有投資組合資料時使用該 ETF 最近一個較早日期的資料
+
+        回傳:
+        (LookThrough, 缺少單位數而略過的 (etf, 日期) 數)
+        """
+        h = holdings.to_pandas() if isinstance(holdings, pa.Table) else holdings.copy()
+        if h.empty:
+            return cls.empty(), 0
+        h['etf'] = h['etf'].astype(str)
+        # 持股與投資組合的日期來源不同 (date32、字串、不同精度的 datetime64)，
+        # merge_asof 要求兩邊的型別完全相同，因此統一為 datetime64[ns]
+        h['日期'] = pd.to_datetime(h['日期']).astype('datetime64[ns]')
+        h['股票代號'] = h['股票代號'].astype(str)
+        fund = fund[ROW_COLUMNS].copy()
+        fund['etf'] = fund['etf'].astype(str)
+        fund['日期'] = pd.to_datetime(fund['日期']).astype('datetime64[ns]')
+
+        keys = h[['etf', '日期']].drop_duplicates().sort_values(['日期', 'etf'])
+        rows = pd.merge_asof(keys, fund.sort_values('日期'), on='日期', by='etf', direction='backward')
+        missing = int(rows['流通在外單位數'].isna().sum())
+        rows = rows.dropna(subset=['流通在外單位數']).reset_index(drop=True)
+        rows['row'] = np.arange(len(rows))
+
+        h = h.merge(rows, on=['etf', '日期'], how='inner')
+        codes, uniques = pd.factorize(h['股票代號'], sort=True)
+        # 股票名稱以最新日期為準
+        names = h.sort_values('日期').groupby('股票代號', sort=True)['股票名稱'].last().reindex(uniques)
+        stocks = pd.DataFrame({'股票代號': np.asarray(uniques, dtype=object),
+                               '股票名稱': names.astype(object).to_numpy()})
+
+        units = h['流通在外單位數'].to_numpy(float)
+        share_data = np.nan_to_num(h['股數'].to_numpy(float) / units)
+        value_data = (h['持股權重'].to_numpy(float) * h['每單位淨值'].to_numpy(float))
+        # 沒有權重時以 金額 / 單位數 推算
+        if '金額' in h.columns:
+            value_data = np.where(np.isnan(value_data), h['金額'].to_numpy(float) / units, value_data)
+        value_data = np.nan_to_num(value_data)
+
+        shape = (len(rows), len(stocks))
+        index = (h['row'].to_numpy(), codes)
+        shares = sp.csr_matrix((share_data, index), shape=shape)
+        values = sp.csr_matrix((value_data, index), shape=shape)
+        return cls(rows[ROW_COLUMNS], stocks, shares, values), missing
+
+    def append(self, other):
+        """附加新的列 (other 的股票依代號對應到既有欄位，新股票附加在最後)"""
+        if not len(other.rows):
+            return self
+        if not len(self.rows):
+            return other
+
+        position = pd.Series(np.arange(len(self.stocks)), index=self.stocks['股票代號'])
+        mapped = position.reindex(other.stocks['股票代號']).to_numpy(dtype=float, copy=True)
+        new = np.isnan(mapped)
+        mapped[new] = len(self.stocks) + np.arange(new.sum())
+        mapped = mapped.astype(np.int64)
+        stocks = pd.concat([self.stocks, other.stocks[new]], ignore_index=True)
+        # 既有股票的名稱以較新的資料為準
+        stocks.loc[mapped[~new], '股票名稱'] = other.stocks.loc[~new, '股票名稱'].to_numpy()
+
+        n_stocks = len(stocks)
+
+        def remap(matrix):
+            matrix = matrix.tocsr()
+            return sp.csr_matrix((matrix.data, mapped[matrix.indices], matrix.indptr),
+                                 shape=(matrix.shape[0], n_stocks))
+
+        def widen(matrix):
+            return sp.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_stocks))
+
+        return LookThrough(
+            pd.concat([self.rows, other.rows], ignore_index=True),
+            stocks,
+            sp.vstack([widen(self.shares), remap(other.shares)], format='csr'),
+            sp.vstack([widen(self.values), remap(other.values)], format='csr'),
+        )
+
+    def last_dates(self):
+        """每檔 ETF 已有的最新日期 {etf: Timestamp}"""
+        if not len(self.rows):
+            return {}
+        return self.rows.groupby('etf')['日期'].max().to_dict()
+
+    # === 計算 ===
+
+    def row_units(self, positions):
+        """每一列 (etf, 日期) 當天持有的單位數 (沒有部位為 0)"""
+        positions = normalize_positions(positions)
+        units = np.zeros(len(self.rows))
+        for etf_code, group in positions.groupby('etf'):
+            mask = (self.rows['etf'] == etf_code).to_numpy()
+            if not mask.any():
+                continue
+            dates = self.rows.loc[mask, '日期'].to_numpy('datetime64[ns]')
+            effective = group['日期'].to_numpy('datetime64[ns]')
+            held = group['單位數'].to_numpy(float)
+            slot = np.searchsorted(effective, dates, side='right') - 1
+            units[mask] = np.where(slot >= 0, held[np.maximum(slot, 0)], 0.0)
+        return units
+
+    def exposure(self, positions, start=None, end=None):
+        """
+        計算穿透曝險
+
+        參數:
+        positions: 持有部位 (dict {etf: 單位數} 或含 etf、日期、單位數 的 DataFrame，見 normalize_positions)
+        start, end: 日期範圍 (含)，None 表示不限
+
+        回傳:
+        DataFrame，欄位為 日期、股票代號、股票名稱、有效股數、曝險金額、
+        曝險權重 (曝險金額 / 當天持有 ETF 的總市值)；依日期排序
+        """
+        units = self.row_units(positions)
+        dates = self.rows['日期']
+        if start is not None:
+            units[(dates < pd.Timestamp(to_date(start))).to_numpy()] = 0.0
+        if end is not None:
+            units[(dates > pd.Timestamp(to_date(end))).to_numpy()] = 0.0
+
+        held = np.flatnonzero(units)
+        if not len(held):
+            return pd.DataFrame(columns=EXPOSURE_COLUMNS)
+        date_index, unique_dates = pd.factorize(dates.iloc[held], sort=True)
+
+        # 持有單位數矩陣: 日期 × 列
+        positions_matrix = sp.csr_matrix((units[held], (date_index, held)),
+                                         shape=(len(unique_dates), len(self.rows)))
+        shares = (positions_matrix @ self.shares).tocoo()
+        values = (positions_matrix @ self.values).tocoo()
+        book = positions_matrix @ self.rows['每單位淨值'].fillna(0).to_numpy(float)
+
+        # 兩個乘積的非零位置可能不同 (例如權重為 0)，以 (日期, 股票) 鍵合併
+        share_keys = (shares.row.astype(np.int64) << _STOCK_BITS) | shares.col
+        value_keys = (values.row.astype(np.int64) << _STOCK_BITS) | values.col
+        keys = np.concatenate([share_keys, value_keys])
+        keys.sort()
+        keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+        share_values = np.zeros(len(keys))
+        share_values[np.searchsorted(keys, share_keys)] = shares.data
+        value_values = np.zeros(len(keys))
+        value_values[np.searchsorted(keys, value_keys)] = values.data
+
+        date_pos = keys >> _STOCK_BITS
+        stock_pos = keys & ((1 << _STOCK_BITS) - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(book[date_pos] > 0, value_values / book[date_pos], np.nan)
+        # 股票代號與名稱以 Categorical 輸出，不需逐列建立字串
+        name_codes, names = pd.factorize(self.stocks['股票名稱'])
+        return pd.DataFrame({
+            '日期': np.asarray(unique_dates)[date_pos],
+            '股票代號': pd.Categorical.from_codes(stock_pos, categories=self.stocks['股票代號']),
+            '股票名稱': pd.Categorical.from_codes(name_codes[stock_pos], categories=names),
+            '有效股數': share_values,
+            '曝險金額': value_values,
+            '曝險權重': weight,
+        })
+
+    # === 快取 ===
+
+    def save(self, directory):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex
+        names = {
+            'rows': f"rows-{token}.parquet",
+            'stocks': f"stocks-{token}.parquet",
+            'shares': f"shares-{token}.npz",
+            'values': f"values-{token}.npz",
+        }
+        self.rows.to_parquet(directory / names['rows'], index=False)
+        self.stocks.to_parquet(directory / names['stocks'], index=False)
+        sp.save_npz(directory / names['shares'], self.shares, compressed=False)
+        sp.save_npz(directory / names['values'], self.values, compressed=False)
+
+        # manifest 最後改名，讀取端只會看到完整的一組檔案
+        manifest_path = directory / MANIFEST_FILE
+        old = _read_manifest(manifest_path)
+        tmp_path = manifest_path.with_suffix(f".{token}.tmp")
+        tmp_path.write_text(json.dumps({'version': MANIFEST_VERSION, 'files': names}), encoding='utf-8')
+        os.replace(tmp_path, manifest_path)
+        for name in (old or {}).get('files', {}).values():
+            try:
+                (directory / name).unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, directory):
+        """讀取快取，不存在或版本不符時回傳 None"""
+        directory = Path(directory)
+        manifest = _read_manifest(directory / MANIFEST_FILE)
+        if manifest is None:
+            return None
+        names = manifest['files']
+        try:
+            return cls(pd.read_parquet(directory / names['rows']),
+                       pd.read_parquet(directory / names['stocks']),
+                       sp.load_npz(directory / names['shares']),
+                       sp.load_npz(directory / names['values']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def _read_manifest(path):
+    try:
+        manifest = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def normalize_positions(positions):
+    """
+    持有部位轉為 DataFrame (etf、日期、單位數，依 etf、日期排序)
+
+    參數:
+    positions: dict {etf: 單位數} (所有日期相同)，或含 etf、日期、單位數 的 DataFrame
+    """
+    if isinstance(positions, dict):
+        return pd.DataFrame({'etf': list(positions), '日期': pd.Timestamp.min,
+                             '單位數': [float(units) for units in positions.values()]})
+    df = positions[['etf', '日期', '單位數']].copy()
+    df['etf'] = df['etf'].astype(str)
+    df['日期'] = pd.to_datetime(df['日期'])
+    df['單位數'] = pd.to_numeric(df['單位數'])
+    return df.sort_values(['etf', '日期'], ignore_index=True)
+
+
+def load_positions(path=POSITIONS_FILE):
+    """讀取持有部位 CSV (etf,日期,單位數)"""
+    return normalize_positions(pd.read_csv(path, dtype={'etf': str}))
+
+
+def update_lookthrough(etf_codes=None, store_dir=STORE_DIR, cache_dir=CACHE_DIR, rebuild=False):
+    """
+    同步矩陣快取: 只讀取資料集中各 ETF 比快取新的日期
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示資料集中全部
+    rebuild: 捨棄快取重新建立 (補寫或修正過去日期後使用)
+
+    回傳:
+    (LookThrough, 本次新增的列數)
+    """
+    cached = None if rebuild else LookThrough.load(cache_dir)
+    matrix = cached or LookThrough.empty()
+    if etf_codes is None:
+        root = Path(store_dir) / "holding"
+        etf_codes = sorted(p.name.split("=", 1)[1] for p in root.glob("etf=*")) if root.exists() else []
+
+    # 每檔 ETF 由快取的最新日期之後開始讀取 (各 ETF 的起點不同時分開讀取)
+    last = matrix.last_dates()
+    groups = {}
+    for etf_code in etf_codes:
+        since = last.get(etf_code)
+        groups.setdefault(since, []).append(etf_code)
+
+    added = 0
+    for since, codes in groups.items():
+        start = (since + pd.Timedelta(days=1)).date() if since is not None else None
+        holdings = read_dataset("holding", codes, start=start, store_dir=store_dir,
+                                columns=['etf', '日期', '股票代號', '股票名稱', '股數', '持股權重', '金額'])
+        if not holdings.num_rows:
+            continue
+        # 單位數可能沿用較早的投資組合資料，投資組合多讀取前一段期間
+        portfolio_start = start - timedelta(days=PORTFOLIO_LOOKBACK_DAYS) if start else None
+        portfolio = read_dataset("portfolio", codes, start=portfolio_start, store_dir=store_dir)
+        block, missing = LookThrough.build(holdings, fund_units_nav(portfolio))
+        if missing:
+            print(f"⚠ {', '.join(codes)} 有 {missing} 個日期找不到流通在外單位數，略過")
+        matrix = matrix.append(block)
+        added += len(block.rows)
+
+    if added or rebuild or cached is None:
+        matrix.save(cache_dir)
+    return matrix, added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算持有 ETF 的穿透曝險")
+    parser.add_argument("--position", nargs="+", metavar="ETF=單位數",
+                        help=f"持有部位 (預設讀取 {POSITIONS_FILE.relative_to(BASE_DIR)})")
+    parser.add_argument("--positions-file", default=str(POSITIONS_FILE), help="持有部位 CSV")
+    parser.add_argument("--start", help="開始日期 (預設只輸出最新一日)")
+    parser.add_argument("--end", help="結束日期 (含)")
+    parser.add_argument("--top", type=int, default=20, help="最新一日顯示的股票數")
+    parser.add_argument("--output", help="將完整結果寫入 .parquet 或 .csv 檔案")
+    parser.add_argument("--store-dir", default=str(STORE_DIR), help="資料集根目錄")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR), help="矩陣快取目錄")
+    parser.add_argument("--rebuild", action="store_true", help="重新建立矩陣快取")
+    args = parser.parse_args(argv)
+
+    if args.position:
+        try:
+            positions = {code: float(units) for code, units in (item.split("=", 1) for item in args.position)}
+        except ValueError:
+            parser.error("--position 格式為 ETF=單位數，例如 00981A=50000")
+    elif Path(args.positions_file).exists():
+        positions = load_positions(args.positions_file)
+    else:
+        print(f"✗ 找不到持有部位檔案 {args.positions_file}，請以 --position 指定")
+        return 1
+    etf_codes = sorted(set(normalize_positions(positions)['etf']))
+
+    started = time.perf_counter()
+    matrix, added = update_lookthrough(etf_codes, args.store_dir, args.cache_dir, args.rebuild)
+    loaded = time.perf_counter() - started
+    print(f"✓ 持股矩陣 {matrix.shares.shape[0]} 列 × {matrix.shares.shape[1]} 檔股票 "
+          f"(非零 {matrix.shares.nnz}，新增 {added} 列)，{loaded * 1000:.1f} ms")
+    if not len(matrix.rows):
+        print("⚠ 資料集中沒有持股資料")
+        return 1
+
+    started = time.perf_counter()
+    start = args.start or matrix.rows['日期'].max()
+    exposure = matrix.exposure(positions, start=start, end=args.end)
+    print(f"✓ 曝險計算 {len(exposure)} 筆，{(time.perf_counter() - started) * 1000:.1f} ms")
+    if exposure.empty:
+        print("⚠ 指定期間沒有持有任何 ETF")
+        return 0
+
+    latest_day = exposure['日期'].max()
+    latest = exposure[exposure['日期'] == latest_day]
+    print("=" * 60)
+    print(f"{pd.Timestamp(latest_day).date()} 曝險前 {args.top} 名 (總曝險 {latest['曝險金額'].sum():,.0f})")
+    print("=" * 60)
+    print(latest.nlargest(args.top, '曝險金額')[EXPOSURE_COLUMNS[1:]].to_string(index=False))
+
+    if args.output:
+        if args.output.lower().endswith(".parquet"):
+            exposure.to_parquet(args.output, index=False)
+        else:
+            exposure.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"✓ 已寫入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
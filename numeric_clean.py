@@ -0,0 +1,124 @@
+"""
+投信網頁 / 檔案數字字串的整欄清理
+以 Arrow compute 一次處理整個欄位，取代逐欄 astype(str).str.replace(...).astype(float)
+與逐值的 Python 解析 (只做字面取代與頭尾修剪，避免逐列執行 regex):
+- parse_numbers: 千分位數字 ("1,234,567"、" 12.5 ")
+- parse_amount: 前綴幣別的金額 ("TWD 1,234"、"NTD1,234")
+- parse_percent: 百分比 ("18.156%" 或百分比單位的數字 18.156)，轉為小數 0.18156
+
+無法解析的值 (空字串、"-"、文字) 一律回傳 NaN，不會拋出例外
+輸入為 Series 時回傳相同索引的 float64 Series，其他 (list、ndarray、Arrow array) 回傳 ndarray
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# 清理後可直接轉為浮點數的格式
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+# 千分位分隔字元
+THOUSANDS_SEPARATOR = ','
+# 頭尾要修剪的空白 (含全形空白與 &nbsp;)
+WHITESPACE = ' \t\r\n\u3000\xa0'
+
+# 百分比欄位的單位
+PERCENT = 'percent'    # 數值為百分比 (18.156 表示 18.156%)
+FRACTION = 'fraction'  # 數值已是小數 (0.18156)
+UNITS = (PERCENT, FRACTION)
+
+
+def _to_arrow(values):
+    """轉為 Arrow array；Excel 讀出的欄位常混合數字與字串，此時逐值轉為字串"""
+    if isinstance(values, pa.ChunkedArray):
+        return values.combine_chunks()
+    if isinstance(values, pa.Array):
+        return values
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=object) if values.dtype == object else values.array
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if pd.isna(v) else str(v) for v in values], type=pa.string())
+
+
+def _wrap(values, result):
+    if isinstance(values, pd.Series):
+        return pd.Series(result, index=values.index, name=values.name, dtype=np.float64)
+    return result
+
+
+def _clean_strings(array, strip_chars):
+    """移除千分位逗號與頭尾的 strip_chars 後轉為 float64，不符合數字格式者為 null"""
+    text = pc.replace_substring(array.cast(pa.string()), THOUSANDS_SEPARATOR, '')
+    text = pc.utf8_trim(text, characters=WHITESPACE + strip_chars)
+    try:
+        return text.cast(pa.float64())
+    except pa.ArrowInvalid:
+        # 含有無法解析的值時才逐列檢查格式
+        valid = pc.match_substring_regex(text, NUMBER_PATTERN)
+        return pc.if_else(valid, text, pa.scalar(None, pa.string())).cast(pa.float64())
+
+
+def _parse(values, strip_chars=''):
+    array = _to_arrow(values)
+    if pa.types.is_null(array.type):
+        numbers = pa.nulls(len(array), pa.float64())
+    elif pa.types.is_integer(array.type) or pa.types.is_floating(array.type) or pa.types.is_decimal(array.type):
+        numbers = array.cast(pa.float64())
+    else:
+        numbers = _clean_strings(array, strip_chars)
+    return numbers.to_numpy(zero_copy_only=False)
+
+
+def parse_numbers(values):
+    """
+    解析千分位數字
+
+    參數:
+    values: 字串或數字欄位 (Series / list / ndarray / Arrow array)
+
+    回傳:
+    float64 (Series 或 ndarray，見模組說明)
+    """
+    return _wrap(values, _parse(values))
+
+
+def parse_amount(values, currency=('TWD', 'NTD', 'NT$', '$')):
+    """
+    解析前綴 (或後綴) 幣別的金額，例如 "TWD 1,234,567"
+
+    參數:
+    currency: 要移除的幣別字串 (自頭尾修剪這些字元，不影響中間的數字)
+    """
+    if isinstance(currency, str):
+        currency = (currency,)
+    return _wrap(values, _parse(values, ''.join(sorted(set(''.join(currency))))))
+
+
+def parse_percent(values, unit=PERCENT):
+    """
+    解析百分比並轉為小數
+
+    參數:
+    values: 百分比欄位；帶 % 符號的字串一律視為百分比
+    unit: 不帶 % 符號的數值單位 — PERCENT (18.156 → 0.18156) 或 FRACTION (0.18156 維持不變)
+          由欄位來源明確指定，不依資料大小猜測
+
+    回傳:
+    小數 (float64)
+    """
+    if unit not in UNITS:
+        raise ValueError(f"不支援的百分比單位: {unit} (可用: {', '.join(UNITS)})")
+
+    array = _to_arrow(values)
+    numbers = _parse(array, '%')
+    if unit == PERCENT:
+        return _wrap(values, numbers / 100)
+
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        has_sign = pc.fill_null(pc.match_substring(array, '%'), False).to_numpy(zero_copy_only=False)
+        numbers = np.where(has_sign, numbers / 100, numbers)
+    return _wrap(values, numbers)
+
@@ -0,0 +1,345 @@
+"""
+ETF 持股重疊與相似度
+每個日期建立 ETF × 股票 的權重稀疏矩陣 W (與持有矩陣 B，持有為 1)，以稀疏矩陣乘積一次計算所有 ETF 兩兩之間的:
+- 共同持股數: B Bᵀ
+- Jaccard: 共同持股數 / (兩檔持股數 - 共同持股數)
+- 重疊權重: W Bᵀ (ETF 在對方也持有的股票上的權重合計，兩個方向各一欄)
+- 餘弦相似度: W Wᵀ / (‖wᵢ‖ ‖wⱼ‖)
+以及每檔股票的共識度 (持有的 ETF 檔數、比例與平均權重)
+
+同一批的多個日期合併為一個矩陣: 列為 (日期, ETF)、欄為 (日期, 股票)，不同日期的欄不重疊，
+一次乘積只會產生同一日期的 ETF 配對；每批為一個月，只輸出有共同持股的配對
+
+結果依月份存放於 data/analytics/overlap/pairs/ 與 consensus/ (YYYYMM.parquet)，
+manifest 記錄每個日期計算時各 ETF 快照的內容指紋；每次更新只重新計算有新增、補寫或內容修正的日期
+
+使用方式:
+    python overlap.py                          # 更新並列出最新一日最相似的 ETF 與共識持股
+    python overlap.py --date 2025-12-31 --top 20
+"""
+
+import argparse
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import scipy.sparse as sp
+
+from holdings_store import DATE_COLUMN, STORE_DIR, open_dataset, read_dataset, to_date
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+OVERLAP_DIR = DATA_DIR / "analytics" / "overlap"
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 2
+TABLES = ("pairs", "consensus")
+# 影響計算結果的持股欄位 (快照內容指紋的範圍)
+SIGNATURE_COLUMNS = ["股票代號", "股票名稱", "持股權重"]
+
+PAIR_COLUMNS = [
+    '日期', 'etf', '比較etf', '共同持股數', '持股數', '比較持股數', 'Jaccard',
+    '重疊權重', '比較重疊權重', '餘弦相似度',
+]
+CONSENSUS_COLUMNS = ['日期', '股票代號', '股票名稱', '持有檔數', 'ETF檔數', '持有比例', '合計權重', '平均權重']
+
+_COLUMN_BITS = 32
+
+# 同一行程中多個 ETF 平行寫入時，避免同時讀寫結果檔
+_update_lock = threading.Lock()
+
+
+def _entries(matrix):
+    """稀疏矩陣的非零位置鍵 (列 << 32 | 欄，依列、欄排序) 與值"""
+    matrix = matrix.tocsr()
+    matrix.sort_indices()
+    rows = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr))
+    return (rows << _COLUMN_BITS) | matrix.indices, matrix.data
+
+
+def _pair_values(matrix, keys):
+    """稀疏矩陣在 keys 位置的值 (乘積中消去的位置為 0)"""
+    matrix_keys, data = _entries(matrix)
+    if not len(matrix_keys):
+        return np.zeros(len(keys))
+    position = np.minimum(np.searchsorted(matrix_keys, keys), len(matrix_keys) - 1)
+    return np.where(matrix_keys[position] == keys, data[position], 0.0)
+
+
+def compute_overlap(holdings):
+    """
+    計算持股重疊與共識度
+
+    參數:
+    holdings: 持股資料 (DataFrame 或 pyarrow.Table，含 etf、日期、股票代號、持股權重，選用 股票名稱)，
+              可包含多個日期
+
+    回傳:
+    (配對 DataFrame, 共識度 DataFrame)，欄位見 PAIR_COLUMNS / CONSENSUS_COLUMNS；
+    配對的 etf 依代碼排序在 比較etf 之前，沒有共同持股的配對不輸出
+    """
+    h = holdings.to_pandas() if isinstance(holdings, pa.Table) else holdings
+    h = h[h['股票代號'].notna()]
+    if h.empty:
+        return pd.DataFrame(columns=PAIR_COLUMNS), pd.DataFrame(columns=CONSENSUS_COLUMNS)
+
+    etf_id, etf_values = pd.factorize(h['etf'].astype(str), sort=True)
+    date_id, date_values = pd.factorize(pd.to_datetime(h['日期']), sort=True)
+    stock_id, stock_values = pd.factorize(h['股票代號'])
+    n_etfs, n_dates, n_stocks = len(etf_values), len(date_values), len(stock_values)
+
+    rows = date_id.astype(np.int64) * n_etfs + etf_id
+    columns = date_id.astype(np.int64) * n_stocks + stock_id
+    shape = (n_dates * n_etfs, n_dates * n_stocks)
+    weights = np.nan_to_num(pd.to_numeric(h['持股權重'], errors='coerce').to_numpy(np.float64))
+    # 同一快照中重複的股票: 權重加總、持有只計一次
+    held = sp.csr_matrix((np.ones(len(h)), (rows, columns)), shape=shape)
+    held.data[:] = 1.0
+    weight = sp.csr_matrix((weights, (rows, columns)), shape=shape)
+
+    counts = np.asarray(held.sum(axis=1)).ravel()
+    norms = np.sqrt(np.asarray(weight.multiply(weight).sum(axis=1)).ravel())
+
+    # === 配對 ===
+    # 各乘積的非零位置都包含在共同持股數的非零位置中；鍵依 (日期, etf, 比較etf) 排序
+    keys, shared = _entries(held @ held.T)
+    left, right = keys >> _COLUMN_BITS, keys & ((1 << _COLUMN_BITS) - 1)
+    upper = right > left
+    keys, shared, left, right = keys[upper], shared[upper], left[upper], right[upper]
+    reverse_keys = (right << _COLUMN_BITS) | left
+    overlap = weight @ held.T
+    dot = _pair_values(weight @ weight.T, keys)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosine = np.where(norms[left] * norms[right] > 0, dot / (norms[left] * norms[right]), np.nan)
+        jaccard = shared / (counts[left] + counts[right] - shared)
+
+    etf_categories = pd.Index(etf_values)
+    pairs = pd.DataFrame({
+        '日期': np.asarray(date_values)[left // n_etfs],
+        'etf': pd.Categorical.from_codes(left % n_etfs, categories=etf_categories),
+        '比較etf': pd.Categorical.from_codes(right % n_etfs, categories=etf_categories),
+        '共同持股數': shared.astype(np.int64),
+        '持股數': counts[left].astype(np.int64),
+        '比較持股數': counts[right].astype(np.int64),
+        'Jaccard': jaccard,
+        '重疊權重': _pair_values(overlap, keys),
+        '比較重疊權重': _pair_values(overlap, reverse_keys),
+        '餘弦相似度': cosine,
+    })
+
+    # === 共識度 ===
+    holders = np.asarray(held.sum(axis=0)).ravel()
+    total_weight = np.asarray(weight.sum(axis=0)).ravel()
+    present = np.flatnonzero(holders)
+    etfs_per_date = np.bincount(np.unique(rows) // n_etfs, minlength=n_dates)
+    consensus_date = present // n_stocks
+    consensus_stock = present % n_stocks
+
+    if '股票名稱' in h.columns:
+        # 股票名稱以最新日期為準
+        order = np.argsort(date_id, kind='stable')
+        last_name = pd.Series(h['股票名稱'].to_numpy()[order]).groupby(stock_id[order]).last()
+        name_codes, names = pd.factorize(last_name.reindex(range(n_stocks)))
+    else:
+        name_codes, names = np.full(n_stocks, -1), pd.Index([], dtype=object)
+
+    consensus = pd.DataFrame({
+        '日期': np.asarray(date_values)[consensus_date],
+        '股票代號': pd.Categorical.from_codes(consensus_stock, categories=pd.Index(stock_values).astype(str)),
+        '股票名稱': pd.Categorical.from_codes(name_codes[consensus_stock], categories=pd.Index(names).astype(str)),
+        '持有檔數': holders[present].astype(np.int64),
+        'ETF檔數': etfs_per_date[consensus_date],
+        '持有比例': holders[present] / etfs_per_date[consensus_date],
+        '合計權重': total_weight[present],
+        '平均權重': total_weight[present] / holders[present],
+    })
+    return pairs, consensus
+
+
+# === 結果與 manifest ===
+
+def _month_file(directory, table, month):
+    return Path(directory) / table / f"{month}.parquet"
+
+
+def _read_manifest(path):
+    try:
+        manifest = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def _write_atomic(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    df.to_parquet(tmp_path, index=False, engine='pyarrow')
+    os.replace(tmp_path, path)
+
+
+def snapshot_signatures(store_dir=STORE_DIR, etf_codes=None):
+    """
+    資料集中每個日期各 ETF 持股快照的內容指紋 {'YYYY-MM-DD': {etf: 指紋}}
+    指紋為每列 SIGNATURE_COLUMNS 雜湊值的總和 (mod 2^64)，與列順序、檔案合併無關，快照內容修正後即改變
+    """
+    table = read_dataset("holding", etf_codes, columns=[DATE_COLUMN, "etf"] + SIGNATURE_COLUMNS,
+                         store_dir=store_dir)
+    if not table.num_rows:
+        return {}
+    df = table.to_pandas()
+    rows = pd.DataFrame({
+        DATE_COLUMN: df[DATE_COLUMN],
+        'etf': df['etf'].astype(str),
+        'hash': pd.util.hash_pandas_object(df[SIGNATURE_COLUMNS], index=False).to_numpy(),
+    })
+    signatures = {}
+    for (day, etf_code), value in rows.groupby([DATE_COLUMN, 'etf'], sort=True)['hash'].sum().items():
+        signatures.setdefault(f"{to_date(day):%Y-%m-%d}", {})[etf_code] = f"{int(value):016x}"
+    return signatures
+
+
+def _load(directory, table, start=None, end=None, columns=None):
+    files = sorted((Path(directory) / table).glob("*.parquet"))
+    if start is not None:
+        start = to_date(start)
+        files = [f for f in files if f.stem >= f"{start:%Y%m}"]
+    if end is not None:
+        end = to_date(end)
+        files = [f for f in files if f.stem <= f"{end:%Y%m}"]
+    empty = pd.DataFrame(columns=PAIR_COLUMNS if table == "pairs" else CONSENSUS_COLUMNS)
+    if not files:
+        return empty
+    expression = None
+    if start is not None:
+        expression = ds.field(DATE_COLUMN) >= pa.scalar(pd.Timestamp(start), type=pa.timestamp('ms'))
+    if end is not None:
+        upper = ds.field(DATE_COLUMN) <= pa.scalar(pd.Timestamp(end), type=pa.timestamp('ms'))
+        expression = upper if expression is None else expression & upper
+    dataset = ds.dataset([str(f) for f in files], format="parquet")
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def load_pairs(start=None, end=None, directory=OVERLAP_DIR):
+    """讀取已計算的 ETF 配對 (日期範圍含兩端)"""
+    return _load(directory, "pairs", start, end)
+
+
+def load_consensus(start=None, end=None, directory=OVERLAP_DIR):
+    """讀取已計算的股票共識度 (日期範圍含兩端)"""
+    return _load(directory, "consensus", start, end)
+
+
+def update_overlap(store_dir=STORE_DIR, directory=OVERLAP_DIR, rebuild=False):
+    """
+    增量更新: 比對 manifest 與資料集中每個日期各 ETF 的快照內容指紋，只重新計算不同
+    (新增、補寫或修正快照) 的日期，並改寫這些日期所在月份的結果檔
+
+    參數:
+    rebuild: 捨棄既有結果重新計算全部日期
+
+    回傳:
+    重新計算的日期列表 ('YYYY-MM-DD')
+    """
+    directory = Path(directory)
+    with _update_lock:
+        manifest = None if rebuild else _read_manifest(directory / MANIFEST_FILE)
+        computed = (manifest or {}).get('dates', {})
+        current = snapshot_signatures(store_dir)
+        affected = sorted(day for day, signatures in current.items() if computed.get(day) != signatures)
+        removed = [day for day in computed if day not in current]
+        if not affected and not removed and manifest is not None:
+            return []
+
+        months = {}
+        for day in affected + removed:
+            months.setdefault(day[:7].replace('-', ''), []).append(day)
+        if rebuild:
+            for table in TABLES:
+                for path in (directory / table).glob("*.parquet"):
+                    if path.stem not in months:
+                        path.unlink()
+
+        dataset = open_dataset("holding", store_dir=store_dir)
+        for month, days in sorted(months.items()):
+            compute_days = [day for day in days if day in current]
+            if compute_days:
+                dates = pa.array([to_date(day) for day in compute_days], type=pa.date32())
+                expression = ((ds.field("year") == int(month[:4])) & (ds.field("month") == int(month[4:]))
+                              & ds.field(DATE_COLUMN).isin(dates))
+                holdings = dataset.to_table(columns=["etf", DATE_COLUMN, "股票代號", "股票名稱", "持股權重"],
+                                            filter=expression)
+                results = compute_overlap(holdings)
+            else:
+                results = (pd.DataFrame(columns=PAIR_COLUMNS), pd.DataFrame(columns=CONSENSUS_COLUMNS))
+
+            replaced = pd.to_datetime(pd.Index(days))
+            for table, result in zip(TABLES, results):
+                path = _month_file(directory, table, month)
+                if path.exists() and not rebuild:
+                    existing = pd.read_parquet(path)
+                    existing = existing[~existing[DATE_COLUMN].isin(replaced)]
+                    parts = [part for part in (existing, result) if len(part)]
+                    result = pd.concat(parts, ignore_index=True) if parts else result
+                    result = result.sort_values(DATE_COLUMN, kind='stable', ignore_index=True)
+                if len(result):
+                    _write_atomic(result, path)
+                elif path.exists():
+                    path.unlink()
+
+        # manifest 最後寫入: 中斷時下次會重新計算同樣的日期
+        manifest_path = directory / MANIFEST_FILE
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_path.with_name(f".{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps({'version': MANIFEST_VERSION, 'dates': current}, ensure_ascii=False),
+                            encoding='utf-8')
+        os.replace(tmp_path, manifest_path)
+        return affected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算 ETF 之間的持股重疊、相似度與共識持股")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--date", help="列出的日期 (預設最新一日)")
+    parser.add_argument("--top", type=int, default=10, help="列出的配對 / 股票數")
+    parser.add_argument("--rebuild", action="store_true", help="重新計算全部日期")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    directory = base_dir / "analytics" / OVERLAP_DIR.name
+    affected = update_overlap(store_dir=base_dir / "store", directory=directory, rebuild=args.rebuild)
+    print(f"✓ 重新計算 {len(affected)} 個日期")
+
+    manifest = _read_manifest(directory / MANIFEST_FILE) or {}
+    days = sorted(manifest.get('dates', {}))
+    if not days:
+        print("⚠ 沒有持股資料")
+        return
+    day = f"{to_date(args.date):%Y-%m-%d}" if args.date else days[-1]
+
+    pairs = load_pairs(day, day, directory)
+    consensus = load_consensus(day, day, directory)
+    print("=" * 60)
+    print(f"{day} 最相似的 ETF 配對 ({len(manifest['dates'].get(day, []))} 檔 ETF)")
+    print("=" * 60)
+    if pairs.empty:
+        print("⚠ 沒有共同持股的配對")
+    else:
+        print(pairs.nlargest(args.top, '餘弦相似度')[
+            ['etf', '比較etf', '共同持股數', 'Jaccard', '重疊權重', '比較重疊權重', '餘弦相似度']
+        ].to_string(index=False))
+    print("=" * 60)
+    print(f"{day} 共識持股")
+    print("=" * 60)
+    if not consensus.empty:
+        top = consensus.sort_values(['持有檔數', '合計權重'], ascending=False).head(args.top)
+        print(top[['股票代號', '股票名稱', '持有檔數', '持有比例', '平均權重']].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+ETF 每日投資組合指標 (每檔 ETF 每個資料日一列)
+- 持股數、持股權重合計、最大權重、前十大權重
+- HHI: Σ (權重 / 持股權重合計)²，有效持股數 = 1 / HHI
+- 周轉率: Σ |權重變化| / 2 (與前一個快照比較，見 holdings_changes)、新增 / 出清檔數
+- 淨資產、股票比例、現金比例: 投資組合資料的 股票 / 現金 ÷ 淨資產
+  (00981A 為欄位、00982A 為 項目 / 金額 列；沒有股票金額時以持股權重合計代替)
+
+結果存放於 data/analytics/portfolio_metrics.parquet，儀表板直接讀取此表，不需掃描歷史資料；
+每次寫入新資料後由 run_all_etfs / watcher / 各 ETF 腳本更新，每檔 ETF 只計算新增的日期
+指標定義變更時提高 METRICS_VERSION，下次更新會自動重建 (或以 --rebuild 手動重建)
+
+使用方式:
+    python portfolio_metrics.py                # 更新並列出各 ETF 最近 10 個資料日
+    python portfolio_metrics.py 00981A --days 30
+    python portfolio_metrics.py 00991A --rebuild
+"""
+
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analytics_table import stored_etf_codes, update_table
+from fund_flows import NET_ASSET_COLUMNS, first_available, wide_portfolio
+from holdings_changes import ACTION_EXIT, ACTION_NEW, compute_holding_changes
+from holdings_store import STORE_DIR, read_dataset, to_date
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+ANALYTICS_DIR = DATA_DIR / "analytics"
+METRICS_FILE = ANALYTICS_DIR / "portfolio_metrics.parquet"
+
+# 指標定義的版本，記錄在結果檔的 metadata；與程式不同時重建
+METRICS_VERSION = 1
+_VERSION_KEY = b"portfolio_metrics_version"
+
+TOP_N = 10
+
+# 投資組合資料中的 股票 / 現金 金額 (寬表格的欄位名稱，或 00982A 長表格 項目 欄的值)
+STOCK_COLUMNS = ('股票',)
+CASH_COLUMNS = ('現金',)
+
+METRIC_COLUMNS = [
+    'etf', '日期', '持股數', '持股權重合計', '最大權重', f'前{TOP_N}大權重', 'HHI', '有效持股數',
+    '周轉率', '新增檔數', '出清檔數', '淨資產', '股票比例', '現金比例',
+]
+
+# 同一行程中多個 ETF 平行寫入時，避免同時讀寫結果檔
+_update_lock = threading.Lock()
+
+
+def holding_metrics(holdings):
+    """
+    持股集中度指標 (一次計算所有 ETF、所有日期)
+
+    參數:
+    holdings: 持股資料 (DataFrame 或 pyarrow.Table，含 etf、日期、股票代號、持股權重)
+
+    回傳:
+    DataFrame，每個 (etf, 日期) 一列: 持股數、持股權重合計、最大權重、前 N 大權重、HHI、有效持股數
+    """
+    h = holdings.to_pandas() if isinstance(holdings, pa.Table) else holdings
+    h = h[h['股票代號'].notna()]
+    columns = ['etf', '日期', '持股數', '持股權重合計', '最大權重', f'前{TOP_N}大權重', 'HHI', '有效持股數']
+    if h.empty:
+        return pd.DataFrame(columns=columns)
+
+    etf_id, etf_values = pd.factorize(h['etf'].astype(str), sort=True)
+    date_id, date_values = pd.factorize(pd.to_datetime(h['日期']), sort=True)
+    weights = np.nan_to_num(pd.to_numeric(h['持股權重'], errors='coerce').to_numpy(np.float64))
+    snapshot_code = etf_id.astype(np.int64) * len(date_values) + date_id
+    snapshot, snapshot_codes = pd.factorize(snapshot_code, sort=True)
+
+    # 依 (快照, 權重由大到小) 排序，快照內的名次 = 位置 - 快照起點
+    order = np.lexsort((-weights, snapshot))
+    snapshot, weights = snapshot[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, snapshot[1:] != snapshot[:-1]])
+    rank = np.arange(len(snapshot)) - np.repeat(starts, np.diff(np.r_[starts, len(snapshot)]))
+
+    n = len(snapshot_codes)
+    total = np.bincount(snapshot, weights=weights, minlength=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = weights / total[snapshot]
+        hhi = np.where(total > 0, np.bincount(snapshot, weights=share * share, minlength=n), np.nan)
+        effective = 1.0 / hhi
+
+    snapshot_codes = np.asarray(snapshot_codes)
+    return pd.DataFrame({
+        'etf': np.asarray(etf_values)[snapshot_codes // len(date_values)],
+        '日期': np.asarray(date_values)[snapshot_codes % len(date_values)],
+        '持股數': np.bincount(snapshot, minlength=n),
+        '持股權重合計': total,
+        '最大權重': weights[starts],
+        f'前{TOP_N}大權重': np.bincount(snapshot, weights=np.where(rank < TOP_N, weights, 0.0), minlength=n),
+        'HHI': hhi,
+        '有效持股數': effective,
+    })
+
+
+def turnover_metrics(holdings, since=None):
+    """
+    周轉率與新增 / 出清檔數 (見 holdings_changes.compute_holding_changes)
+
+    回傳:
+    DataFrame，每個 (etf, 日期) 一列: 周轉率、新增檔數、出清檔數；每檔 ETF 的第一個快照不會出現
+    """
+    h = holdings.to_pandas() if isinstance(holdings, pa.Table) else holdings
+    changes = compute_holding_changes(h, since=since)
+    if changes.empty:
+        return pd.DataFrame(columns=['etf', '日期', '周轉率', '新增檔數', '出清檔數'])
+    grouped = pd.DataFrame({
+        'etf': changes['etf'].astype(str),
+        '日期': changes['日期'],
+        '周轉率': changes['權重變化'].abs() / 2,
+        '新增檔數': (changes['動作'] == ACTION_NEW).astype(np.int64),
+        '出清檔數': (changes['動作'] == ACTION_EXIT).astype(np.int64),
+    }).groupby(['etf', '日期'], as_index=False, sort=False).sum()
+    return grouped
+
+
+def portfolio_ratios(portfolio):
+    """
+    淨資產與股票 / 現金金額佔淨資產的比例
+
+    回傳:
+    DataFrame，每個 (etf, 日期) 一列: 淨資產、股票比例、現金比例 (沒有該金額時為 NaN)
+    """
+    df = wide_portfolio(portfolio)
+    if df.empty:
+        return pd.DataFrame(columns=['etf', '日期', '淨資產', '股票比例', '現金比例'])
+    net_assets = first_available(df, NET_ASSET_COLUMNS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        assets = net_assets.where(net_assets > 0)
+        ratios = pd.DataFrame({
+            'etf': df['etf'],
+            '日期': df['日期'],
+            '淨資產': net_assets,
+            '股票比例': first_available(df, STOCK_COLUMNS) / assets,
+            '現金比例': first_available(df, CASH_COLUMNS) / assets,
+        })
+    return ratios.groupby(['etf', '日期'], as_index=False).first()
+
+
+def compute_portfolio_metrics(holdings, portfolio=None, since=None):
+    """
+    計算每檔 ETF 每個資料日的投資組合指標
+
+    參數:
+    holdings: 持股資料 (增量更新時需包含 since 當天的快照，作為周轉率的前一日)
+    portfolio: 投資組合資料，None 表示不計算淨資產與股票 / 現金比例
+    since: {etf: 日期}，只輸出該日期之後的列，None 表示全部
+
+    回傳:
+    DataFrame，欄位為 METRIC_COLUMNS，依 etf、日期排序
+    """
+    metrics = holding_metrics(holdings)
+    if metrics.empty:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    metrics = metrics.merge(turnover_metrics(holdings, since), on=['etf', '日期'], how='left')
+    if portfolio is not None:
+        metrics = metrics.merge(portfolio_ratios(portfolio), on=['etf', '日期'], how='left')
+    metrics = metrics.reindex(columns=METRIC_COLUMNS)
+    # 投資組合資料沒有股票金額時，以持股權重合計代替
+    metrics['股票比例'] = metrics['股票比例'].fillna(metrics['持股權重合計'])
+
+    if since:
+        cutoff = pd.to_datetime(metrics['etf'].map(since))
+        metrics = metrics[cutoff.isna() | (metrics['日期'] > cutoff)]
+    return metrics.sort_values(['etf', '日期'], ignore_index=True)
+
+
+def load_portfolio_metrics(etf_codes=None, start=None, end=None, path=METRICS_FILE):
+    """讀取已計算的投資組合指標 (可依 ETF 與日期範圍篩選)，不存在時回傳空的 DataFrame"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+    metrics = pd.read_parquet(path)
+    if etf_codes:
+        metrics = metrics[metrics['etf'].isin([etf_codes] if isinstance(etf_codes, str) else etf_codes)]
+    if start is not None:
+        metrics = metrics[metrics['日期'] >= pd.Timestamp(to_date(start))]
+    if end is not None:
+        metrics = metrics[metrics['日期'] <= pd.Timestamp(to_date(end))]
+    return metrics.reset_index(drop=True)
+
+
+def metrics_version(path=METRICS_FILE):
+    """結果檔記錄的指標定義版本，檔案不存在或沒有記錄時為 None"""
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (FileNotFoundError, OSError):
+        return None
+    version = metadata.get(_VERSION_KEY)
+    return int(version) if version is not None else None
+
+
+def update_portfolio_metrics(etf_codes=None, store_dir=STORE_DIR, path=METRICS_FILE, rebuild=False,
+                             rewritten=None):
+    """
+    增量更新投資組合指標表: 每檔 ETF 只讀取上次更新的最後一日 (周轉率的前一日) 之後的資料
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示資料集中全部
+    rebuild: 重新計算 etf_codes 的全部日期 (其他 ETF 的列保留)；
+             結果檔的指標版本與 METRICS_VERSION 不同時，一律重建全部 ETF
+    rewritten: {ETF 代碼: 最早被覆寫的快照日期}，該 ETF 自這天起重新計算 (見 holdings_store.take_rewritten_dates)
+
+    回傳:
+    (完整指標表, 本次新增或重算的列)
+    """
+    if Path(path).exists() and metrics_version(path) != METRICS_VERSION:
+        # 定義已變更: 結果檔中的所有 ETF 都重新計算
+        recorded = pq.read_table(path, columns=['etf'])['etf'].to_pylist()
+        requested = stored_etf_codes("holding", store_dir) if etf_codes is None else etf_codes
+        requested = [requested] if isinstance(requested, str) else requested
+        etf_codes, rebuild = sorted(set(requested) | {str(code) for code in recorded}), True
+
+    def compute(since, codes, existing):
+        start = pd.Timestamp(since).date() if since is not None else None
+        holdings = read_dataset("holding", codes, start=start,
+                                columns=["etf", "日期", "股票代號", "股票名稱", "股數", "持股權重"],
+                                store_dir=store_dir)
+        if not holdings.num_rows:
+            return None
+        portfolio = read_dataset("portfolio", codes, start=start, store_dir=store_dir)
+        since_map = {code: since for code in codes} if since is not None else None
+        return compute_portfolio_metrics(holdings, portfolio if portfolio.num_rows else None, since_map)
+
+    return update_table(path, compute, lambda path: load_portfolio_metrics(path=path), METRIC_COLUMNS,
+                        ['etf', '日期'], _update_lock, etf_codes, "holding", store_dir, rebuild,
+                        metadata={_VERSION_KEY: str(METRICS_VERSION).encode()}, rewritten=rewritten)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="更新 ETF 每日投資組合指標表")
+    parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--days", type=int, default=10, help="每檔 ETF 列出的資料日數")
+    parser.add_argument("--rebuild", action="store_true", help="重新計算指定 ETF (預設全部) 的全部日期")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    metrics, new_rows = update_portfolio_metrics(args.etf_codes or None, store_dir=base_dir / "store",
+                                                 path=base_dir / "analytics" / METRICS_FILE.name,
+                                                 rebuild=args.rebuild)
+    print(f"✓ 更新 {len(new_rows)} 筆指標，共 {len(metrics)} 筆")
+
+    columns = ['日期', '持股數', f'前{TOP_N}大權重', 'HHI', '有效持股數', '周轉率', '股票比例', '現金比例']
+    for etf_code in args.etf_codes or sorted(metrics['etf'].unique()):
+        etf_metrics = metrics[metrics['etf'] == etf_code]
+        if etf_metrics.empty:
+            print(f"⚠ {etf_code} 沒有持股資料")
+            continue
+        print("=" * 60)
+        print(f"{etf_code} 最近 {args.days} 個資料日")
+        print("=" * 60)
+        print(etf_metrics.tail(args.days)[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
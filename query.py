@@ -0,0 +1,231 @@
+"""
+持股 / 投資組合資料集查詢
+依 ETF、日期範圍與股票代號篩選 data/store 的分區資料集，只讀取可能包含結果的檔案與 row group:
+- ETF、年、月: 由分區目錄 (etf=/year=/month=) 略過整個檔案
+- 日期、股票代號: 由各 row group 的欄位統計 (min / max) 略過 row group
+  (合併檔依股票代號排序，見 holdings_store.compact)
+- 只讀取需要的欄位，結果為 pyarrow.Table
+
+股票代號為 dictionary 欄位，pyarrow 不會以其統計略過 row group，因此由本模組自行比對統計值
+
+使用方式:
+    python query.py --stock 2330 --start 2025-01-01
+    python query.py --etf 00981A 00982A --start 20250601 --end 20251231 --columns 日期 股票代號 持股權重
+    python query.py --kind portfolio --etf 00981A --output portfolio.csv
+
+    from query import query, stock_history
+    table = query(etf_codes=["00981A"], stocks=["2330"]).table
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from holdings_store import CODE_COLUMNS, DATE_COLUMN, STORE_DIR, open_dataset, sort_table, to_date
+
+# table: 查詢結果；stats: 檔案 / row group 數量與各步驟耗時
+QueryResult = namedtuple("QueryResult", ["table", "stats"])
+
+
+def _code_column(schema):
+    return next((name for name in CODE_COLUMNS if name in schema.names), None)
+
+
+def _partition_filter(start, end):
+    """日期範圍轉換為分區 (year / month) 條件，只用於略過檔案"""
+    expression = None
+    if start is not None:
+        expression = (ds.field("year") > start.year) | \
+                     ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+    if end is not None:
+        upper = (ds.field("year") < end.year) | \
+                ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def _row_filter(start, end, code_column, stocks):
+    """資料列條件 (讀取 row group 後套用)"""
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field(DATE_COLUMN) >= pa.scalar(start, type=pa.date32()))
+    if end is not None:
+        conditions.append(ds.field(DATE_COLUMN) <= pa.scalar(end, type=pa.date32()))
+    if stocks:
+        conditions.append(ds.field(code_column).isin(stocks))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _row_group_matches(statistics, start, end, code_column, stocks):
+    """依 row group 的 min / max 判斷是否可能包含符合條件的資料 (沒有統計時視為可能)"""
+    dates = statistics.get(DATE_COLUMN)
+    if dates and dates.get('min') is not None:
+        if start is not None and dates['max'] < start:
+            return False
+        if end is not None and dates['min'] > end:
+            return False
+    if stocks:
+        codes = statistics.get(code_column)
+        if codes and codes.get('min') is not None:
+            if not any(codes['min'] <= stock <= codes['max'] for stock in stocks):
+                return False
+    return True
+
+
+def query(kind="holding", etf_codes=None, start=None, end=None, stocks=None, columns=None,
+          store_dir=STORE_DIR):
+    """
+    查詢資料集
+
+    參數:
+    kind: "holding" 或 "portfolio"
+    etf_codes: ETF 代碼列表，None 表示全部
+    start, end: 日期範圍 (含)，None 表示不限
+    stocks: 股票代號列表，None 表示全部 (只適用有股票代號欄位的資料)
+    columns: 要讀取的欄位，None 表示全部；etf 分區欄位一律包含
+
+    回傳:
+    QueryResult(table, stats)；stats 包含 files / files_read / row_groups / row_groups_read /
+    rows、plan_s (略過檔案與 row group 的時間) 與 read_s (讀取與篩選的時間)
+    """
+    start = to_date(start) if start is not None else None
+    end = to_date(end) if end is not None else None
+    stocks = sorted({str(stock).strip() for stock in stocks}) if stocks else None
+    stats = {'files': 0, 'files_read': 0, 'row_groups': 0, 'row_groups_read': 0,
+             'rows': 0, 'plan_s': 0.0, 'read_s': 0.0}
+
+    started = time.perf_counter()
+    dataset = open_dataset(kind, etf_codes, store_dir)
+    if dataset is None:
+        return QueryResult(pa.table({}), stats)
+
+    code_column = _code_column(dataset.schema)
+    if stocks and code_column is None:
+        raise ValueError(f"{kind} 資料沒有股票代號欄位，無法依股票代號查詢")
+    if columns:
+        missing = [name for name in columns if name not in dataset.schema.names]
+        if missing:
+            raise ValueError(f"資料集沒有欄位: {', '.join(missing)}")
+        columns = list(dict.fromkeys(["etf", *columns]))
+
+    stats['files'] = len(dataset.files)
+    fragments = []
+    for fragment in dataset.get_fragments(filter=_partition_filter(start, end)):
+        fragment.ensure_complete_metadata()
+        row_groups = fragment.row_groups
+        stats['row_groups'] += len(row_groups)
+        kept = [row_group.id for row_group in row_groups
+                if _row_group_matches(row_group.statistics, start, end, code_column, stocks)]
+        if kept:
+            fragments.append(fragment.subset(row_group_ids=kept))
+            stats['row_groups_read'] += len(kept)
+    stats['files_read'] = len(fragments)
+    stats['plan_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pruned = ds.FileSystemDataset(fragments, dataset.schema, dataset.format, dataset.filesystem)
+    table = pruned.to_table(columns=columns, filter=_row_filter(start, end, code_column, stocks))
+    stats['read_s'] = time.perf_counter() - started
+    stats['rows'] = table.num_rows
+    return QueryResult(table, stats)
+
+
+def stock_history(stock, etf_codes=None, start=None, end=None, store_dir=STORE_DIR):
+    """
+    單一股票在各 ETF 的每日持股與權重變化
+
+    回傳:
+    QueryResult；table 欄位為 etf、日期、股數、持股權重、權重變化 (與該 ETF 前一個持有日比較，
+    第一筆為 null)，依 etf、日期排序
+    """
+    result = query("holding", etf_codes, start, end, [stock], ["日期", "股數", "持股權重"], store_dir)
+    table = result.table
+    if not table.num_rows:
+        return result
+
+    table = sort_table(table, [("etf", "ascending"), (DATE_COLUMN, "ascending")])
+    etfs = table["etf"].combine_chunks()
+    weights = table["持股權重"].combine_chunks()
+    change = pc.pairwise_diff(weights)
+    # 每個 ETF 的第一筆沒有前一日可比較
+    same_etf = pa.concat_arrays([pa.array([False]),
+                                 pc.equal(etfs.slice(1), etfs.slice(0, len(etfs) - 1))])
+    change = pc.if_else(same_etf, change, pa.scalar(None, type=change.type))
+    table = table.select(["etf", DATE_COLUMN, "股數", "持股權重"]).append_column("權重變化", change)
+    return QueryResult(table, result.stats)
+
+
+def format_stats(stats):
+    return (f"檔案 {stats['files_read']}/{stats['files']}，row group {stats['row_groups_read']}/"
+            f"{stats['row_groups']}，{stats['rows']} 筆；規劃 {stats['plan_s'] * 1000:.1f} ms，"
+            f"讀取 {stats['read_s'] * 1000:.1f} ms")
+
+
+def write_output(table, path):
+    """依副檔名輸出為 .parquet 或 .csv"""
+    if str(path).lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path)
+    else:
+        import pyarrow.csv as csv
+
+        csv.write_csv(table.cast(pa.schema([
+            field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ])), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查詢持股 / 投資組合資料集")
+    parser.add_argument("--kind", choices=("holding", "portfolio"), default="holding", help="資料類型")
+    parser.add_argument("--etf", nargs="+", dest="etf_codes", help="ETF 代碼 (預設全部)")
+    parser.add_argument("--start", help="開始日期 (YYYY-MM-DD 或 YYYYMMDD)")
+    parser.add_argument("--end", help="結束日期 (含)")
+    parser.add_argument("--stock", nargs="+", dest="stocks", help="股票代號")
+    parser.add_argument("--columns", nargs="+", help="要讀取的欄位 (預設全部)")
+    parser.add_argument("--history", action="store_true",
+                        help="輸出單一股票在各 ETF 的每日權重變化 (需搭配一個 --stock)")
+    parser.add_argument("--limit", type=int, default=20, help="顯示的筆數 (預設 20，0 表示全部)")
+    parser.add_argument("--output", help="將結果寫入 .parquet 或 .csv 檔案")
+    parser.add_argument("--store-dir", default=str(STORE_DIR), help="資料集根目錄")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.history:
+            if not args.stocks or len(args.stocks) != 1:
+                parser.error("--history 需要指定一個 --stock")
+            result = stock_history(args.stocks[0], args.etf_codes, args.start, args.end, args.store_dir)
+        else:
+            result = query(args.kind, args.etf_codes, args.start, args.end, args.stocks, args.columns,
+                           args.store_dir)
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+
+    table = result.table
+    print(f"✓ {format_stats(result.stats)}")
+    if not table.num_rows:
+        print("⚠ 沒有符合條件的資料")
+        return 0
+
+    shown = table if args.limit == 0 else table.slice(0, args.limit)
+    print(shown.to_pandas().to_string(index=False))
+    if args.limit and table.num_rows > args.limit:
+        print(f"... 共 {table.num_rows} 筆 (以 --limit 0 顯示全部)")
+    if args.output:
+        write_output(table, args.output)
+        print(f"✓ 已寫入 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+原始檔案封存 (內容定址) 與重新解析
+下載的 Excel、00981A 的網頁原始碼與投資組合 API 的 JSON，解析成功後以 zstd 壓縮保存:
+    data/raw/<ETF>/<YYYYMMDD>/<sha256>.<類型>.zst
+同一內容只保存一份；再次封存相同內容時更新修改時間，同一日有多份時以最後封存的為準
+(zstd 使用 pyarrow 內建的壓縮，不需要額外套件)
+
+修正解析程式後以 reparse 重新解析封存檔並覆寫資料，不需要重新爬取過去日期:
+- 每個 (ETF, 日期) 取最後封存的檔案，以處理程序池平行解析 (解析程式見 PARSERS)
+- 與資料集中既有的持股及投資組合比較，只有內容改變的日期寫入分區資料集 (覆蓋該日)
+  與每日檔案 (先寫暫存檔再改名)
+- 之後重建內容改變的 ETF 的衍生資料表 (data/analytics)
+
+使用方式:
+    python raw_archive.py list 00981A
+    python raw_archive.py reparse                         # 全部 ETF、全部日期
+    python raw_archive.py reparse 00991A --start 2025-06-01 --dry-run
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+from holdings_schema import HOLDING_COLUMNS, to_holding_table, write_holding_file
+from holdings_store import STORE_DIR, read_dataset, sort_table, to_date, write_snapshots
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+ARCHIVE_DIR = DATA_DIR / "raw"
+
+COMPRESSION = "zstd"
+SUFFIX = ".zst"
+
+# (ETF, 類型) -> 解析函式 "模組:函式"，在解析時才載入
+# 回傳 (資料日期 YYYYMMDD, portfolio DataFrame 或 None, holdings DataFrame 或 None)；
+# 參數依類型為: Excel 檔案路徑、JSON 內容 (已解碼)、網頁原始碼字串
+PARSERS = {
+    ("00991A", "xlsx"): "get_00991A:parse_00991A_excel",
+    ("00991A", "xls"): "get_00991A:parse_00991A_excel",
+    ("00982A", "xlsx"): "get_00982A:parse_workbook",
+    ("00982A", "json"): "get_00991A:parse_00982A_json",
+    ("00981A", "html"): "get_00981A:parse_html",
+}
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+Artifact = namedtuple("Artifact", ["etf", "date", "digest", "kind", "path"])
+
+logger = logging.getLogger(__name__)
+
+
+def archive_dir_for(base_path):
+    """由單一 ETF 的資料目錄 (data/<ETF>) 推得封存目錄 (data/raw)"""
+    return Path(base_path).parent / "raw"
+
+
+def archive_bytes(content, etf_code, data_date, kind, archive_dir=ARCHIVE_DIR):
+    """
+    封存原始內容
+
+    參數:
+    content: 原始內容 (bytes)
+    data_date: 資料日期 (YYYYMMDD 字串或 date)
+    kind: 類型 (副檔名，例如 "xlsx"、"json"、"html")
+
+    回傳:
+    封存檔路徑；寫入失敗時記錄警告並回傳 None (封存不影響資料處理)
+    """
+    try:
+        digest = hashlib.sha256(content).hexdigest()
+        directory = Path(archive_dir) / etf_code / f"{to_date(data_date):%Y%m%d}"
+        path = directory / f"{digest}.{kind.lower()}{SUFFIX}"
+        if path.exists():
+            os.utime(path)
+            return path
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with pa.output_stream(str(tmp_path), compression=COMPRESSION) as stream:
+            stream.write(content)
+        os.replace(tmp_path, path)
+        return path
+    except OSError as e:
+        logger.warning("%s %s 原始檔封存失敗: %s", etf_code, data_date, e)
+        return None
+
+
+def archive_file(path, etf_code, data_date, archive_dir=ARCHIVE_DIR):
+    """封存下載的檔案 (類型取自副檔名)，回傳同 archive_bytes"""
+    path = Path(path)
+    try:
+        content = path.read_bytes()
+    except OSError as e:
+        logger.warning("%s %s 原始檔封存失敗: %s", etf_code, data_date, e)
+        return None
+    return archive_bytes(content, etf_code, data_date, path.suffix.lstrip(".") or "bin", archive_dir)
+
+
+def read_artifact(path):
+    """讀取並解壓縮封存檔"""
+    with pa.input_stream(str(path), compression=COMPRESSION) as stream:
+        return stream.read()
+
+
+def list_artifacts(etf_codes=None, start=None, end=None, archive_dir=ARCHIVE_DIR, latest_only=True):
+    """
+    列出封存檔
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示全部
+    start, end: 資料日期範圍 (含)，None 表示不限
+    latest_only: 每個 (ETF, 日期) 只取最後封存的一份
+
+    回傳:
+    Artifact 列表，依 ETF、日期排序
+    """
+    root = Path(archive_dir)
+    if not root.exists():
+        return []
+    start = f"{to_date(start):%Y%m%d}" if start is not None else None
+    end = f"{to_date(end):%Y%m%d}" if end is not None else None
+
+    artifacts = []
+    for etf_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        if etf_codes and etf_dir.name not in etf_codes:
+            continue
+        for date_dir in sorted(p for p in etf_dir.iterdir() if p.is_dir()):
+            if (start and date_dir.name < start) or (end and date_dir.name > end):
+                continue
+            files = [p for p in date_dir.glob(f"*{SUFFIX}") if not p.name.startswith(".")]
+            if latest_only and files:
+                files = [max(files, key=lambda p: (p.stat().st_mtime_ns, p.name))]
+            for path in files:
+                digest, kind = path.name[:-len(SUFFIX)].split(".", 1)
+                artifacts.append(Artifact(etf_dir.name, date_dir.name, digest, kind, path))
+    return artifacts
+
+
+def _resolve(target):
+    module_name, function_name = target.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def parse_artifact(artifact):
+    """
+    以目前的解析程式解析一個封存檔 (在處理程序池中執行)
+
+    回傳:
+    (artifact, 解析出的資料日期, portfolio DataFrame 或 None, 統一格式的持股 pyarrow.Table 或 None, 錯誤訊息)
+    """
+    try:
+        parser = PARSERS.get((artifact.etf, artifact.kind))
+        if parser is None:
+            return artifact, None, None, None, f"沒有 {artifact.etf} {artifact.kind} 的解析程式"
+        parser = _resolve(parser)
+        content = read_artifact(artifact.path)
+
+        if artifact.kind == "json":
+            result = parser(json.loads(content))
+        elif artifact.kind == "html":
+            result = parser(content.decode("utf-8"))
+        else:
+            # Excel 解析程式需要檔案路徑
+            with tempfile.TemporaryDirectory(prefix="reparse-") as work_dir:
+                path = Path(work_dir) / f"{artifact.etf}_{artifact.date}.{artifact.kind}"
+                path.write_bytes(content)
+                result = parser(str(path))
+
+        date_str, portfolio_df, holdings_df = result
+        table = to_holding_table(holdings_df, artifact.etf, date_str) if holdings_df is not None else None
+        return artifact, date_str, portfolio_df, table, None
+    except Exception as e:
+        return artifact, None, None, None, f"{type(e).__name__}: {e}"
+
+
+def _holdings_equal(old, new):
+    """比較同一日的持股內容 (忽略列順序與 dictionary 編碼)"""
+    if old is None or old.num_rows != new.num_rows:
+        return False
+
+    def normalized(table):
+        table = table.select(HOLDING_COLUMNS[1:])
+        table = table.cast(pa.schema([
+            field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+            for field in table.schema
+        ]))
+        return sort_table(table, [("股票代號", "ascending"), ("股數", "ascending")])
+
+    return normalized(old).equals(normalized(new))
+
+
+def _portfolio_equal(old, new):
+    """比較同一日的投資組合 (old 為資料集讀回的列，欄位為各 ETF 的聯集，數值欄位以數值比較)"""
+    columns = [column for column in new.columns if column not in ("etf", "日期")]
+    if old is None or len(old) != len(new) or not set(columns) <= set(old.columns):
+        return False
+    for column in columns:
+        left = old[column].reset_index(drop=True)
+        right = new[column].reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+            if not left.astype(float).equals(right.astype(float)):
+                return False
+        elif not left.astype(str).where(left.notna(), None).equals(right.astype(str).where(right.notna(), None)):
+            return False
+    return True
+
+
+def _write_etf(etf_code, results, base_dir, store_dir):
+    """覆寫一檔 ETF 重新解析的日期: 分區資料集一次寫入，每日檔案逐一以暫存檔改名寫入"""
+    holdings = [(date_str, table) for date_str, _, table in results if table is not None]
+    portfolios = [(date_str, df) for date_str, df, _ in results if df is not None]
+    if holdings:
+        write_snapshots(pa.concat_tables([table for _, table in holdings]), etf_code, "holding", store_dir)
+        for date_str, table in holdings:
+            write_holding_file(table, Path(base_dir) / etf_code / "holding" / f"{date_str}.parquet")
+    if portfolios:
+        write_snapshots(pd.concat([df for _, df in portfolios], ignore_index=True), etf_code, "portfolio",
+                        store_dir)
+        for date_str, df in portfolios:
+            path = Path(base_dir) / etf_code / "portfolio" / f"{date_str}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            df.to_parquet(tmp_path, index=False, engine='pyarrow')
+            os.replace(tmp_path, path)
+
+
+def reparse(etf_codes=None, start=None, end=None, base_dir=DATA_DIR, store_dir=None, archive_dir=None,
+            workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    以目前的解析程式重新解析封存檔並覆寫資料
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示全部
+    start, end: 資料日期範圍 (含)，None 表示不限
+    base_dir: 資料目錄 (每日檔案寫入 <base_dir>/<ETF>/holding、portfolio)
+    store_dir: 資料集根目錄，None 表示 <base_dir>/store
+    archive_dir: 封存目錄，None 表示 <base_dir>/raw
+    workers: 平行解析的處理程序數
+    dry_run: 只解析與比較，不寫入
+
+    回傳:
+    dict，包含 parsed (成功解析的封存檔數)、changed ({ETF: 持股或投資組合內容改變的日期列表}，
+    只寫入這些日期)、
+    failed ({封存檔路徑: 錯誤訊息})、elapsed (秒)
+    """
+    started = time.perf_counter()
+    base_dir = Path(base_dir)
+    store_dir = Path(store_dir) if store_dir else base_dir / "store"
+    archive_dir = Path(archive_dir) if archive_dir else base_dir / "raw"
+
+    artifacts = list_artifacts(etf_codes, start, end, archive_dir)
+    summary = {'parsed': 0, 'changed': {}, 'failed': {}, 'elapsed': 0.0}
+    if not artifacts:
+        return summary
+
+    results = {}
+    if workers > 1 and len(artifacts) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(artifacts))) as executor:
+            outcomes = list(executor.map(parse_artifact, artifacts, chunksize=max(1, len(artifacts) // (workers * 4))))
+    else:
+        outcomes = [parse_artifact(artifact) for artifact in artifacts]
+
+    for artifact, date_str, portfolio_df, table, error in outcomes:
+        if error is None and date_str != artifact.date:
+            error = f"解析出的資料日期 {date_str} 與封存日期 {artifact.date} 不同"
+        if error is not None:
+            summary['failed'][str(artifact.path)] = error
+            continue
+        if portfolio_df is None and table is None:
+            summary['failed'][str(artifact.path)] = "沒有解析出資料"
+            continue
+        results.setdefault(artifact.etf, []).append((date_str, portfolio_df, table))
+        summary['parsed'] += 1
+
+    for etf_code, etf_results in results.items():
+        dates = sorted(date_str for date_str, _, _ in etf_results)
+        existing = read_dataset("holding", [etf_code], start=dates[0], end=dates[-1], store_dir=store_dir)
+        by_date = {}
+        if existing.num_rows:
+            existing = existing.select(HOLDING_COLUMNS[1:])
+            for date_str in dates:
+                day = pa.scalar(to_date(date_str), type=pa.date32())
+                by_date[date_str] = existing.filter(pa.compute.equal(existing["日期"], day))
+        portfolios = read_dataset("portfolio", [etf_code], start=dates[0], end=dates[-1],
+                                  store_dir=store_dir).to_pandas()
+        portfolio_by_date = dict(list(portfolios.groupby("日期"))) if len(portfolios) else {}
+
+        changed_results = [
+            result for result in etf_results
+            if (result[2] is not None and not _holdings_equal(by_date.get(result[0]), result[2]))
+            or (result[1] is not None
+                and not _portfolio_equal(portfolio_by_date.get(to_date(result[0])), result[1]))
+        ]
+        if not changed_results:
+            continue
+        summary['changed'][etf_code] = sorted(date_str for date_str, _, _ in changed_results)
+        if not dry_run:
+            _write_etf(etf_code, changed_results, base_dir, store_dir)
+
+    summary['elapsed'] = time.perf_counter() - started
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="原始檔案封存與重新解析")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--store-dir", default=None, help=f"資料集根目錄 (預設 <base-dir>/store，即 {STORE_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列出封存檔")
+    list_parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    list_parser.add_argument("--all", action="store_true", help="同一日的所有版本 (預設只列最後封存的)")
+
+    reparse_parser = subparsers.add_parser("reparse", help="以目前的解析程式重新解析封存檔並覆寫資料")
+    reparse_parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    reparse_parser.add_argument("--start", help="開始日期 (YYYY-MM-DD 或 YYYYMMDD)")
+    reparse_parser.add_argument("--end", help="結束日期 (含)")
+    reparse_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="平行解析的處理程序數")
+    reparse_parser.add_argument("--dry-run", action="store_true", help="只解析並列出內容改變的日期，不寫入")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    if args.command == "list":
+        artifacts = list_artifacts(args.etf_codes or None, archive_dir=base_dir / "raw",
+                                   latest_only=not args.all)
+        for artifact in artifacts:
+            print(f"{artifact.etf}  {artifact.date}  {artifact.kind:<5} {artifact.digest[:16]}  "
+                  f"{artifact.path.stat().st_size:>10,d} bytes")
+        print(f"共 {len(artifacts)} 個封存檔")
+        return 0
+
+    # 解析程式的輸出 (print / logging) 很多，重新解析時只保留警告
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    summary = reparse(args.etf_codes or None, args.start, args.end, base_dir=base_dir, store_dir=args.store_dir,
+                      workers=args.workers, dry_run=args.dry_run)
+    for path, error in summary['failed'].items():
+        print(f"✗ {path}: {error}")
+    for etf_code, changed in summary['changed'].items():
+        detail = f" ({', '.join(changed[:5])}{' ...' if len(changed) > 5 else ''})" if changed else ""
+        print(f"✓ {etf_code}: 內容改變 {len(changed)} 天{detail}")
+    action = "解析" if args.dry_run else "解析並覆寫"
+    print(f"{action} {summary['parsed']} 個封存檔，失敗 {len(summary['failed'])} 個，"
+          f"耗時 {summary['elapsed']:.1f} 秒")
+
+    # 只有內容改變的 ETF 需要重建衍生資料表
+    if summary['changed'] and not args.dry_run:
+        from run_all_etfs import update_analytics
+
+        update_analytics(base_dir, sorted(summary['changed']), rebuild=True)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
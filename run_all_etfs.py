@@ -0,0 +1,289 @@
+"""
+多 ETF 平行下載與處理主程式
+取代 scripts/run_scripts.bat 的逐一執行方式:
+- 所有 ETF 在有上限的工作池中同時執行
+- 每個 ETF 的錯誤互相隔離，不會中斷其他 ETF
+- 回報每個 ETF 與整體的執行時間
+- 每個 ETF 的各階段耗時與資源使用寫入 logs/metrics/<YYYYMMDD>.jsonl (見 instrumentation)
+- 所有 ETF 在同一行程執行並共用瀏覽器連線池；selenium 等套件在實際用到時才載入
+- 全部完成後合併資料集並增量更新衍生資料表 (持股異動、資金流量、權重變化拆解、
+  投資組合指標、持股重疊，見 holdings_changes、fund_flows、weight_drift、portfolio_metrics、overlap)
+"""
+
+import argparse
+import importlib
+import logging
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from instrumentation import EtfRun
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+
+# 以獨立模組實作的 ETF (模組提供 run(data_path, headless, pool) 進入點)
+SCRIPT_ADAPTERS = {
+    "00981A": "get_00981A",
+    "00982A": "get_00982A",
+}
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def list_etf_codes():
+    """回傳所有可執行的 ETF 代碼 (ETF_CONFIGS 與獨立腳本)"""
+    from get_00991A import ETF_CONFIGS
+
+    codes = list(SCRIPT_ADAPTERS.keys())
+    codes += [code for code in ETF_CONFIGS.keys() if code not in SCRIPT_ADAPTERS]
+    return codes
+
+
+def _run_script_adapter(etf_code, base_dir, headless, pool):
+    """在本行程中執行獨立模組的 run()，回傳是否成功"""
+    module = importlib.import_module(SCRIPT_ADAPTERS[etf_code])
+    return module.run(data_path=Path(base_dir) / etf_code, headless=headless, pool=pool)
+
+
+def _run_direct_adapter(etf_code, base_dir):
+    """若 ETF_CONFIGS 設定了 HTTP 直接抓取則先嘗試，回傳是否成功"""
+    from get_00991A import ETF_CONFIGS, fetch_and_process_direct
+
+    if ETF_CONFIGS.get(etf_code, {}).get("fetch_mode") != "http":
+        return False
+    return fetch_and_process_direct(etf_code, base_dir=base_dir)
+
+
+def _run_config_adapter(etf_code, base_dir, headless, pool):
+    """執行 ETF_CONFIGS 中設定的 ETF，回傳是否成功"""
+    from get_00991A import download_and_process_etf
+
+    return download_and_process_etf(etf_code, base_dir=base_dir, headless=headless, pool=pool)
+
+
+def run_etf(etf_code, base_dir=DATA_DIR, headless=True, pool=None):
+    """
+    執行單一 ETF 並記錄耗時，任何例外都會被攔截並記錄在結果中
+
+    參數:
+    pool: ChromeDriverPool，提供時共用連線池中的瀏覽器
+
+    回傳:
+    dict，包含 etf_code、status ('ok' / 'failed' / 'error')、elapsed (秒)、error、
+    metrics (各階段耗時與資源使用紀錄，見 instrumentation.EtfRun)、
+    rewritten (本次覆寫的既有快照日期，見 holdings_store.take_rewritten_dates)
+    """
+    from holdings_store import take_rewritten_dates
+
+    start = time.perf_counter()
+    result = {"etf_code": etf_code, "status": "ok", "elapsed": 0.0, "error": None, "metrics": None,
+              "rewritten": []}
+    # 清除先前未取出的紀錄 (例如上次執行中途失敗)
+    take_rewritten_dates(etf_code)
+    run = EtfRun(etf_code).start()
+    try:
+        if etf_code in SCRIPT_ADAPTERS:
+            # 直接抓取失敗或缺少投資組合 (見 fetch_and_process_direct) 時才執行以瀏覽器為主的腳本
+            success = (_run_direct_adapter(etf_code, str(base_dir))
+                       or _run_script_adapter(etf_code, base_dir, headless, pool))
+        else:
+            success = _run_config_adapter(etf_code, str(base_dir), headless, pool)
+        if not success:
+            result["status"] = "failed"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        result["elapsed"] = time.perf_counter() - start
+        result["metrics"] = run.finish(result["status"], result["error"])
+        result["rewritten"] = take_rewritten_dates(etf_code)
+    return result
+
+
+def rewritten_since(results):
+    """由 run_etf 的結果整理出 {ETF 代碼: 最早覆寫的日期} (供 update_analytics 的 rewritten)"""
+    return {r["etf_code"]: r["rewritten"][0] for r in results if r.get("rewritten")}
+
+
+def print_summary(results, total_elapsed):
+    """輸出每個 ETF 與整體的執行時間"""
+    print("=" * 60)
+    print("執行摘要")
+    print("=" * 60)
+    for result in sorted(results, key=lambda r: r["etf_code"]):
+        mark = "✓" if result["status"] == "ok" else "✗"
+        line = f"{mark} {result['etf_code']:<8} {result['status']:<7} {result['elapsed']:8.2f} 秒"
+        peak = (result.get("metrics") or {}).get("peak_rss_mb")
+        if peak:
+            line += f"  {peak:8.1f} MB"
+        if result["error"]:
+            line += f"  ({result['error']})"
+        print(line)
+    print("-" * 60)
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    print(f"成功 {succeeded}/{len(results)}，總耗時 {total_elapsed:.2f} 秒")
+
+
+def _start_driver_pool(size, headless):
+    """建立並預熱瀏覽器連線池，失敗時回傳 None (改為每個 ETF 各自啟動瀏覽器)"""
+    from driver_pool import ChromeDriverPool
+
+    pool = ChromeDriverPool(size=size, headless=headless)
+    try:
+        pool.warm()
+    except Exception as e:
+        print(f"⚠ 瀏覽器連線池啟動失敗，改為個別啟動: {e}")
+        pool.close()
+        return None
+    return pool
+
+
+def compact_store(base_dir, etf_codes):
+    """將本次寫入的每日快照合併進分區資料集"""
+    from holdings_store import compact
+
+    if not etf_codes:
+        return
+    try:
+        merged = compact(etf_codes=etf_codes, store_dir=Path(base_dir) / "store")
+        print(f"✓ 資料集合併完成 ({len(merged)} 個分區)")
+    except Exception as e:
+        print(f"⚠ 資料集合併失敗: {e}")
+
+
+def update_analytics(base_dir, etf_codes, rebuild=False, store_dir=None, rewritten=None):
+    """
+    寫入新資料後增量更新衍生資料表 (data/analytics)
+
+    參數:
+    rebuild: 補寫或覆寫過去日期時 (回補、重新解析) 重新計算 etf_codes 的全部日期
+             (增量更新只涵蓋最後日期之後)；其他 ETF 的結果保留
+    store_dir: 資料集根目錄，None 表示 <base_dir>/store
+    rewritten: {ETF 代碼: 最早覆寫的快照日期} (見 rewritten_since)，這些 ETF 自該日起重新計算
+    """
+    from fund_flows import FLOWS_FILE, update_fund_flows
+    from holdings_changes import CHANGES_FILE, update_holding_changes
+    from overlap import OVERLAP_DIR, update_overlap
+    from portfolio_metrics import METRICS_FILE, update_portfolio_metrics
+    from weight_drift import DRIFT_FILE, PRICES_FILE, update_weight_drift
+
+    if not etf_codes:
+        return
+    base_dir = Path(base_dir)
+    store_dir = Path(store_dir) if store_dir else base_dir / "store"
+    try:
+        _, new_rows = update_holding_changes(etf_codes, store_dir=store_dir,
+                                             path=base_dir / "analytics" / CHANGES_FILE.name, rebuild=rebuild,
+                                             rewritten=rewritten)
+        print(f"✓ 持股異動更新 {len(new_rows)} 筆")
+    except Exception as e:
+        print(f"⚠ 持股異動更新失敗: {e}")
+    try:
+        _, new_rows = update_fund_flows(etf_codes, store_dir=store_dir,
+                                        path=base_dir / "analytics" / FLOWS_FILE.name, rebuild=rebuild,
+                                        rewritten=rewritten)
+        print(f"✓ 資金流量更新 {len(new_rows)} 筆")
+    except Exception as e:
+        print(f"⚠ 資金流量更新失敗: {e}")
+    try:
+        _, new_rows = update_weight_drift(etf_codes, store_dir=store_dir,
+                                          path=base_dir / "analytics" / DRIFT_FILE.name,
+                                          prices_path=base_dir / PRICES_FILE.name, rebuild=rebuild,
+                                          rewritten=rewritten)
+        print(f"✓ 權重變化拆解更新 {len(new_rows)} 筆")
+    except Exception as e:
+        print(f"⚠ 權重變化拆解更新失敗: {e}")
+    try:
+        _, new_rows = update_portfolio_metrics(etf_codes, store_dir=store_dir,
+                                               path=base_dir / "analytics" / METRICS_FILE.name, rebuild=rebuild,
+                                               rewritten=rewritten)
+        print(f"✓ 投資組合指標更新 {len(new_rows)} 筆")
+    except Exception as e:
+        print(f"⚠ 投資組合指標更新失敗: {e}")
+    try:
+        affected = update_overlap(store_dir=store_dir, directory=base_dir / "analytics" / OVERLAP_DIR.name,
+                                  rebuild=rebuild)
+        print(f"✓ 持股重疊更新 {len(affected)} 個日期")
+    except Exception as e:
+        print(f"⚠ 持股重疊更新失敗: {e}")
+
+
+def run_all_etfs(etf_codes=None, base_dir=DATA_DIR, headless=True, max_workers=DEFAULT_MAX_WORKERS,
+                 use_pool=True):
+    """
+    平行執行多個 ETF 的下載與處理
+
+    參數:
+    etf_codes: 要執行的 ETF 代碼列表，None 表示全部
+    base_dir: 資料基礎目錄
+    headless: 是否使用無視窗模式
+    max_workers: 同時執行的 ETF 數量上限
+    use_pool: 是否讓 ETF 共用預先啟動的瀏覽器連線池
+
+    回傳:
+    每個 ETF 的執行結果列表 (見 run_etf)
+    """
+    if etf_codes is None:
+        etf_codes = list_etf_codes()
+    if not etf_codes:
+        print("⚠ 沒有任何要執行的 ETF")
+        return []
+
+    max_workers = max(1, min(max_workers, len(etf_codes)))
+    print(f"開始平行處理 {len(etf_codes)} 檔 ETF (同時 {max_workers} 檔): {', '.join(etf_codes)}")
+
+    start = time.perf_counter()
+    pool = None
+    if use_pool:
+        pool = _start_driver_pool(max_workers, headless)
+
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etf") as executor:
+            futures = {
+                executor.submit(run_etf, code, base_dir, headless, pool): code
+                for code in etf_codes
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"→ {result['etf_code']} 完成 ({result['status']}, {result['elapsed']:.2f} 秒)")
+    finally:
+        if pool is not None:
+            pool.close()
+    succeeded = [r["etf_code"] for r in results if r["status"] == "ok"]
+    compact_store(base_dir, succeeded)
+    update_analytics(base_dir, succeeded, rewritten=rewritten_since(results))
+    total_elapsed = time.perf_counter() - start
+
+    print_summary(results, total_elapsed)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="平行下載並處理所有 ETF 資料")
+    parser.add_argument("etf_codes", nargs="*", help="要處理的 ETF 代碼 (預設全部)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"同時執行的 ETF 數量上限 (預設 {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料基礎目錄")
+    parser.add_argument("--show-browser", action="store_true", help="顯示瀏覽器視窗 (除錯用)")
+    parser.add_argument("--no-pool", action="store_true", help="不使用瀏覽器連線池，每個 ETF 各自啟動瀏覽器")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    results = run_all_etfs(
+        etf_codes=args.etf_codes or None,
+        base_dir=args.base_dir,
+        headless=not args.show_browser,
+        max_workers=args.workers,
+        use_pool=not args.no_pool,
+    )
+    return 0 if results and all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,2 @@
 @echo off
-python "C:\Users\User\Documents\GitHub\ETF_sniper\get_00981A.py"
-python "C:\Users\User\Documents\GitHub\ETF_sniper\get_00982Ag.py"
-python "C:\Users\User\Documents\GitHub\ETF_sniper\get_00991A.py"
\ No newline at end of file
+python "C:\Users\User\Documents\GitHub\ETF_sniper\run_all_etfs.py" %*
@@ -0,0 +1,2 @@
+@echo off
+python "C:\Users\User\Documents\GitHub\ETF_sniper\watcher.py" %*
@@ -0,0 +1,27 @@
+"""ezmoney 頁面解析: 各解析後端的結果一致"""
+
+import pytest
+
+from ezmoney_parser import BACKENDS, parse_ezmoney_page
+from synthetic import make_ezmoney_page
+
+DATE_SPANS = [
+    '<span>2025/12/26</span>',
+    '<span><i class="icon"></i>2025/12/26</span>',
+    '<span>\n  <i class="icon"></i>\n  2025/12/26\n</span>',
+    '<span><b></b><span>2025/12/26</span></span>',
+]
+
+
+@pytest.mark.parametrize("span", DATE_SPANS)
+def test_backends_find_the_same_date_span(span):
+    html = f'<html><body><div><span>選單</span>{span}</div></body></html>'
+    dates = {backend: parse_ezmoney_page(html, backend)['data_date'] for backend in BACKENDS}
+    assert dates == {backend: "2025/12/26" for backend in BACKENDS}
+
+
+def test_backends_agree_on_synthetic_page():
+    html = make_ezmoney_page(n_holdings=20, date_text="2025/12/26", filler_blocks=5)
+    results = [parse_ezmoney_page(html, backend) for backend in BACKENDS]
+    assert results[0]['data_date'] == "2025/12/26"
+    assert all(result == results[0] for result in results[1:])
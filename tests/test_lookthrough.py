@@ -0,0 +1,59 @@
+"""穿透曝險: 以 00981A 實際處理流程寫入的投資組合建立矩陣"""
+
+import numpy as np
+import pandas as pd
+
+from ezmoney_parser import parse_ezmoney_page
+from fund_flows import fund_units_nav
+from get_00981A import process_page
+from holdings_store import read_dataset
+from lookthrough import LookThrough, update_lookthrough
+from synthetic import make_ezmoney_page
+
+DATES = ["2025/12/24", "2025/12/26"]
+
+
+def _ingest_00981A(tmp_path):
+    data_path = tmp_path / "00981A"
+    for seed, date_text in enumerate(DATES):
+        page = parse_ezmoney_page(make_ezmoney_page(n_holdings=20, date_text=date_text, filler_blocks=1,
+                                                    seed=seed))
+        process_page(page, data_path)
+    return tmp_path / "store"
+
+
+def test_portfolio_dates_read_back_as_dates(tmp_path):
+    store_dir = _ingest_00981A(tmp_path)
+    portfolio = read_dataset("portfolio", ["00981A"], store_dir=store_dir).to_pandas()
+    assert not isinstance(portfolio['日期'].iloc[0], str)
+
+
+def test_lookthrough_with_00981A_portfolio(tmp_path):
+    store_dir = _ingest_00981A(tmp_path)
+    matrix, added = update_lookthrough(["00981A"], store_dir, tmp_path / "cache")
+    assert added == len(DATES)
+
+    exposure = matrix.exposure({"00981A": 1000})
+    assert sorted(exposure['日期'].dt.strftime('%Y/%m/%d').unique()) == DATES
+
+    holdings = read_dataset("holding", ["00981A"], store_dir=store_dir).to_pandas()
+    fund = fund_units_nav(read_dataset("portfolio", ["00981A"], store_dir=store_dir))
+    last = holdings[pd.to_datetime(holdings['日期']) == pd.Timestamp(DATES[-1])]
+    units = fund['流通在外單位數'].iloc[-1]
+    expected = (last.set_index(last['股票代號'].astype(str))['股數'] / units * 1000).sort_index()
+    day = exposure[exposure['日期'] == pd.Timestamp(DATES[-1])].set_index('股票代號')['有效股數'].sort_index()
+    np.testing.assert_allclose(day.to_numpy(), expected.reindex(day.index).to_numpy(), rtol=1e-9)
+
+
+def test_build_with_mismatched_date_resolutions(tmp_path):
+    store_dir = _ingest_00981A(tmp_path)
+    holdings = read_dataset("holding", ["00981A"], store_dir=store_dir)
+    fund = fund_units_nav(read_dataset("portfolio", ["00981A"], store_dir=store_dir))
+    # 投資組合日期為 datetime64[us]、持股日期為 datetime64[s] 時也能對齊
+    fund['日期'] = pd.to_datetime(fund['日期']).astype('datetime64[us]')
+    frame = holdings.to_pandas()
+    frame['日期'] = pd.to_datetime(frame['日期']).astype('datetime64[s]')
+
+    matrix, missing = LookThrough.build(frame, fund)
+    assert missing == 0
+    assert len(matrix.rows) == len(DATES)
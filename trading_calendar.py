@@ -0,0 +1,81 @@
+"""
+臺灣證券交易所交易日曆
+由本機的休市日檔案 (config/market_holidays.txt) 判斷交易日，不需連網查詢
+週六、週日一律休市；檔案中以 + 開頭的日期為週末補行交易日
+"""
+
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+HOLIDAY_FILE = BASE_DIR / "config" / "market_holidays.txt"
+
+
+def _parse_day(text):
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+class TradingCalendar:
+    """交易日判斷 (休市日與補行交易日由檔案載入)"""
+
+    def __init__(self, holidays=(), extra_trading_days=(), names=None):
+        self.holidays = set(holidays)
+        self.extra_trading_days = set(extra_trading_days)
+        self.names = dict(names or {})
+        known = self.holidays | self.extra_trading_days
+        self.last_known_year = max((day.year for day in known), default=None)
+
+    @classmethod
+    def load(cls, path=HOLIDAY_FILE):
+        """
+        讀取休市日檔案
+
+        參數:
+        path: 每行「YYYY-MM-DD  說明」，# 開頭為註解，+ 開頭為補行交易日
+        """
+        holidays, extra, names = set(), set(), {}
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                text, _, name = line.partition(" ")
+                is_extra = text.startswith("+")
+                try:
+                    day = _parse_day(text.lstrip("+"))
+                except ValueError:
+                    raise ValueError(f"{path} 第 {line_no} 行日期格式錯誤: {line}") from None
+                (extra if is_extra else holidays).add(day)
+                names[day] = name.strip()
+        return cls(holidays, extra, names)
+
+    def is_trading_day(self, day):
+        if isinstance(day, datetime):
+            day = day.date()
+        if day in self.extra_trading_days:
+            return True
+        return day.weekday() < 5 and day not in self.holidays
+
+    def next_trading_day(self, day, include=False):
+        """
+        下一個交易日
+
+        參數:
+        include: day 本身為交易日時是否直接回傳
+        """
+        if isinstance(day, datetime):
+            day = day.date()
+        if not include:
+            day += timedelta(days=1)
+        # 連續休市最長不超過數週，設上限避免檔案錯誤時無窮迴圈
+        for _ in range(60):
+            if self.is_trading_day(day):
+                return day
+            day += timedelta(days=1)
+        raise ValueError(f"{day} 前 60 天內沒有交易日，請檢查休市日檔案")
+
+    def covers(self, day):
+        """休市日檔案是否已包含該年度 (未包含時只能以週末判斷)"""
+        if isinstance(day, (datetime, date)):
+            day = day.year
+        return self.last_known_year is not None and day <= self.last_known_year
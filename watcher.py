@@ -0,0 +1,496 @@
+"""
+持股發布監看常駐程式
+取代 run_scripts.bat 的排程單次執行: 持續以最便宜的方式探測各 ETF 是否已發布新的資料日期，
+偵測到新日期才執行完整的下載與處理 (run_all_etfs.run_etf)
+
+- 探測方式 (ETF_CONFIGS 的 "probe"，或 config.ini 的 probe / probe_url / probe_label):
+  json: 呼叫 JSON 端點，讀取第一筆的日期欄位
+  head: HEAD 請求，以 ETag / Last-Modified 判斷檔案是否更新
+  fragment: 串流讀取頁面，找到資料日期即中斷連線 (最多讀取 PROBE_MAX_BYTES)
+- 排程: 週末與休市日 (config/market_holidays.txt) 不探測；
+  在各投信的發布時間 (過去觀察到的發布時間中位數，沒有紀錄時用設定的 publish_time) 前後密集探測，
+  其餘時間拉長間隔，當天取得新資料後休息到下一個交易日
+- 發布到寫入 parquet 的延遲寫入 logs/metrics/publish_latency.jsonl
+- 取得新資料後合併資料集並增量更新衍生資料表 (run_all_etfs.compact_store、update_analytics)
+
+使用方式:
+    python watcher.py                 # 監看所有 ETF
+    python watcher.py 00981A --once   # 只探測一次，有新資料時執行處理 (排程或測試用)
+"""
+
+import argparse
+import configparser
+import logging
+import statistics
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from excel_reader import DATE_PATTERN, parse_date
+from fetch_state import FetchState
+from instrumentation import METRICS_DIR, append_record
+from trading_calendar import HOLIDAY_FILE, TradingCalendar
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+CONFIG_FILE = BASE_DIR / "config" / "config.ini"
+LOG_DIR = BASE_DIR / "logs"
+LATENCY_FILE = METRICS_DIR / "publish_latency.jsonl"
+
+DEFAULT_PUBLISH_TIME = "17:30"
+
+# 探測間隔 (秒)
+FAST_INTERVAL = 60           # 發布時間前後
+SLOW_INTERVAL = 30 * 60      # 發布時間之前
+LATE_INTERVAL = 10 * 60      # 發布時間過後仍未取得新資料
+FALLBACK_INTERVAL = 15 * 60  # 探測無法判斷時，發布時間前後最多每隔多久直接執行一次處理
+
+# 發布時間前後密集探測的範圍 (分鐘)，依過去發布時間的分散程度調整
+MIN_WINDOW = 15
+MAX_WINDOW = 90
+DAY_END = "23:30"
+
+PROBE_MAX_BYTES = 512 * 1024
+# 標籤 (例如「資料日期」) 之後多少字元內尋找日期
+LABEL_SEARCH_CHARS = 200
+
+logger = logging.getLogger(__name__)
+
+# 探測結果: data_date 為 YYYYMMDD，validator 為 ETag / Last-Modified，published_at 為伺服器提供的更新時間
+ProbeResult = namedtuple("ProbeResult", ["data_date", "validator", "published_at"])
+
+
+# === 探測 ===
+
+def _published_at(headers):
+    """Last-Modified 轉為本地時間 (naive)，沒有或格式錯誤時回傳 None"""
+    value = headers.get('Last-Modified')
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).astimezone().replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_json(probe, timeout=10):
+    """呼叫 JSON 端點，讀取 (第一筆資料的) date_field"""
+    from http_fetch import request
+
+    response = request(probe.get("method", "GET"), probe["url"], params=probe.get("params"),
+                       headers=probe.get("headers"), timeout=timeout)
+    payload = response.json()
+    record = payload[0] if isinstance(payload, list) and payload else payload
+    value = record.get(probe["date_field"]) if isinstance(record, dict) else None
+    data_date = parse_date(str(value)) if value is not None else None
+    return ProbeResult(data_date, response.headers.get('ETag'), _published_at(response.headers))
+
+
+def probe_head(probe, timeout=10):
+    """HEAD 請求，只取得 ETag / Last-Modified"""
+    from http_fetch import request
+
+    response = request("HEAD", probe["url"], headers=probe.get("headers"), timeout=timeout)
+    headers = response.headers
+    return ProbeResult(None, headers.get('ETag') or headers.get('Last-Modified'), _published_at(headers))
+
+
+def find_date_text(text, label=None):
+    """在文字中尋找日期 (label 指定時只找 label 之後 LABEL_SEARCH_CHARS 字元內)，回傳 YYYYMMDD 或 None"""
+    if not label:
+        match = DATE_PATTERN.search(text)
+        return parse_date(match.group(0)) if match else None
+    start = text.find(label)
+    while start != -1:
+        match = DATE_PATTERN.search(text, start, start + len(label) + LABEL_SEARCH_CHARS)
+        if match:
+            return parse_date(match.group(0))
+        start = text.find(label, start + 1)
+    return None
+
+
+def probe_fragment(probe, timeout=10):
+    """串流讀取頁面，找到資料日期後立即停止下載"""
+    from http_fetch import request
+
+    max_bytes = probe.get("max_bytes", PROBE_MAX_BYTES)
+    label = probe.get("label")
+    with request("GET", probe["url"], headers=probe.get("headers"), timeout=timeout, stream=True) as response:
+        encoding = response.encoding or 'utf-8'
+        buffer = b""
+        data_date = None
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            buffer += chunk
+            data_date = find_date_text(buffer.decode(encoding, errors='ignore'), label)
+            if data_date or len(buffer) >= max_bytes:
+                break
+        return ProbeResult(data_date, response.headers.get('ETag'), _published_at(response.headers))
+
+
+PROBES = {
+    "json": probe_json,
+    "head": probe_head,
+    "fragment": probe_fragment,
+}
+
+
+# === 監看對象 ===
+
+class WatchTarget:
+    """單一 ETF 的探測設定與監看狀態"""
+
+    def __init__(self, etf_code, probe, publish_time=DEFAULT_PUBLISH_TIME, name=None):
+        if probe["type"] not in PROBES:
+            raise ValueError(f"{etf_code} 不支援的探測方式: {probe['type']} (可用: {', '.join(PROBES)})")
+        self.etf_code = etf_code
+        self.probe = probe
+        self.publish_time = publish_time
+        self.name = name or etf_code
+        self.next_due = None
+        self.last_probe_at = None
+        self.last_validator = None
+        self.last_fallback_at = None
+        self.done_date = None
+
+
+def load_targets(etf_codes=None, config_file=CONFIG_FILE):
+    """
+    由 ETF_CONFIGS 與 config.ini 建立監看對象，沒有探測設定的 ETF 會略過並提示
+
+    回傳:
+    {ETF 代碼: WatchTarget}
+    """
+    from get_00991A import ETF_CONFIGS
+    from run_all_etfs import list_etf_codes
+
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+
+    targets = {}
+    for code in etf_codes or list_etf_codes():
+        etf_config = ETF_CONFIGS.get(code, {})
+        probe = dict(etf_config.get("probe") or {})
+        if probe:
+            direct = etf_config.get("direct") or {}
+            probe.setdefault("url", direct.get("url") or etf_config.get("url"))
+            probe.setdefault("headers", direct.get("headers"))
+            publish_time = etf_config.get("publish_time", DEFAULT_PUBLISH_TIME)
+            name = etf_config.get("name")
+        elif config.has_section(code) and config.has_option(code, "probe"):
+            section = config[code]
+            probe = {"type": section["probe"], "url": section["probe_url"]}
+            if section.get("probe_label"):
+                probe["label"] = section["probe_label"]
+            if section.get("probe_date_field"):
+                probe["date_field"] = section["probe_date_field"]
+            publish_time = section.get("publish_time", DEFAULT_PUBLISH_TIME)
+            name = section.get("name")
+        else:
+            logger.warning("%s 沒有探測設定 (probe)，不列入監看", code)
+            continue
+        targets[code] = WatchTarget(code, probe, publish_time, name)
+    return targets
+
+
+# === 排程 ===
+
+def _minutes(text):
+    hour, minute = text.split(":")
+    return int(hour) * 60 + int(minute)
+
+
+def estimate_publish_time(publish_times, default=DEFAULT_PUBLISH_TIME):
+    """
+    估計發布時間與密集探測範圍
+
+    參數:
+    publish_times: 過去觀察到的發布時間 (HH:MM)
+
+    回傳:
+    (發布時間 (自午夜起的分鐘數), 前後範圍 (分鐘))
+    """
+    observed = [_minutes(t) for t in publish_times]
+    if not observed:
+        return _minutes(default), MAX_WINDOW
+    center = statistics.median(observed)
+    # 以 80% 的觀察值落在範圍內為準
+    deviations = sorted(abs(m - center) for m in observed)
+    spread = deviations[int(0.8 * (len(deviations) - 1))]
+    return int(center), int(min(MAX_WINDOW, max(MIN_WINDOW, spread + MIN_WINDOW)))
+
+
+def next_poll_time(now, calendar, publish_minutes, window, done_today=False):
+    """
+    下一次探測的時間
+
+    - 休市日或當天已取得新資料: 下一個交易日的密集探測開始時間
+    - 密集探測範圍之前: 每 SLOW_INTERVAL (但不晚於範圍開始)
+    - 範圍內: 每 FAST_INTERVAL
+    - 範圍之後到 DAY_END: 每 LATE_INTERVAL
+    """
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    window_start = day_start + timedelta(minutes=publish_minutes - window)
+    window_end = day_start + timedelta(minutes=publish_minutes + window)
+    day_end = day_start + timedelta(minutes=_minutes(DAY_END))
+
+    if done_today or not calendar.is_trading_day(now) or now >= day_end:
+        next_day = calendar.next_trading_day(now.date())
+        return datetime.combine(next_day, datetime.min.time()) + timedelta(minutes=publish_minutes - window)
+    if now < window_start:
+        return min(window_start, now + timedelta(seconds=SLOW_INTERVAL))
+    if now <= window_end:
+        return now + timedelta(seconds=FAST_INTERVAL)
+    return min(day_end, now + timedelta(seconds=LATE_INTERVAL))
+
+
+# === 監看 ===
+
+class Watcher:
+    """
+    依排程探測各 ETF，偵測到新資料日期時在背景執行完整處理
+
+    參數:
+    targets: {ETF 代碼: WatchTarget} (見 load_targets)
+    max_workers: 同時執行處理的 ETF 數量上限
+    """
+
+    def __init__(self, targets, base_dir=DATA_DIR, calendar=None, headless=True, max_workers=2,
+                 latency_file=LATENCY_FILE):
+        self.targets = targets
+        self.base_dir = Path(base_dir)
+        self.calendar = calendar or TradingCalendar.load(HOLIDAY_FILE)
+        self.headless = headless
+        self.latency_file = Path(latency_file)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._warned_years = set()
+
+    def _state(self, target):
+        return FetchState(target.etf_code, self.base_dir)
+
+    def _check_calendar(self, now):
+        if not self.calendar.covers(now) and now.year not in self._warned_years:
+            self._warned_years.add(now.year)
+            logger.warning("休市日檔案未包含 %d 年，只以週末判斷交易日，請更新 %s", now.year, HOLIDAY_FILE)
+
+    def schedule(self, target, now):
+        """計算並設定下一次探測時間"""
+        publish_minutes, window = estimate_publish_time(self._state(target).publish_times,
+                                                        target.publish_time)
+        done_today = target.done_date == now.date()
+        target.next_due = next_poll_time(now, self.calendar, publish_minutes, window, done_today)
+        return target.next_due
+
+    def _in_window(self, target, now):
+        publish_minutes, window = estimate_publish_time(self._state(target).publish_times,
+                                                        target.publish_time)
+        minutes = now.hour * 60 + now.minute
+        return abs(minutes - publish_minutes) <= window
+
+    def poll(self, target, now=None):
+        """
+        探測一次，有新資料時在背景執行處理
+
+        回傳:
+        是否開始執行處理
+        """
+        now = now or datetime.now()
+        code = target.etf_code
+        with self._lock:
+            if code in self._running:
+                return False
+
+        previous_probe_at = target.last_probe_at
+        try:
+            result = PROBES[target.probe["type"]](target.probe)
+        except Exception as e:
+            logger.warning("%s 探測失敗: %s", code, e)
+            return False
+        target.last_probe_at = now
+
+        state = self._state(target)
+        if result.data_date:
+            is_new = state.data_date is None or result.data_date > state.data_date
+            reason = f"資料日期 {result.data_date} (上次 {state.data_date})"
+        elif result.validator:
+            is_new = result.validator != target.last_validator
+            reason = f"內容版本變更 ({result.validator})"
+        else:
+            # 無法判斷是否更新: 只在發布時間前後定期直接執行處理 (處理本身會以內容指紋略過未變更的資料)
+            is_new = self._in_window(target, now) and (
+                target.last_fallback_at is None
+                or (now - target.last_fallback_at).total_seconds() >= FALLBACK_INTERVAL)
+            reason = "探測無法判斷，定期執行處理"
+            if is_new:
+                target.last_fallback_at = now
+        target.last_validator = result.validator
+
+        if not is_new:
+            logger.debug("%s 沒有新資料", code)
+            return False
+
+        logger.info("%s 偵測到新資料: %s，開始處理", code, reason)
+        detection = {'result': result, 'detected_at': now, 'previous_probe_at': previous_probe_at,
+                     'previous_date': state.data_date}
+        with self._lock:
+            self._running[code] = self._executor.submit(self._ingest, target, detection)
+        return True
+
+    def _ingest(self, target, detection):
+        from run_all_etfs import compact_store, rewritten_since, run_etf, update_analytics
+
+        code = target.etf_code
+        try:
+            outcome = run_etf(code, base_dir=self.base_dir, headless=self.headless)
+            ingested_at = datetime.now()
+            state = self._state(target)
+            advanced = state.data_date is not None and state.data_date != detection['previous_date']
+            if outcome["status"] != "ok":
+                logger.error("%s 處理失敗 (%s): %s", code, outcome["status"], outcome["error"])
+                return outcome
+            if not advanced:
+                logger.info("%s 處理完成，但資料日期沒有更新 (%s)", code, state.data_date)
+            else:
+                target.done_date = ingested_at.date()
+                self._record_latency(target, state, detection, ingested_at, outcome)
+            # 與 run_all_etfs 相同: 每日 part 檔併入分區的合併檔，避免長時間執行下小檔持續累積
+            compact_store(self.base_dir, [code])
+            # 資料日期沒有更新但覆寫了既有日期 (發布後更正) 時，衍生資料表同樣需要重算
+            if advanced or outcome["rewritten"]:
+                update_analytics(self.base_dir, [code], rewritten=rewritten_since([outcome]))
+            return outcome
+        finally:
+            with self._lock:
+                self._running.pop(code, None)
+            self.schedule(target, datetime.now())
+
+    def _record_latency(self, target, state, detection, ingested_at, outcome):
+        """記錄發布到寫入 parquet 的延遲，並把發布時間加入該投信的發布時間紀錄"""
+        detected_at = detection['detected_at']
+        published_at = detection['result'].published_at
+        source = "last_modified"
+        # 伺服器時間不可信 (晚於偵測時間或不是當天) 時，以偵測時間作為發布時間
+        if published_at is None or published_at > detected_at or published_at.date() != detected_at.date():
+            published_at, source = detected_at, "probe"
+        previous_probe_at = detection['previous_probe_at']
+
+        record = {
+            'etf': target.etf_code,
+            'data_date': state.data_date,
+            'published_at': published_at.isoformat(timespec='seconds'),
+            'published_source': source,
+            'previous_probe_at': previous_probe_at.isoformat(timespec='seconds') if previous_probe_at else None,
+            'detected_at': detected_at.isoformat(timespec='seconds'),
+            'ingested_at': ingested_at.isoformat(timespec='seconds'),
+            'detect_s': round((detected_at - published_at).total_seconds(), 1),
+            'ingest_s': round(outcome["elapsed"], 1),
+            'latency_s': round((ingested_at - published_at).total_seconds(), 1),
+        }
+        append_record(record, self.latency_file)
+        state.record_publish(published_at)
+        logger.info("%s 資料日期 %s 已寫入，發布到寫入延遲 %.0f 秒 (發布時間來源: %s)",
+                    target.etf_code, state.data_date, record['latency_s'], source)
+
+    def run_once(self, now=None):
+        """每個交易日的 ETF 探測一次，等待處理完成後回傳"""
+        now = now or datetime.now()
+        self._check_calendar(now)
+        if not self.calendar.is_trading_day(now):
+            logger.info("%s 為休市日，不探測", now.date())
+            return
+        for target in self.targets.values():
+            self.poll(target, now)
+        self._wait_running()
+
+    def run(self):
+        """持續監看直到 stop() 或 Ctrl+C"""
+        now = datetime.now()
+        for target in self.targets.values():
+            # 啟動時立即探測一次，之後依排程
+            target.next_due = now if self.calendar.is_trading_day(now) else self.schedule(target, now)
+            logger.info("%s 下一次探測: %s", target.etf_code, target.next_due.strftime('%Y-%m-%d %H:%M'))
+
+        while not self._stop.is_set():
+            now = datetime.now()
+            self._check_calendar(now)
+            for target in self.targets.values():
+                with self._lock:
+                    running = target.etf_code in self._running
+                if not running and target.next_due <= now:
+                    self.poll(target, now)
+                    with self._lock:
+                        running = target.etf_code in self._running
+                    if not running:
+                        self.schedule(target, datetime.now())
+
+            idle = [t.next_due for t in self.targets.values() if t.etf_code not in self._running]
+            delay = max(0.0, (min(idle) - datetime.now()).total_seconds()) if idle else FAST_INTERVAL
+            with self._lock:
+                futures = list(self._running.values())
+            if futures:
+                wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+            else:
+                self._stop.wait(delay)
+
+    def _wait_running(self):
+        with self._lock:
+            futures = list(self._running.values())
+        wait(futures)
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        self.stop()
+        self._executor.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="監看各 ETF 的持股發布，有新資料日期時才下載與處理")
+    parser.add_argument("etf_codes", nargs="*", help="要監看的 ETF 代碼 (預設全部)")
+    parser.add_argument("--once", action="store_true", help="只探測一次 (有新資料時執行處理) 後結束")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料基礎目錄")
+    parser.add_argument("--calendar", default=str(HOLIDAY_FILE), help="休市日檔案")
+    parser.add_argument("--workers", type=int, default=2, help="同時執行處理的 ETF 數量上限")
+    parser.add_argument("--show-browser", action="store_true", help="顯示瀏覽器視窗 (除錯用)")
+    parser.add_argument("--verbose", action="store_true", help="顯示每次探測的結果")
+    args = parser.parse_args(argv)
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(LOG_DIR / f"watcher_{datetime.now():%Y%m%d}.log", encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+    targets = load_targets(args.etf_codes or None)
+    if not targets:
+        print("⚠ 沒有任何可監看的 ETF")
+        return 1
+
+    watcher = Watcher(targets, base_dir=args.base_dir, calendar=TradingCalendar.load(args.calendar),
+                      headless=not args.show_browser, max_workers=args.workers)
+    logger.info("開始監看 %s", ", ".join(targets))
+    try:
+        if args.once:
+            watcher.run_once()
+        else:
+            watcher.run()
+    except KeyboardInterrupt:
+        logger.info("收到中斷訊號，等待進行中的處理完成...")
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+持股權重變化拆解 (價格漂移 / 主動調整)
+持股權重變化同時反映經理人買賣與股價漲跌。假設經理人前一日之後完全沒有交易，
+股票的權重會隨股價報酬漂移為:
+    漂移權重 = 前日權重 × r / R
+    r = 股價 / 前日股價，R = Σ 前日權重 × r / Σ 前日權重 (持股部位的加權報酬)
+並拆解為:
+    價格漂移 = 漂移權重 - 前日權重
+    主動調整 = 持股權重 - 漂移權重
+兩者相加等於權重變化 (新增持股全部為主動調整；現金與期貨部位視為與股票部位同比例漂移)
+
+股價報酬 r 依序取自 (同一來源需同時有前日與本日股價):
+- 金額: 金額 / 股數 (同一天同一股票在各 ETF 的平均；00991A 有金額欄位)
+- 價格檔: data/prices.parquet 或 .csv (欄位 日期、股票代號、收盤價)
+- 淨資產推算: 持股權重 × 淨資產 / 股數 (該 ETF 當天的投資組合資料)
+都沒有時 (例如出清且沒有價格檔) 以 R 代替，價格漂移為 0、價格來源為空值
+
+結果存放於 data/analytics/weight_drift.parquet，每次只計算新增的日期
+(補寫過去日期或更新價格檔後以 --rebuild 重建)
+
+使用方式:
+    python weight_drift.py                     # 更新所有 ETF 並列出最新一日主動調整最大的持股
+    python weight_drift.py 00981A --top 20 --prices data/prices.csv
+"""
+
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from analytics_table import update_table
+from fund_flows import fund_units_nav
+from holdings_changes import compute_holding_changes
+from holdings_store import STORE_DIR, read_dataset
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+ANALYTICS_DIR = DATA_DIR / "analytics"
+DRIFT_FILE = ANALYTICS_DIR / "weight_drift.parquet"
+PRICES_FILE = DATA_DIR / "prices.parquet"
+
+PRICE_COLUMN = '收盤價'
+
+# 價格來源 (依優先順序)
+SOURCE_AMOUNT = '金額'
+SOURCE_PRICE_FILE = '價格檔'
+SOURCE_NET_ASSETS = '淨資產推算'
+SOURCES = [SOURCE_AMOUNT, SOURCE_PRICE_FILE, SOURCE_NET_ASSETS]
+
+DRIFT_COLUMNS = [
+    'etf', '日期', '前日日期', '股票代號', '股票名稱',
+    '前日股數', '股數', '前日權重', '持股權重', '權重變化',
+    '前日股價', '股價', '股價報酬', '價格來源', '價格漂移', '主動調整',
+]
+
+# (etf, 日, 股票) 壓縮為一個 int64 鍵
+_DAY_SHIFT = 24
+_ETF_SHIFT = 48
+_NO_PRICES = (np.empty(0, np.int64), np.empty(0))
+
+# 同一行程中多個 ETF 平行寫入時，避免同時讀寫結果檔
+_update_lock = threading.Lock()
+
+
+def _days(values):
+    """日期欄位轉為 1970-01-01 起的天數 (int64)"""
+    return pd.to_datetime(values).to_numpy('datetime64[D]').astype(np.int64)
+
+
+def _positions(index, values):
+    """values 在 index 中的位置 (找不到時為 -1)；類別欄位只比對類別，不轉換每一列"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        mapping = np.append(index.get_indexer(values.cat.categories.astype(str)), -1)
+        return mapping[values.cat.codes.to_numpy()]
+    return index.get_indexer(values.astype(str).str.strip())
+
+
+def _pack(etf_id, days, code_id):
+    return (np.asarray(etf_id, np.int64) << _ETF_SHIFT) | (days << _DAY_SHIFT) | code_id
+
+
+def _price_table(keys, prices):
+    """依鍵排序並將重複的鍵取平均，回傳 (已排序的鍵, 價格)"""
+    valid = np.isfinite(prices) & (prices > 0)
+    keys, prices = keys[valid], prices[valid]
+    order = np.argsort(keys, kind='stable')
+    keys, prices = keys[order], prices[order]
+    if not len(keys):
+        return keys, prices
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[first, len(keys)])
+    return keys[first], np.add.reduceat(prices, first) / counts
+
+
+def _lookup(table, keys):
+    """在 _price_table 中尋找 keys，找不到時為 NaN"""
+    table_keys, table_prices = table
+    if not len(table_keys):
+        return np.full(len(keys), np.nan)
+    position = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    return np.where(table_keys[position] == keys, table_prices[position], np.nan)
+
+
+def load_prices(path=PRICES_FILE):
+    """
+    讀取價格檔 (.parquet 或 .csv，欄位 日期、股票代號、收盤價)
+
+    回傳:
+    DataFrame，檔案不存在時回傳 None
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    if path.suffix.lower() == '.csv':
+        prices = pd.read_csv(path, dtype={'股票代號': str})
+    else:
+        prices = pd.read_parquet(path)
+    missing = {'日期', '股票代號', PRICE_COLUMN} - set(prices.columns)
+    if missing:
+        raise ValueError(f"價格檔缺少欄位: {', '.join(sorted(missing))}")
+    return prices
+
+
+def compute_weight_drift(history, fund=None, prices=None, since=None):
+    """
+    一次計算所有 ETF、所有日期、所有股票的權重變化拆解
+
+    參數:
+    history: 持股歷史 (DataFrame 或 pyarrow.Table，欄位同 HOLDING_SCHEMA)
+    fund: fund_units_nav 的結果 (淨資產推算股價用)，None 表示不使用
+    prices: load_prices 的結果，None 表示不使用
+    since: {etf: 日期}，只計算該日期之後的變化 (增量更新用)，None 表示全部
+
+    回傳:
+    每個 (etf, 日期, 股票代號) 一列的 DataFrame，欄位見 DRIFT_COLUMNS；
+    每檔 ETF 的第一個快照沒有前一日可比較，不會出現在結果中
+    """
+    if isinstance(history, pa.Table):
+        history = history.to_pandas()
+    changes = compute_holding_changes(history, since=since)
+    if changes.empty:
+        return pd.DataFrame(columns=DRIFT_COLUMNS)
+
+    # 以結果的類別編號作為 etf / 股票代號 的共同編號，不在結果中的資料不需要
+    etf_index = pd.Index(changes['etf'].cat.categories)
+    code_index = pd.Index(changes['股票代號'].cat.categories)
+    etf_id = changes['etf'].cat.codes.to_numpy(np.int64)
+    code_id = changes['股票代號'].cat.codes.to_numpy(np.int64)
+    day = _days(changes['日期'])
+    prev_day = _days(changes['前日日期'])
+
+    history = history[history['股票代號'].notna()]
+    h_code = _positions(code_index, history['股票代號'])
+    h_etf = _positions(etf_index, history['etf'])
+    keep = (h_code >= 0) & (h_etf >= 0)
+    history = history[keep]
+    h_code, h_etf = h_code[keep], h_etf[keep]
+    h_day = _days(history['日期'])
+    h_shares = pd.to_numeric(history['股數'], errors='coerce').to_numpy(np.float64)
+
+    tables = []
+    # 金額 / 股數: 與 ETF 無關，同一天同一股票各 ETF 取平均
+    if '金額' in history.columns:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            implied = pd.to_numeric(history['金額'], errors='coerce').to_numpy(np.float64) / h_shares
+        tables.append((False, _price_table(_pack(0, h_day, h_code), implied)))
+    else:
+        tables.append((False, _NO_PRICES))
+
+    if prices is not None and len(prices):
+        p_code = _positions(code_index, prices['股票代號'])
+        known = p_code >= 0
+        tables.append((False, _price_table(
+            _pack(0, _days(prices['日期'][known]), p_code[known]),
+            pd.to_numeric(prices[PRICE_COLUMN][known], errors='coerce').to_numpy(np.float64))))
+    else:
+        tables.append((False, _NO_PRICES))
+
+    # 持股權重 × 淨資產 / 股數: 只適用於同一 ETF 同一天
+    if fund is not None and len(fund):
+        fund_keys = _pack(_positions(etf_index, fund['etf']), _days(fund['日期']), 0)
+        assets = _lookup(_price_table(fund_keys, fund['淨資產'].to_numpy(np.float64)),
+                         _pack(h_etf, h_day, 0))
+        weights = pd.to_numeric(history['持股權重'], errors='coerce').to_numpy(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimated = weights * assets / h_shares
+        tables.append((True, _price_table(_pack(h_etf, h_day, h_code), estimated)))
+    else:
+        tables.append((True, _NO_PRICES))
+
+    # 依序選擇第一個同時有前日與本日股價的來源
+    price = np.full(len(changes), np.nan)
+    prev_price = np.full(len(changes), np.nan)
+    source = np.full(len(changes), -1, dtype=np.int8)
+    for index, (per_etf, table) in enumerate(tables):
+        etfs = etf_id if per_etf else 0
+        current = _lookup(table, _pack(etfs, day, code_id))
+        previous = _lookup(table, _pack(etfs, prev_day, code_id))
+        use = (source < 0) & np.isfinite(current) & np.isfinite(previous)
+        price[use], prev_price[use], source[use] = current[use], previous[use], index
+
+    prev_weight = np.nan_to_num(changes['前日權重'].to_numpy(np.float64))
+    weight = np.nan_to_num(changes['持股權重'].to_numpy(np.float64))
+    ratio = price / prev_price
+    known = np.isfinite(ratio) & (prev_weight > 0)
+
+    # 各快照 (etf, 日期) 持股部位的加權報酬 R
+    # (compute_holding_changes 的結果依 etf、日期排序，同一快照的列相鄰)
+    snapshot = np.cumsum(np.r_[True, (etf_id[1:] != etf_id[:-1]) | (day[1:] != day[:-1])]) - 1
+    numerator = np.bincount(snapshot, weights=np.where(known, prev_weight * ratio, 0.0))
+    denominator = np.bincount(snapshot, weights=np.where(known, prev_weight, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        portfolio_return = np.where(denominator > 0, numerator / denominator, 1.0)[snapshot]
+        drifted = prev_weight * np.where(known, ratio, portfolio_return) / portfolio_return
+
+    return pd.DataFrame({
+        'etf': changes['etf'],
+        '日期': changes['日期'],
+        '前日日期': changes['前日日期'],
+        '股票代號': changes['股票代號'],
+        '股票名稱': changes['股票名稱'],
+        '前日股數': changes['前日股數'],
+        '股數': changes['股數'],
+        '前日權重': changes['前日權重'],
+        '持股權重': changes['持股權重'],
+        '權重變化': weight - prev_weight,
+        '前日股價': prev_price,
+        '股價': price,
+        '股價報酬': ratio - 1,
+        '價格來源': pd.Categorical.from_codes(source, categories=SOURCES),
+        '價格漂移': drifted - prev_weight,
+        '主動調整': weight - drifted,
+    })
+
+
+def load_weight_drift(path=DRIFT_FILE):
+    """讀取已計算的權重變化拆解，不存在時回傳空的 DataFrame"""
+    if not Path(path).exists():
+        return pd.DataFrame(columns=DRIFT_COLUMNS)
+    return pd.read_parquet(path)
+
+
+def update_weight_drift(etf_codes=None, store_dir=STORE_DIR, path=DRIFT_FILE, prices_path=PRICES_FILE,
+                        rebuild=False, rewritten=None):
+    """
+    增量更新權重變化拆解表: 每檔 ETF 只讀取上次更新的最後一日 (作為前一日) 之後的持股
+
+    參數:
+    etf_codes: ETF 代碼列表，None 表示資料集中全部
+    prices_path: 價格檔，不存在時只使用 金額 與 淨資產推算 的股價
+    rebuild: 重新計算 etf_codes 的全部日期 (其他 ETF 的列保留)
+    rewritten: {ETF 代碼: 最早被覆寫的快照日期}，該 ETF 自這天起重新計算 (見 holdings_store.take_rewritten_dates)
+
+    回傳:
+    (完整拆解表, 本次新增的列)
+    """
+    prices = load_prices(prices_path) if prices_path else None
+
+    def compute(since, codes, existing):
+        start = pd.Timestamp(since).date() if since is not None else None
+        history = read_dataset("holding", codes, start=start, store_dir=store_dir)
+        if not history.num_rows:
+            return None
+        fund = fund_units_nav(read_dataset("portfolio", codes, start=start, store_dir=store_dir))
+        since_map = {code: since for code in codes} if since is not None else None
+        return compute_weight_drift(history, fund, prices, since=since_map)
+
+    return update_table(path, compute, load_weight_drift, DRIFT_COLUMNS, ['etf', '日期', '股票代號'],
+                        _update_lock, etf_codes, "holding", store_dir, rebuild, rewritten=rewritten)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="拆解持股權重變化為價格漂移與主動調整")
+    parser.add_argument("etf_codes", nargs="*", help="ETF 代碼 (預設全部)")
+    parser.add_argument("--base-dir", default=str(DATA_DIR), help="資料目錄")
+    parser.add_argument("--prices", help=f"價格檔 (預設 <base-dir>/{PRICES_FILE.name})")
+    parser.add_argument("--top", type=int, default=10, help="每檔 ETF 列出的持股數")
+    parser.add_argument("--rebuild", action="store_true", help="重新計算指定 ETF (預設全部) 的全部日期")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(args.base_dir)
+    drift, new_rows = update_weight_drift(args.etf_codes or None, store_dir=base_dir / "store",
+                                          path=base_dir / "analytics" / DRIFT_FILE.name,
+                                          prices_path=args.prices or base_dir / PRICES_FILE.name,
+                                          rebuild=args.rebuild)
+    print(f"✓ 新增 {len(new_rows)} 筆權重變化拆解，共 {len(drift)} 筆")
+
+    columns = ['股票代號', '股票名稱', '權重變化', '股價報酬', '價格漂移', '主動調整', '價格來源']
+    for etf_code in args.etf_codes or sorted(drift['etf'].astype(str).unique()):
+        etf_drift = drift[drift['etf'] == etf_code]
+        if etf_drift.empty:
+            print(f"⚠ {etf_code} 沒有可比較的持股資料")
+            continue
+        latest = etf_drift[etf_drift['日期'] == etf_drift['日期'].max()]
+        latest = latest.loc[latest['主動調整'].abs().nlargest(args.top).index]
+        print("=" * 60)
+        print(f"{etf_code} {pd.Timestamp(latest['日期'].iloc[0]).date()} 主動調整")
+        print("=" * 60)
+        print(latest[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()